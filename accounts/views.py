@@ -6,6 +6,7 @@ from django.db.models import Q
 from .forms import (RegisterForm, AdminUserCreationForm, AdminUserUpdateForm, 
                     PasswordResetByAdminForm, TeacherProfileForm)
 from .models import CustomUser
+from qlsv.pagination import paginate
 
 # Các views cũ giữ nguyên...
 def login_view(request):
@@ -111,7 +112,7 @@ def admin_user_list(request):
         users = users.filter(is_active=False)
     
     context = {
-        'users': users,
+        'users': paginate(request, users, ['-date_joined']),
         'query': query,
         'role_filter': role_filter,
         'status_filter': status_filter,
@@ -238,7 +239,7 @@ def admin_teacher_list(request):
         )
     
     return render(request, 'accounts/admin_teacher_list.html', {
-        'teachers': teachers,
+        'teachers': paginate(request, teachers, ['username']),
         'query': query
     })
 
@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     path('', views.class_list, name='class_list'),
     path('<int:pk>/', views.class_detail, name='class_detail'),
+    path('<int:pk>/export/', views.class_export, name='class_export'),
     path('create/', views.class_create, name='class_create'),
     path('<int:pk>/update/', views.class_update, name='class_update'),
     path('<int:pk>/delete/', views.class_delete, name='class_delete'),
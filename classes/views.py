@@ -4,9 +4,13 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.db.models import Q
 from .models import Class
 from .forms import ClassForm
 from student.models import Student
+from grades.exports import csv_response, iter_values
+from grades import rankings, rollups
+from qlsv.pagination import paginate
 
 
 def is_admin_or_teacher(user):
@@ -98,6 +102,28 @@ def class_detail(request, pk):
     })
 
 
+@login_required
+@user_passes_test(is_admin_or_teacher)
+def class_export(request, pk):
+    """
+    Xuất danh sách sinh viên của lớp ra CSV theo luồng
+    - Cùng phân quyền với class_detail
+    """
+    class_obj = get_object_or_404(Class, pk=pk)
+    
+    # ✅ Kiểm tra quyền truy cập
+    if not check_class_permission(request.user, class_obj):
+        messages.error(request, "Bạn không có quyền xem lớp học này.")
+        return redirect('class_list')
+    
+    fields = ['ma_sv', 'ho_ten', 'ngay_sinh', 'email']
+    return csv_response(
+        f'lop_{class_obj.ma_lop}.csv',
+        fields,
+        iter_values(class_obj.students.all(), fields)
+    )
+
+
 @login_required
 @user_passes_test(is_admin_or_teacher)
 def class_create(request):
@@ -158,6 +184,8 @@ def class_update(request, pk):
                 form.instance.giao_vien_chu_nhiem = request.user
             
             form.save()
+            rankings.mark_class_stale(class_obj.pk)
+            rollups.rebuild_class(class_obj.pk)
             messages.success(request, "Cập nhật lớp học thành công!")
             return redirect('class_detail', pk=class_obj.pk)
     else:
@@ -191,7 +219,10 @@ def class_delete(request, pk):
         return redirect('class_list')
     
     if request.method == 'POST':
+        class_pk = class_obj.pk
         class_obj.delete()
+        rankings.forget_class(class_pk)
+        rollups.forget_class(class_pk)
         messages.success(request, "Xóa lớp học thành công!")
         return redirect('class_list')
     
@@ -221,16 +252,25 @@ def class_add_student(request, pk):
         if student_id:
             student = get_object_or_404(Student, pk=student_id)
             class_obj.students.add(student)
+            rankings.mark_class_stale(class_obj.pk)
+            rollups.rebuild_class(class_obj.pk)
             messages.success(request, f"Đã thêm {student.ho_ten} vào lớp {class_obj.ten_lop}!")
             return redirect('class_detail', pk=class_obj.pk)
     
-    # Lấy danh sách sinh viên chưa có trong lớp
+    # Lấy danh sách sinh viên chưa có trong lớp (có tìm kiếm + phân trang)
     existing_student_ids = class_obj.students.values_list('id', flat=True)
     available_students = Student.objects.exclude(id__in=existing_student_ids)
+    query = request.GET.get('q', '')
+    if query:
+        available_students = available_students.filter(
+            Q(ma_sv__icontains=query) | Q(ho_ten__icontains=query)
+        )
+    available_students = paginate(request, available_students, ['ma_sv'])
     
     return render(request, 'classes/class_add_student.html', {
         'class_obj': class_obj,
         'available_students': available_students,
+        'query': query,
         'user_role': request.user.role,
     })
 
@@ -253,6 +293,8 @@ def class_remove_student(request, pk, student_id):
     
     if request.method == 'POST':
         class_obj.students.remove(student)
+        rankings.mark_class_stale(class_obj.pk)
+        rollups.rebuild_class(class_obj.pk)
         messages.success(request, f"Đã xóa {student.ho_ten} khỏi lớp {class_obj.ten_lop}!")
         return redirect('class_detail', pk=class_obj.pk)
     
@@ -5,4 +5,9 @@ urlpatterns = [
     path('', views.dashboard_view, name='dashboard'),  # Chỉ dành cho Admin
     path('teacher/', views.teacher_dashboard_view, name='teacher_dashboard'),  # Dành cho Teacher
     path('student/', views.student_dashboard_view, name='student_dashboard'),  # Dành cho Student
-]
\ No newline at end of file
+
+    # API JSON từng widget (trang dashboard gọi song song sau khi hiển thị khung)
+    path('api/<slug:widget>/', views.dashboard_widget, name='dashboard_widget'),
+    path('teacher/api/<slug:widget>/', views.teacher_dashboard_widget, name='teacher_dashboard_widget'),
+    path('student/api/<slug:widget>/', views.student_dashboard_widget, name='student_dashboard_widget'),
+]
@@ -1,14 +1,29 @@
 # dashboard/views.py
+# Mỗi dashboard gồm trang HTML chỉ dựng khung (trả về ngay) và các API JSON cho
+# từng widget; trang gọi song song các API nên widget chậm không giữ cả trang.
+# API trả về {"data": ..., "html": {phần: HTML}}: data cho số liệu/biểu đồ, html
+# là các template con trong dashboard/widgets/. Widget có số phiên bản dữ liệu
+# (grades/cache_versions.py) gắn ETag để trình duyệt kiểm tra lại và nhận 304.
 from django.contrib import messages
-from django.shortcuts import render
+from django.core.cache import cache
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Avg, Count, Q
+from django.db.models import Avg, Count, FilteredRelation, Q
+from django.utils.cache import patch_cache_control
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
 from student.models import Student
 from classes.models import Class
-from grades.models import Grade, Subject, StudentGPA
+from grades.models import AcademicWarning, Grade, Subject, StudentGPA
+from grades import cache_versions, rankings, score_stats
+from grades.archive import student_gpa_history
+from grades.finalization import get_finalized_term
+from grades.score_stats import PASS_SCORE
 from teacher.models import TeacherNote
 from accounts.models import CustomUser
-import json
+from qlsv.pagination import PreciseJSONEncoder
 
 
 def is_admin(user):
@@ -21,202 +36,550 @@ def is_teacher(user):
     return user.is_authenticated and user.role == 'teacher'
 
 
-@login_required
-@user_passes_test(is_admin)
-def dashboard_view(request):
-    """Dashboard tổng quan CHỈ DÀNH CHO ADMIN"""
-    
-    # 1. Thống kê tổng quan
-    total_students = Student.objects.count()
-    total_classes = Class.objects.count()
-    total_subjects = Subject.objects.count()
-    total_teachers = CustomUser.objects.filter(role='teacher').count()
-    
-    # 2. Thống kê điểm theo học kỳ hiện tại
-    current_semester = request.GET.get('hoc_ky', '1')
-    current_year = request.GET.get('nam_hoc', '2024-2025')
-    
-    # Lấy tất cả điểm của học kỳ hiện tại
-    grades_current = Grade.objects.filter(
+# Thống kê được cache theo khóa có số phiên bản của học kỳ/giáo viên: ghi điểm/GPA
+# hay sửa lớp làm đổi khóa nên không cần thời hạn ngắn để tránh số liệu cũ
+STATS_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Học kỳ hiển thị trên dashboard sinh viên
+CURRENT_SEMESTER = '1'
+CURRENT_YEAR = '2024-2025'
+
+# Nhãn biểu đồ phân bố điểm và các điểm chữ thuộc từng nhóm
+DISTRIBUTION_BUCKETS = [
+    ("A (8.5-10)", ('A+', 'A')),
+    ("B (7.0-8.4)", ('B+', 'B')),
+    ("C (5.5-6.9)", ('C+', 'C')),
+    ("D (4.0-5.4)", ('D+', 'D')),
+    ("F (0-3.9)", ('F',)),
+]
+
+
+# ============================================
+# THỐNG KÊ HỌC KỲ (DASHBOARD ADMIN)
+# ============================================
+
+def _live_totals(current_semester, current_year):
+    """
+    Điểm trung bình chung, số SV qua/rớt (>= 5.0 là qua) và phân bố điểm theo
+    nhóm điểm chữ (cột diem_chu có index theo học kỳ) của học kỳ còn mở: một truy vấn
+    """
+    buckets = {
+        f'bucket_{index}': Count('pk', filter=Q(diem_chu__in=letters))
+        for index, (label, letters) in enumerate(DISTRIBUTION_BUCKETS)
+    }
+    totals = Grade.objects.filter(
         hoc_ky=current_semester,
         nam_hoc=current_year,
         diem_tong_ket__isnull=False
+    ).aggregate(
+        average_grade=Avg('diem_tong_ket'),
+        passed_count=Count('student', distinct=True, filter=Q(diem_tong_ket__gte=PASS_SCORE)),
+        failed_count=Count('student', distinct=True, filter=Q(diem_tong_ket__lt=PASS_SCORE)),
+        **buckets,
     )
-    
-    # Tính điểm trung bình chung
-    average_grade = grades_current.aggregate(Avg('diem_tong_ket'))['diem_tong_ket__avg']
-    
-    # Thống kê sinh viên qua/rớt (>= 5.0 là qua)
-    passed_count = grades_current.filter(diem_tong_ket__gte=5.0).values('student').distinct().count()
-    failed_count = grades_current.filter(diem_tong_ket__lt=5.0).values('student').distinct().count()
-    
-    # 3. Top 5 sinh viên có GPA cao nhất
-    top_students = StudentGPA.objects.filter(
-        hoc_ky=current_semester,
-        nam_hoc=current_year,
-        gpa__isnull=False
-    ).select_related('student').order_by('-gpa')[:5]
-    
-    # 4. Thống kê điểm theo môn học
-    subjects_stats = []
-    for subject in Subject.objects.all():
-        subject_grades = grades_current.filter(subject=subject)
-        if subject_grades.exists():
-            avg_score = subject_grades.aggregate(Avg('diem_tong_ket'))['diem_tong_ket__avg']
-            passed = subject_grades.filter(diem_tong_ket__gte=5.0).count()
-            failed = subject_grades.filter(diem_tong_ket__lt=5.0).count()
-            total = subject_grades.count()
-            
-            # Tính tỉ lệ đạt (FIX LỖI Ở ĐÂY)
-            passed_ratio = (passed / total * 100) if total > 0 else 0
-            
-            subjects_stats.append({
-                'subject': subject,
-                'avg_score': round(avg_score, 2) if avg_score else 0,
-                'passed': passed,
-                'failed': failed,
-                'total': total,
-                'passed_ratio': round(passed_ratio, 1)  # Thêm passed_ratio
-            })
-    
-    # Sắp xếp theo điểm trung bình giảm dần
-    subjects_stats = sorted(subjects_stats, key=lambda x: x['avg_score'], reverse=True)
-    
-    # 5. Dữ liệu cho biểu đồ (Chart.js)
-    # Biểu đồ phân bố điểm
-    grade_distribution = {
-        "A (8.5-10)": grades_current.filter(diem_tong_ket__gte=8.5).count(),
-        "B (7.0-8.4)": grades_current.filter(diem_tong_ket__gte=7.0, diem_tong_ket__lt=8.5).count(),
-        "C (5.5-6.9)": grades_current.filter(diem_tong_ket__gte=5.5, diem_tong_ket__lt=7.0).count(),
-        "D (4.0-5.4)": grades_current.filter(diem_tong_ket__gte=4.0, diem_tong_ket__lt=5.5).count(),
-        "F (0-3.9)": grades_current.filter(diem_tong_ket__lt=4.0).count(),
+    average_grade = totals['average_grade']
+    return {
+        'average_grade': round(average_grade, 2) if average_grade else 0,
+        'passed_count': totals['passed_count'],
+        'failed_count': totals['failed_count'],
+        'grade_distribution': {
+            label: totals[f'bucket_{index}'] for index, (label, letters) in enumerate(DISTRIBUTION_BUCKETS)
+        },
     }
-    
-    # 6. Thống kê theo lớp
-    classes_stats = []
-    for class_obj in Class.objects.all()[:10]:  # Giới hạn 10 lớp
-        students_in_class = class_obj.students.all()
-        if students_in_class.exists():
-            # Tính GPA trung bình của lớp
-            gpa_records = StudentGPA.objects.filter(
-                student__in=students_in_class,
-                hoc_ky=current_semester,
-                nam_hoc=current_year
-            )
-            avg_gpa = gpa_records.aggregate(Avg('gpa'))['gpa__avg']
-            
-            classes_stats.append({
-                'class': {
-                    'id': class_obj.id,
-                    'ma_lop': class_obj.ma_lop,
-                    'ten_lop': class_obj.ten_lop,
-                },
-                'student_count': students_in_class.count(),
-                'avg_gpa': round(avg_gpa, 2) if avg_gpa else 0
-            })
-    
-    context = {
-        # Thống kê tổng quan
+
+
+def _live_subjects(current_semester, current_year):
+    """Thống kê điểm theo môn học: một GROUP BY môn, sắp theo điểm trung bình giảm dần"""
+    subject_rows = list(
+        Grade.objects.filter(
+            hoc_ky=current_semester,
+            nam_hoc=current_year,
+            diem_tong_ket__isnull=False
+        ).order_by().values('subject_id', 'subject__ma_mon', 'subject__ten_mon').annotate(
+            avg_score=Avg('diem_tong_ket'),
+            passed=Count('pk', filter=Q(diem_tong_ket__gte=PASS_SCORE)),
+            failed=Count('pk', filter=Q(diem_tong_ket__lt=PASS_SCORE)),
+            total=Count('pk'),
+        ).order_by('-avg_score', 'subject__ma_mon')
+    )
+    # Tứ phân vị, độ lệch chuẩn: NumPy, có cache theo môn
+    stats_by_subject = score_stats.subject_stats_many(
+        [row['subject_id'] for row in subject_rows], current_semester, current_year
+    )
+    return [
+        {
+            'subject': {'id': row['subject_id'], 'ma_mon': row['subject__ma_mon'], 'ten_mon': row['subject__ten_mon']},
+            'avg_score': round(row['avg_score'], 2),
+            'passed': row['passed'],
+            'failed': row['failed'],
+            'total': row['total'],
+            'passed_ratio': round(row['passed'] / row['total'] * 100, 1),
+            'stats': stats_by_subject[row['subject_id']],
+        }
+        for row in subject_rows
+    ]
+
+
+def _live_classes(current_semester, current_year):
+    """
+    Sĩ số và GPA trung bình học kỳ của mọi lớp có sinh viên: một truy vấn LEFT JOIN
+    sang StudentGPA của đúng học kỳ (mỗi sinh viên nhiều nhất một dòng)
+    """
+    class_rows = Class.objects.annotate(
+        term_gpa=FilteredRelation('students__gpa_records', condition=Q(
+            students__gpa_records__hoc_ky=current_semester,
+            students__gpa_records__nam_hoc=current_year,
+        )),
+    ).annotate(
+        student_count=Count('students', distinct=True),
+        avg_gpa=Avg('term_gpa__gpa'),
+    ).filter(student_count__gt=0).values('id', 'ma_lop', 'ten_lop', 'student_count', 'avg_gpa')
+    return [
+        {
+            'class': {
+                'id': row['id'],
+                'ma_lop': row['ma_lop'],
+                'ten_lop': row['ten_lop'],
+            },
+            'student_count': row['student_count'],
+            'avg_gpa': round(row['avg_gpa'], 2) if row['avg_gpa'] else 0
+        }
+        for row in class_rows
+    ]
+
+
+def _finalized_totals(term):
+    """Tổng hợp của học kỳ đã khóa, đọc từ FinalizedTerm tính sẵn"""
+    return {
+        'average_grade': term.diem_tb or 0,
+        'passed_count': term.so_sv_dat,
+        'failed_count': term.so_sv_truot,
+        'grade_distribution': {
+            label: sum(term.phan_bo.get(letter, 0) for letter in letters)
+            for label, letters in DISTRIBUTION_BUCKETS
+        },
+    }
+
+
+def _finalized_subjects(term):
+    """Thống kê theo môn của học kỳ đã khóa, đọc từ TermSubjectSummary"""
+    summaries = list(term.subject_summaries.select_related('subject').order_by('-diem_tb'))
+    # Tứ phân vị, độ lệch chuẩn: điểm đã khóa không đổi nên cache của môn không bị xóa
+    stats_by_subject = score_stats.subject_stats_many(
+        [summary.subject_id for summary in summaries], term.hoc_ky, term.nam_hoc
+    )
+    return [
+        {
+            'subject': {
+                'id': summary.subject_id,
+                'ma_mon': summary.subject.ma_mon,
+                'ten_mon': summary.subject.ten_mon,
+            },
+            'avg_score': summary.diem_tb or 0,
+            'passed': summary.so_dat,
+            'failed': summary.so_truot,
+            'total': summary.so_luong,
+            'passed_ratio': summary.ty_le_dat,
+            'stats': stats_by_subject[summary.subject_id],
+        }
+        for summary in summaries
+    ]
+
+
+def _finalized_classes(term):
+    """GPA theo lớp của học kỳ đã khóa, đọc từ TermClassSummary"""
+    return [
+        {
+            'class': {
+                'id': summary.lop_id,
+                'ma_lop': summary.lop.ma_lop,
+                'ten_lop': summary.lop.ten_lop,
+            },
+            'student_count': summary.si_so,
+            'avg_gpa': summary.gpa_tb or 0,
+        }
+        for summary in term.class_summaries.filter(si_so__gt=0).select_related('lop').order_by('lop__ma_lop')
+    ]
+
+
+# Mỗi phần thống kê học kỳ: (hàm cho học kỳ còn mở, hàm cho học kỳ đã khóa)
+TERM_STATS = {
+    'totals': (_live_totals, _finalized_totals),
+    'subjects': (_live_subjects, _finalized_subjects),
+    'classes': (_live_classes, _finalized_classes),
+}
+
+
+def _term_stats(part, current_semester, current_year):
+    """
+    Một phần thống kê học kỳ (TERM_STATS), đọc từ cache nếu dữ liệu của học kỳ
+    chưa thay đổi kể từ lần tính trước; mỗi phần cache riêng để các widget tính
+    độc lập với nhau
+    """
+    # Lấy phiên bản trước khi tính: có ghi xen giữa thì kết quả nằm ở khóa cũ, không được đọc
+    key = f"dashboard:term_stats:{part}:{current_semester}:{current_year}:" + cache_versions.term_stamp(
+        current_semester, current_year
+    )
+    stats = cache.get(key)
+    if stats is None:
+        live, finalized_stats = TERM_STATS[part]
+        # Học kỳ đã khóa: đọc bảng tổng hợp tính sẵn thay vì aggregate lại
+        finalized = get_finalized_term(current_semester, current_year)
+        if finalized is not None:
+            stats = finalized_stats(finalized)
+        else:
+            stats = live(current_semester, current_year)
+        cache.set(key, stats, STATS_CACHE_TIMEOUT)
+    return stats
+
+
+# ============================================
+# THỐNG KÊ CÁC LỚP CHỦ NHIỆM (DASHBOARD GIÁO VIÊN)
+# ============================================
+
+def _teacher_classes(teacher):
+    """Các lớp giáo viên phụ trách, sĩ số và điểm TB của lớp trong một GROUP BY"""
+    return list(
+        Class.objects.filter(giao_vien_chu_nhiem=teacher).annotate(
+            student_count=Count('students', distinct=True),
+            average_grade=Avg('students__grades__diem_tong_ket'),
+        ).order_by('ma_lop')
+    )
+
+
+def _teacher_totals(teacher):
+    """Số lớp, số sinh viên và số điểm của các lớp phụ trách"""
+    totals = Student.objects.filter(classes__giao_vien_chu_nhiem=teacher).aggregate(
+        total_students=Count('pk', distinct=True),
+        total_grades=Count('grades', distinct=True),
+    )
+    totals['total_classes'] = Class.objects.filter(giao_vien_chu_nhiem=teacher).count()
+    return totals
+
+
+TEACHER_STATS = {
+    'classes': _teacher_classes,
+    'totals': _teacher_totals,
+}
+
+
+def _teacher_stats(part, teacher):
+    """
+    Một phần thống kê của giáo viên (TEACHER_STATS); cache theo giáo viên, đổi khóa
+    khi lớp hoặc điểm/GPA của sinh viên trong lớp thay đổi
+    """
+    key = f"dashboard:teacher_stats:{part}:{teacher.pk}:" + cache_versions.teacher_stamp(teacher.pk)
+    stats = cache.get(key)
+    if stats is None:
+        stats = TEACHER_STATS[part](teacher)
+        cache.set(key, stats, STATS_CACHE_TIMEOUT)
+    return stats
+
+
+# ============================================
+# WIDGET: mỗi widget là hàm (request, ...) -> (data, html)
+# ============================================
+
+def _render_parts(request, parts, context):
+    """Dựng các phần HTML của widget: parts là {tên phần: template con}"""
+    return {
+        name: render_to_string(f'dashboard/widgets/{template}', context, request=request)
+        for name, template in parts.items()
+    }
+
+
+def _widget_response(data, html=None):
+    """
+    JSON của widget; trình duyệt phải kiểm tra lại mỗi lần dùng (no-cache) nên
+    widget có ETag chỉ tốn một lần đọc số phiên bản khi dữ liệu chưa đổi
+    """
+    response = JsonResponse({'data': data, 'html': html or {}}, encoder=PreciseJSONEncoder)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _selected_term(request):
+    return request.GET.get('hoc_ky', '1'), request.GET.get('nam_hoc', '2024-2025')
+
+
+def _admin_counters(request, hoc_ky, nam_hoc):
+    return {
+        'total_students': Student.objects.count(),
+        'total_classes': Class.objects.count(),
+        'total_subjects': Subject.objects.count(),
+        'total_teachers': CustomUser.objects.filter(role='teacher').count(),
+    }, None
+
+
+def _admin_term_summary(request, hoc_ky, nam_hoc):
+    totals = _term_stats('totals', hoc_ky, nam_hoc)
+    total_students = Student.objects.count()
+    data = {
+        'average_grade': totals['average_grade'],
+        'passed_count': totals['passed_count'],
+        'failed_count': totals['failed_count'],
         'total_students': total_students,
-        'total_classes': total_classes,
-        'total_subjects': total_subjects,
-        'total_teachers': total_teachers,
-        
+        'pass_rate': round(totals['passed_count'] * 100 / total_students) if total_students else 0,
+    }
+    return data, _render_parts(request, {'summary': 'admin_term_summary.html'}, data)
+
+
+def _admin_distribution(request, hoc_ky, nam_hoc):
+    return _term_stats('totals', hoc_ky, nam_hoc)['grade_distribution'], None
+
+
+def _admin_top_students(request, hoc_ky, nam_hoc):
+    # Top 5 sinh viên có GPA cao nhất (đọc từ bảng xếp hạng tính sẵn)
+    top_students = list(rankings.leaderboard('all', '', hoc_ky, nam_hoc)[:5])
+    data = [
+        {'ma_sv': rank.student.ma_sv, 'ho_ten': rank.student.ho_ten, 'gpa': rank.gia_tri}
+        for rank in top_students
+    ]
+    return data, _render_parts(request, {'table': 'admin_top_students.html'}, {'top_students': top_students})
+
+
+def _admin_warnings(request, hoc_ky, nam_hoc):
+    # Cảnh báo học vụ: số sinh viên theo mức độ và các cảnh báo nặng nhất
+    warning_counts = dict(
+        AcademicWarning.objects.order_by().values_list('muc_do').annotate(total=Count('pk'))
+    )
+    warning_levels = [
+        {'muc_do': level, 'label': label, 'total': warning_counts.get(level, 0)}
+        for level, label in AcademicWarning.LEVEL_CHOICES
+    ]
+    academic_warnings = AcademicWarning.objects.select_related('student').order_by('-muc_do', 'student__ma_sv')[:10]
+    return warning_levels, _render_parts(
+        request,
+        {'levels': 'warning_levels.html', 'table': 'admin_warnings.html'},
+        {'warning_levels': warning_levels, 'academic_warnings': academic_warnings},
+    )
+
+
+def _admin_subjects(request, hoc_ky, nam_hoc):
+    subjects_stats = _term_stats('subjects', hoc_ky, nam_hoc)
+    return subjects_stats, _render_parts(request, {'table': 'admin_subjects.html'}, {'subjects_stats': subjects_stats})
+
+
+def _admin_classes(request, hoc_ky, nam_hoc):
+    classes_stats = _term_stats('classes', hoc_ky, nam_hoc)
+    return classes_stats, _render_parts(request, {'chart': 'admin_classes.html'}, {'classes_stats': classes_stats})
+
+
+def _admin_term_version(request):
+    hoc_ky, nam_hoc = _selected_term(request)
+    return f"{hoc_ky}:{nam_hoc}:{cache_versions.term_stamp(hoc_ky, nam_hoc)}"
+
+
+def _admin_global_version(request):
+    return cache_versions.global_stamp()
+
+
+# Tên widget -> (hàm dựng, hàm phiên bản cho ETag hoặc None)
+ADMIN_WIDGETS = {
+    'counters': (_admin_counters, None),
+    'term-summary': (_admin_term_summary, _admin_term_version),
+    'distribution': (_admin_distribution, _admin_term_version),
+    'top-students': (_admin_top_students, _admin_term_version),
+    'warnings': (_admin_warnings, _admin_global_version),
+    'subjects': (_admin_subjects, _admin_term_version),
+    'classes': (_admin_classes, _admin_term_version),
+}
+
+
+def _teacher_summary(request, teacher):
+    return _teacher_stats('totals', teacher), None
+
+
+def _teacher_classes_widget(request, teacher):
+    classes = _teacher_stats('classes', teacher)
+    # Thống kê điểm trung bình theo lớp (biểu đồ)
+    class_stats = [
+        {'class_name': class_obj.ma_lop, 'average_grade': round(class_obj.average_grade, 2)}
+        for class_obj in classes
+        if class_obj.student_count and class_obj.average_grade
+    ]
+    return class_stats, _render_parts(
+        request,
+        {'cards': 'teacher_classes.html', 'chart': 'teacher_class_chart.html'},
+        {'classes': classes, 'class_stats': class_stats},
+    )
+
+
+def _teacher_warnings(request, teacher):
+    # Sinh viên bị cảnh báo học vụ (bảng tính sẵn hằng đêm, nặng nhất trước)
+    academic_warnings = AcademicWarning.objects.filter(
+        student__classes__giao_vien_chu_nhiem=teacher
+    ).distinct().select_related('student').order_by('-muc_do', 'student__ma_sv')[:10]
+    return None, _render_parts(request, {'table': 'teacher_warnings.html'}, {'academic_warnings': academic_warnings})
+
+
+def _teacher_notes(request, teacher):
+    # Nhận xét gần đây
+    recent_notes = TeacherNote.objects.filter(
+        teacher=teacher
+    ).select_related('student', 'class_obj').order_by('-created_at')[:4]
+    data = {'total_notes': TeacherNote.objects.filter(teacher=teacher).count()}
+    return data, _render_parts(request, {'list': 'teacher_notes.html'}, {'recent_notes': recent_notes})
+
+
+def _teacher_version(request):
+    return cache_versions.teacher_stamp(request.user.pk)
+
+
+TEACHER_WIDGETS = {
+    'summary': (_teacher_summary, _teacher_version),
+    'classes': (_teacher_classes_widget, _teacher_version),
+    'warnings': (_teacher_warnings, _teacher_version),
+    'notes': (_teacher_notes, None),
+}
+
+
+def _gpa_rating(gpa):
+    """Xếp loại học tập (string) và class cho badge dựa trên thang điểm 10"""
+    if gpa >= 8.5:
+        return 'Giỏi', 'bg-success'
+    if gpa >= 7.0:
+        return 'Khá', 'bg-primary'
+    if gpa >= 5.5:
+        return 'Trung bình', 'bg-warning'
+    if gpa >= 4.0:
+        return 'Kém', 'bg-secondary'
+    return 'Yếu', 'bg-danger'
+
+
+def _student_current_gpa(student):
+    return StudentGPA.objects.filter(
+        student=student, hoc_ky=CURRENT_SEMESTER, nam_hoc=CURRENT_YEAR
+    ).first()
+
+
+def _student_summary(request, student):
+    current_gpa = _student_current_gpa(student)
+    current_gpa_rating, current_gpa_rating_class = None, None
+    if current_gpa and current_gpa.gpa is not None:
+        current_gpa_rating, current_gpa_rating_class = _gpa_rating(current_gpa.gpa)
+
+    # Thứ hạng toàn trường và trong các lớp ("top X%")
+    student_ranks = rankings.student_ranks(student, CURRENT_SEMESTER, CURRENT_YEAR, scopes=['all', 'class'])
+    school_rank = student_ranks.get('all', [None])[0]
+    class_ranks = student_ranks.get('class', [])
+    class_names = dict(student.classes.values_list('id', 'ma_lop'))
+    for rank in class_ranks:
+        rank.ma_lop = class_names.get(int(rank.nhom), '')
+
+    data = {
+        'gpa': current_gpa.gpa if current_gpa else None,
+        'gpa_display': current_gpa.gpa if current_gpa and current_gpa.gpa is not None else 'N/A',
+        'rating': current_gpa_rating,
+        'school_rank': school_rank.hang if school_rank else None,
+    }
+    return data, _render_parts(request, {'rating': 'student_rating.html'}, {
+        'current_gpa': current_gpa,
+        'current_gpa_rating': current_gpa_rating,
+        'current_gpa_rating_class': current_gpa_rating_class,
+        'school_rank': school_rank,
+        'class_ranks': class_ranks,
+    })
+
+
+def _student_grades(request, student):
+    # Điểm các môn học kỳ hiện tại
+    current_grades = list(Grade.objects.filter(
+        student=student,
+        hoc_ky=CURRENT_SEMESTER,
+        nam_hoc=CURRENT_YEAR
+    ).select_related('subject'))
+    data = {'so_mon': len(current_grades)}
+    return data, _render_parts(request, {'table': 'student_grades.html'}, {
+        'current_grades': current_grades,
+        'current_gpa': _student_current_gpa(student),
+    })
+
+
+def _student_gpa_history(request, student):
+    # Lịch sử GPA (gồm cả các năm học đã lưu trữ)
+    gpa_history = student_gpa_history(student)
+    data = [
+        {'hoc_ky': record.hoc_ky, 'nam_hoc': record.nam_hoc, 'gpa': record.gpa, 'tong_tin_chi': record.tong_tin_chi}
+        for record in gpa_history
+    ]
+    return data, _render_parts(request, {'table': 'student_gpa_history.html'}, {'gpa_history': gpa_history})
+
+
+def _student_version(request):
+    return f"{request.user.pk}:{cache_versions.term_stamp(CURRENT_SEMESTER, CURRENT_YEAR)}"
+
+
+STUDENT_WIDGETS = {
+    'summary': (_student_summary, _student_version),
+    'grades': (_student_grades, _student_version),
+    'gpa-history': (_student_gpa_history, None),
+}
+
+
+def _widget_etag(widgets):
+    """Hàm ETag cho decorator condition: phiên bản dữ liệu của widget, None nếu không có"""
+    def etag(request, widget):
+        version = widgets.get(widget, (None, None))[1]
+        return f"{widget}:{version(request)}" if version else None
+    return etag
+
+
+# ============================================
+# TRANG DASHBOARD VÀ API WIDGET
+# ============================================
+
+@login_required
+@user_passes_test(is_admin)
+def dashboard_view(request):
+    """Dashboard tổng quan CHỈ DÀNH CHO ADMIN (khung trang, số liệu tải qua dashboard_widget)"""
+    current_semester, current_year = _selected_term(request)
+    context = {
         # Học kỳ hiện tại
         'current_semester': current_semester,
         'current_year': current_year,
-        'average_grade': round(average_grade, 2) if average_grade else 0,
-        'passed_count': passed_count,
-        'failed_count': failed_count,
-        
-        # Top sinh viên
-        'top_students': top_students,
-        
-        # Thống kê môn học (ĐÃ CÓ passed_ratio)
-        'subjects_stats': subjects_stats,
-        
-        # Dữ liệu biểu đồ
-        'grade_distribution': grade_distribution,
-        'classes_stats': classes_stats,
-        
+        'term_query': urlencode({'hoc_ky': current_semester, 'nam_hoc': current_year}),
+        'is_finalized': get_finalized_term(current_semester, current_year) is not None,
+
         # Filter options
         'HOC_KY_CHOICES': Grade.HOC_KY_CHOICES,
     }
-    
+
     return render(request, 'dashboard/dashboard.html', context)
 
 
+@login_required
+@user_passes_test(is_admin)
+@condition(etag_func=_widget_etag(ADMIN_WIDGETS))
+def dashboard_widget(request, widget):
+    """API JSON một widget của dashboard admin (?hoc_ky=&nam_hoc=)"""
+    if widget not in ADMIN_WIDGETS:
+        raise Http404("Widget không tồn tại")
+    data, html = ADMIN_WIDGETS[widget][0](request, *_selected_term(request))
+    return _widget_response(data, html)
+
+
 @login_required
 @user_passes_test(is_teacher)
 def teacher_dashboard_view(request):
-    """Dashboard CHỈ DÀNH CHO GIÁO VIÊN"""
-    teacher = request.user
-    
-    # 1. Lấy các lớp giáo viên phụ trách
-    classes = Class.objects.filter(giao_vien_chu_nhiem=teacher).prefetch_related('students')
-    
-    # 2. Thống kê tổng quan
-    total_classes = classes.count()
-    total_students = Student.objects.filter(classes__in=classes).distinct().count()
-    total_grades = Grade.objects.filter(
-        student__classes__in=classes
-    ).distinct().count()
-    total_notes = TeacherNote.objects.filter(teacher=teacher).count()
-    
-    # 3. Thống kê điểm trung bình theo lớp
-    class_stats = []
-    for class_obj in classes:
-        students_in_class = class_obj.students.all()
-        if students_in_class.exists():
-            grades = Grade.objects.filter(
-                student__in=students_in_class,
-                diem_tong_ket__isnull=False
-            )
-            avg_grade = grades.aggregate(Avg('diem_tong_ket'))['diem_tong_ket__avg']
-            
-            if avg_grade:
-                class_stats.append({
-                    'class_name': class_obj.ma_lop,
-                    'average_grade': round(avg_grade, 2)
-                })
-    
-    # 4. Top 5 sinh viên xuất sắc trong các lớp phụ trách
-    students_in_classes = Student.objects.filter(classes__in=classes).distinct()
-    top_students = StudentGPA.objects.filter(
-        student__in=students_in_classes,
-        gpa__isnull=False
-    ).select_related('student').order_by('-gpa')[:5]
-    
-    # 5. Sinh viên có GPA thấp cần quan tâm (GPA < 2.0)
-    low_gpa_students = StudentGPA.objects.filter(
-        student__in=students_in_classes,
-        gpa__lt=2.0,
-        gpa__isnull=False
-    ).select_related('student').order_by('gpa')[:5]
-    
-    # 6. Nhận xét gần đây
-    recent_notes = TeacherNote.objects.filter(
-        teacher=teacher
-    ).select_related('student', 'class_obj').order_by('-created_at')[:4]
-    
-    context = {
-        'teacher': teacher,
-        'classes': classes,
-        'total_classes': total_classes,
-        'total_students': total_students,
-        'total_grades': total_grades,
-        'total_notes': total_notes,
-        'class_stats': json.dumps(class_stats),
-        'top_students': top_students,
-        'low_gpa_students': low_gpa_students,
-        'recent_notes': recent_notes,
-    }
-    
-    return render(request, 'dashboard/teacher_dashboard.html', context)
+    """Dashboard CHỈ DÀNH CHO GIÁO VIÊN (khung trang, số liệu tải qua teacher_dashboard_widget)"""
+    return render(request, 'dashboard/teacher_dashboard.html', {'teacher': request.user})
+
+
+@login_required
+@user_passes_test(is_teacher)
+@condition(etag_func=_widget_etag(TEACHER_WIDGETS))
+def teacher_dashboard_widget(request, widget):
+    """API JSON một widget của dashboard giáo viên (chỉ các lớp mình chủ nhiệm)"""
+    if widget not in TEACHER_WIDGETS:
+        raise Http404("Widget không tồn tại")
+    data, html = TEACHER_WIDGETS[widget][0](request, request.user)
+    return _widget_response(data, html)
+
 
 @login_required
 def student_dashboard_view(request):
-    """Dashboard cho sinh viên"""
+    """Dashboard cho sinh viên (khung trang, số liệu tải qua student_dashboard_widget)"""
     try:
         student = Student.objects.get(user=request.user)
     except Student.DoesNotExist:
@@ -231,67 +594,22 @@ def student_dashboard_view(request):
             email=request.user.email
         )
         messages.info(request, "Hồ sơ sinh viên đã được tạo. Vui lòng cập nhật thông tin đầy đủ.")
-    
-    # Lấy học kỳ hiện tại
-    current_semester = '1'
-    current_year = '2024-2025'
-    
-    # Lấy GPA hiện tại
-    try:
-        current_gpa = StudentGPA.objects.get(
-            student=student,
-            hoc_ky=current_semester,
-            nam_hoc=current_year
-        )
-    except StudentGPA.DoesNotExist:
-        current_gpa = None
 
-    # Tính xếp loại học tập (string) và class cho badge dựa trên thang điểm 10
-    current_gpa_rating = None
-    current_gpa_rating_class = None
-    if current_gpa and current_gpa.gpa is not None:
-        g = current_gpa.gpa
-        if g >= 8.5:
-            current_gpa_rating = 'Giỏi'
-            current_gpa_rating_class = 'bg-success'
-        elif g >= 7.0:
-            current_gpa_rating = 'Khá'
-            current_gpa_rating_class = 'bg-primary'
-        elif g >= 5.5:
-            current_gpa_rating = 'Trung bình'
-            current_gpa_rating_class = 'bg-warning'
-        elif g >= 4.0:
-            current_gpa_rating = 'Kém'
-            current_gpa_rating_class = 'bg-secondary'
-        else:
-            current_gpa_rating = 'Yếu'
-            current_gpa_rating_class = 'bg-danger'
-    
-    # Lấy điểm các môn học kỳ hiện tại
-    current_grades = Grade.objects.filter(
-        student=student,
-        hoc_ky=current_semester,
-        nam_hoc=current_year
-    ).select_related('subject')
-    
-    # Lấy tất cả lớp học
-    classes = student.classes.all()
-    
-    # Lịch sử GPA
-    gpa_history = StudentGPA.objects.filter(
-        student=student
-    ).order_by('-nam_hoc', '-hoc_ky')
-    
     context = {
         'student': student,
-        'current_gpa': current_gpa,
-        'current_grades': current_grades,
-        'classes': classes,
-        'gpa_history': gpa_history,
-        'current_semester': current_semester,
-        'current_year': current_year,
-        'current_gpa_rating': current_gpa_rating,
-        'current_gpa_rating_class': current_gpa_rating_class,
+        'current_semester': CURRENT_SEMESTER,
+        'current_year': CURRENT_YEAR,
     }
-    
-    return render(request, 'dashboard/student_dashboard.html', context)
\ No newline at end of file
+
+    return render(request, 'dashboard/student_dashboard.html', context)
+
+
+@login_required
+@condition(etag_func=_widget_etag(STUDENT_WIDGETS))
+def student_dashboard_widget(request, widget):
+    """API JSON một widget của dashboard sinh viên (dữ liệu của chính sinh viên đăng nhập)"""
+    if widget not in STUDENT_WIDGETS:
+        raise Http404("Widget không tồn tại")
+    student = get_object_or_404(Student, user=request.user)
+    data, html = STUDENT_WIDGETS[widget][0](request, student)
+    return _widget_response(data, html)
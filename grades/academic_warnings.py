@@ -0,0 +1,153 @@
+# grades/academic_warnings.py
+# Xét cảnh báo học vụ cho toàn bộ sinh viên theo lô (chạy hằng đêm bằng
+# manage.py evaluate_academic_warnings)
+#
+# Ba tiêu chí, mỗi tiêu chí đọc bằng một hoặc hai truy vấn rồi tính bằng NumPy:
+# - GPA học kỳ thấp liên tiếp tính đến học kỳ gần nhất (StudentGPA + bảng lưu trữ)
+# - Số tín chỉ nợ: môn có điểm cao nhất qua các lần học vẫn dưới ngưỡng đạt (Grade + bảng lưu trữ)
+# - GPA tích lũy thấp (CumulativeGPA)
+# Kết quả thay toàn bộ bảng AcademicWarning trong một transaction (và tăng phiên
+# bản cache chung để các widget cảnh báo trên dashboard đọc lại).
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import cache_versions
+from .models import AcademicWarning, ArchivedGrade, ArchivedStudentGPA, CumulativeGPA, Grade, StudentGPA
+from .score_stats import PASS_SCORE
+from .services import BULK_BATCH_SIZE
+
+# GPA học kỳ (thang 10) dưới ngưỡng này là học kỳ thấp (xếp loại Yếu)
+LOW_TERM_GPA = 4.0
+
+# Các bậc (ngưỡng, mức độ), xét từ bậc nặng nhất
+LOW_STREAK_LEVELS = [(3, 3), (2, 2), (1, 1)]          # số học kỳ thấp liên tiếp >= ngưỡng
+FAILED_CREDIT_LEVELS = [(24, 3), (16, 2), (8, 1)]     # số tín chỉ nợ >= ngưỡng
+CUMULATIVE_GPA_LEVELS = [(4.0, 3), (5.0, 2), (5.5, 1)]  # GPA tích lũy < ngưỡng
+
+
+def _level_at_least(value, levels):
+    for threshold, level in levels:
+        if value >= threshold:
+            return level
+    return None
+
+
+def _level_below(value, levels):
+    for threshold, level in levels:
+        if value < threshold:
+            return level
+    return None
+
+
+def low_gpa_streaks():
+    """
+    Số học kỳ GPA thấp liên tiếp tính từ học kỳ gần nhất của mỗi sinh viên
+    Trả về {student_id: (số học kỳ, học kỳ gần nhất, năm học gần nhất)}
+    """
+    rows = list(
+        StudentGPA.objects.filter(gpa__isnull=False).order_by()
+        .values_list('student_id', 'gpa', 'hoc_ky', 'nam_hoc')
+        .union(
+            ArchivedStudentGPA.objects.filter(gpa__isnull=False).order_by()
+            .values_list('student_id', 'gpa', 'hoc_ky', 'nam_hoc'),
+            all=True,
+        )
+        .order_by('student_id', '-nam_hoc', '-hoc_ky')
+    )
+    if not rows:
+        return {}
+    students = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    low = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows)) < LOW_TERM_GPA
+
+    # Mỗi nhóm sinh viên bắt đầu bằng học kỳ gần nhất; chuỗi học kỳ thấp là số
+    # dòng thấp liền nhau từ đầu nhóm = vị trí dòng không thấp đầu tiên trong nhóm
+    starts = np.flatnonzero(np.r_[True, students[1:] != students[:-1]])
+    sizes = np.diff(np.r_[starts, students.size])
+    position = np.arange(students.size) - np.repeat(starts, sizes)
+    first_ok = np.where(low, np.repeat(sizes, sizes), position)
+    streaks = np.minimum.reduceat(first_ok, starts)
+
+    return {
+        int(students[start]): (int(streak), rows[start][2], rows[start][3])
+        for start, streak in zip(starts, streaks)
+    }
+
+
+def failed_credits():
+    """
+    Số tín chỉ nợ của mỗi sinh viên (môn chưa lần nào đạt); sinh viên không nợ
+    không có trong kết quả. Điểm cao nhất theo (sinh viên, môn) được GROUP BY trên
+    Grade và ArchivedGrade rồi gộp và cộng theo sinh viên bằng NumPy.
+    """
+    rows = []
+    for model in (Grade, ArchivedGrade):
+        rows += (
+            model.objects.filter(diem_tong_ket__isnull=False).order_by()
+            .values('student_id', 'subject_id', 'subject__so_tin_chi')
+            .annotate(best=Max('diem_tong_ket'))
+            .values_list('student_id', 'subject_id', 'subject__so_tin_chi', 'best')
+        )
+    if not rows:
+        return {}
+    data = np.array(rows, dtype=np.float64)
+    data = data[np.lexsort((data[:, 1], data[:, 0]))]
+    starts = np.flatnonzero(np.r_[True, (data[1:, :2] != data[:-1, :2]).any(axis=1)])
+    failed = np.maximum.reduceat(data[:, 3], starts) < PASS_SCORE
+    if not failed.any():
+        return {}
+    students, inverse = np.unique(data[starts, 0][failed].astype(np.int64), return_inverse=True)
+    totals = np.bincount(inverse, weights=data[starts, 2][failed])
+    return {int(student_id): int(total) for student_id, total in zip(students, totals)}
+
+
+def evaluate_all():
+    """
+    Xét lại cảnh báo học vụ của mọi sinh viên và ghi đè bảng AcademicWarning
+    Trả về số cảnh báo theo lý do.
+    """
+    now = timezone.now()
+    streaks = low_gpa_streaks()
+    warnings = []
+
+    for student_id, (streak, hoc_ky, nam_hoc) in streaks.items():
+        level = _level_at_least(streak, LOW_STREAK_LEVELS)
+        if level is not None:
+            warnings.append(AcademicWarning(
+                student_id=student_id, ly_do='low_gpa_streak', muc_do=level, gia_tri=streak,
+                mo_ta=f"{streak} học kỳ liên tiếp GPA dưới {LOW_TERM_GPA}",
+                hoc_ky=hoc_ky, nam_hoc=nam_hoc, evaluated_at=now,
+            ))
+
+    for student_id, credits in failed_credits().items():
+        level = _level_at_least(credits, FAILED_CREDIT_LEVELS)
+        if level is not None:
+            _, hoc_ky, nam_hoc = streaks.get(student_id, (0, '', ''))
+            warnings.append(AcademicWarning(
+                student_id=student_id, ly_do='failed_credits', muc_do=level, gia_tri=credits,
+                mo_ta=f"Nợ {credits} tín chỉ",
+                hoc_ky=hoc_ky, nam_hoc=nam_hoc, evaluated_at=now,
+            ))
+
+    cumulative = CumulativeGPA.objects.filter(
+        gpa__lt=max(threshold for threshold, level in CUMULATIVE_GPA_LEVELS)
+    ).values_list('student_id', 'gpa', 'hoc_ky_cuoi', 'nam_hoc_cuoi')
+    for student_id, gpa, hoc_ky, nam_hoc in cumulative:
+        warnings.append(AcademicWarning(
+            student_id=student_id, ly_do='low_cumulative',
+            muc_do=_level_below(gpa, CUMULATIVE_GPA_LEVELS), gia_tri=gpa,
+            mo_ta=f"GPA tích lũy {gpa}",
+            hoc_ky=hoc_ky, nam_hoc=nam_hoc, evaluated_at=now,
+        ))
+
+    with transaction.atomic():
+        AcademicWarning.objects.all().delete()
+        AcademicWarning.objects.bulk_create(warnings, batch_size=BULK_BATCH_SIZE)
+        cache_versions.bump_all()
+
+    counts = dict.fromkeys((value for value, label in AcademicWarning.REASON_CHOICES), 0)
+    for warning in warnings:
+        counts[warning.ly_do] += 1
+    return counts
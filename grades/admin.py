@@ -1,19 +1,123 @@
-from django.contrib import admin
-from .models import Subject, Grade, StudentGPA
+from collections import defaultdict
+from django.contrib import admin, messages
+from django.db import transaction
+from .finalization import finalize_term, reopen_term
+from .models import (Subject, Grade, GradeHistory, GradeWeightScheme, StudentGPA, CumulativeGPA, StudentRank,
+                     FinalizedTerm, AcademicWarning, ArchivedGrade, ArchivedStudentGPA, GradeRollup)
+from .services import (GRADE_INPUT_FIELDS, apply_grade_change, apply_grade_changes, delete_grade,
+                       bulk_save_grades, grade_snapshot, schedule_weight_scheme_change)
+
+
+class GradeWeightSchemeInline(admin.TabularInline):
+    model = GradeWeightScheme
+    extra = 0
+    fields = ['trong_so_qua_trinh', 'trong_so_giua_ky', 'trong_so_cuoi_ky',
+              'tu_hoc_ky', 'tu_nam_hoc', 'den_hoc_ky', 'den_nam_hoc']
 
 
 @admin.register(Subject)
 class SubjectAdmin(admin.ModelAdmin):
     list_display = ['ma_mon', 'ten_mon', 'so_tin_chi']
     search_fields = ['ma_mon', 'ten_mon']
+    inlines = [GradeWeightSchemeInline]
+
+    def save_related(self, request, form, formsets, change):
+        # Đọc bảng trọng số cũ trước khi inline được lưu để biết học kỳ nào thay đổi
+        subject = form.instance
+        old_schemes = list(subject.weight_schemes.all()) if change else []
+        super().save_related(request, form, formsets, change)
+        jobs = schedule_weight_scheme_change(subject, old_schemes, request.user)
+        if jobs:
+            self.message_user(
+                request,
+                f"Đã đưa {len(jobs)} học kỳ vào hàng đợi tính lại điểm tổng kết theo trọng số mới.",
+                messages.INFO
+            )
 
 
 @admin.register(Grade)
 class GradeAdmin(admin.ModelAdmin):
-    list_display = ['student', 'subject', 'hoc_ky', 'nam_hoc', 'diem_tong_ket', 'get_letter_grade']
-    list_filter = ['hoc_ky', 'nam_hoc', 'subject']
+    list_display = ['student', 'subject', 'hoc_ky', 'nam_hoc', 'diem_tong_ket', 'diem_chu']
+    list_filter = ['hoc_ky', 'nam_hoc', 'diem_chu', 'subject']
     search_fields = ['student__ma_sv', 'student__ho_ten', 'subject__ten_mon']
     readonly_fields = ['diem_tong_ket', 'created_at', 'updated_at']
+    actions = ['recalculate_grades']
+
+    def save_model(self, request, obj, form, change):
+        # obj đã bị form ghi đè nên đọc lại bản cũ để tính chênh lệch
+        before = None
+        if change:
+            # Khóa dòng để thao tác ghi đồng thời không dùng chung bản cũ
+            old = Grade.objects.select_for_update(of=('self',)).select_related('subject').get(pk=obj.pk)
+            before = grade_snapshot(old)
+        super().save_model(request, obj, form, change)
+        apply_grade_change(before, grade_snapshot(obj), request.user)
+
+    def _is_finalized(self, obj):
+        return obj is not None and FinalizedTerm.is_finalized(obj.hoc_ky, obj.nam_hoc)
+
+    def has_change_permission(self, request, obj=None):
+        # Điểm của học kỳ đã khóa chỉ được xem
+        return super().has_change_permission(request, obj) and not self._is_finalized(obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return super().has_delete_permission(request, obj) and not self._is_finalized(obj)
+
+    def delete_model(self, request, obj):
+        delete_grade(obj.pk, request.user)
+
+    def delete_queryset(self, request, queryset):
+        # Action delete_selected không chạy trong transaction như trang sửa/xóa:
+        # khóa dòng, xóa và cập nhật GPA/lịch sử phải cùng commit
+        with transaction.atomic():
+            grades = list(queryset.select_for_update(of=('self',)).select_related('subject'))
+            finalized = FinalizedTerm.finalized_among((grade.hoc_ky, grade.nam_hoc) for grade in grades)
+            if finalized:
+                grades = [grade for grade in grades if (grade.hoc_ky, grade.nam_hoc) not in finalized]
+                queryset = queryset.filter(pk__in=[grade.pk for grade in grades])
+            before = [grade_snapshot(grade) for grade in grades]
+            super().delete_queryset(request, queryset)
+            apply_grade_changes([(state, None) for state in before], request.user)
+        if finalized:
+            self.message_user(request, "Bỏ qua các điểm thuộc học kỳ đã khóa.", messages.WARNING)
+
+    @admin.action(description="Tính lại điểm tổng kết và GPA")
+    def recalculate_grades(self, request, queryset):
+        """Ghi lại các điểm đã chọn qua bulk_save_grades, theo từng (môn, học kỳ)"""
+        groups = defaultdict(list)
+        for grade in queryset.select_related('subject'):
+            row = {field: getattr(grade, field) for field in GRADE_INPUT_FIELDS}
+            row['student_id'] = grade.student_id
+            groups[(grade.subject, grade.hoc_ky, grade.nam_hoc)].append(row)
+
+        finalized = FinalizedTerm.finalized_among((hoc_ky, nam_hoc) for _, hoc_ky, nam_hoc in groups)
+        updated = 0
+        for (subject, hoc_ky, nam_hoc), rows in groups.items():
+            if (hoc_ky, nam_hoc) in finalized:
+                continue
+            updated += bulk_save_grades(subject, hoc_ky, nam_hoc, rows, request.user)[1]
+        if finalized:
+            self.message_user(request, "Bỏ qua các điểm thuộc học kỳ đã khóa.", messages.WARNING)
+        self.message_user(request, f"Đã cập nhật {updated} điểm.", messages.SUCCESS)
+
+
+@admin.register(GradeHistory)
+class GradeHistoryAdmin(admin.ModelAdmin):
+    """Lịch sử chỉ ghi thêm nên chỉ cho xem"""
+    list_display = ['changed_at', 'student', 'subject', 'hoc_ky', 'nam_hoc', 'action',
+                    'old_tong_ket', 'new_tong_ket', 'changed_by']
+    list_filter = ['action', 'hoc_ky', 'nam_hoc']
+    search_fields = ['student__ma_sv', 'student__ho_ten', 'subject__ma_mon']
+    list_select_related = ['student', 'subject', 'changed_by']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(StudentGPA)
@@ -22,3 +126,106 @@ class StudentGPAAdmin(admin.ModelAdmin):
     list_filter = ['hoc_ky', 'nam_hoc']
     search_fields = ['student__ma_sv', 'student__ho_ten']
 
+
+@admin.register(CumulativeGPA)
+class CumulativeGPAAdmin(admin.ModelAdmin):
+    list_display = ['student', 'gpa', 'tong_tin_chi', 'hoc_ky_cuoi', 'nam_hoc_cuoi', 'updated_at']
+    search_fields = ['student__ma_sv', 'student__ho_ten']
+    readonly_fields = ['gpa', 'tong_tin_chi', 'tong_diem_tich_luy', 'hoc_ky_cuoi', 'nam_hoc_cuoi', 'updated_at']
+
+
+@admin.register(StudentRank)
+class StudentRankAdmin(admin.ModelAdmin):
+    list_display = ['student', 'pham_vi', 'nhom', 'hoc_ky', 'nam_hoc', 'gia_tri', 'hang', 'si_so', 'top_phan_tram']
+    list_filter = ['pham_vi', 'hoc_ky', 'nam_hoc']
+    search_fields = ['student__ma_sv', 'student__ho_ten']
+    list_select_related = ['student']
+
+
+@admin.register(FinalizedTerm)
+class FinalizedTermAdmin(admin.ModelAdmin):
+    """Thêm: khóa điểm học kỳ và tính bảng tổng hợp; xóa: mở lại học kỳ"""
+    list_display = ['__str__', 'so_diem', 'diem_tb', 'so_sv_dat', 'so_sv_truot', 'finalized_by', 'finalized_at',
+                    'da_luu_tru']
+    list_filter = ['nam_hoc', 'hoc_ky', 'da_luu_tru']
+    fields = ['hoc_ky', 'nam_hoc', 'so_diem', 'diem_tb', 'so_sv_dat', 'so_sv_truot', 'phan_bo',
+              'finalized_by', 'finalized_at', 'da_luu_tru']
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return ['so_diem', 'diem_tb', 'so_sv_dat', 'so_sv_truot', 'phan_bo', 'finalized_by', 'finalized_at',
+                    'da_luu_tru']
+        return self.fields
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        # Học kỳ đã lưu trữ không mở lại được
+        return super().has_delete_permission(request, obj) and not (obj is not None and obj.da_luu_tru)
+
+    def save_model(self, request, obj, form, change):
+        term = finalize_term(obj.hoc_ky, obj.nam_hoc, request.user)
+        obj.pk = term.pk
+
+    def delete_model(self, request, obj):
+        reopen_term(obj.hoc_ky, obj.nam_hoc)
+
+    def delete_queryset(self, request, queryset):
+        if queryset.filter(da_luu_tru=True).exists():
+            self.message_user(request, "Bỏ qua các học kỳ đã lưu trữ.", messages.WARNING)
+        for term in queryset.filter(da_luu_tru=False):
+            reopen_term(term.hoc_ky, term.nam_hoc)
+
+
+@admin.register(AcademicWarning)
+class AcademicWarningAdmin(admin.ModelAdmin):
+    """Bảng do evaluate_academic_warnings ghi lại toàn bộ nên chỉ cho xem"""
+    list_display = ['student', 'ly_do', 'muc_do', 'mo_ta', 'hoc_ky', 'nam_hoc', 'evaluated_at']
+    list_filter = ['muc_do', 'ly_do']
+    search_fields = ['student__ma_sv', 'student__ho_ten']
+    list_select_related = ['student']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class ArchiveReadOnlyAdmin(admin.ModelAdmin):
+    """Bảng lưu trữ do archive_grades ghi nên chỉ cho xem"""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedGrade)
+class ArchivedGradeAdmin(ArchiveReadOnlyAdmin):
+    list_display = ['student', 'subject', 'hoc_ky', 'nam_hoc', 'diem_tong_ket', 'diem_chu']
+    list_filter = ['nam_hoc', 'hoc_ky']
+    search_fields = ['student__ma_sv', 'student__ho_ten', 'subject__ten_mon']
+    list_select_related = ['student', 'subject']
+
+
+@admin.register(ArchivedStudentGPA)
+class ArchivedStudentGPAAdmin(ArchiveReadOnlyAdmin):
+    list_display = ['student', 'hoc_ky', 'nam_hoc', 'gpa', 'tong_tin_chi']
+    list_filter = ['nam_hoc', 'hoc_ky']
+    search_fields = ['student__ma_sv', 'student__ho_ten']
+    list_select_related = ['student']
+
+
+@admin.register(GradeRollup)
+class GradeRollupAdmin(ArchiveReadOnlyAdmin):
+    """Do rollups ghi (apply_grade_changes, rebuild_grade_rollups) nên chỉ cho xem"""
+    list_display = ['subject', 'nhom', 'hoc_ky', 'nam_hoc', 'so_luong', 'diem_tb', 'so_dat', 'so_truot']
+    list_filter = ['nam_hoc', 'hoc_ky']
+    search_fields = ['subject__ma_mon', 'subject__ten_mon', 'nhom']
+    list_select_related = ['subject']
@@ -5,3 +5,6 @@ class GradesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'grades'
 
+    def ready(self):
+        from . import cache_versions
+        cache_versions.connect_signals()
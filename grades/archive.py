@@ -0,0 +1,109 @@
+# grades/archive.py
+# Lưu trữ điểm và GPA học kỳ của các năm học cũ đã khóa ra khỏi bảng Grade /
+# StudentGPA để bảng chính và index của nó chỉ chứa các năm còn dùng thường xuyên
+#
+# Dữ liệu được chuyển theo lô nhỏ, mỗi lô một transaction ngắn (chép sang bảng
+# lưu trữ rồi xóa ở bảng chính) nên chạy được khi hệ thống đang hoạt động; chạy
+# lại sau khi bị dừng giữa chừng sẽ tiếp tục với phần còn lại. Các hàm đọc bên
+# dưới gộp hai bảng cho các trang xem toàn bộ quá trình học của sinh viên.
+
+from django.db import transaction
+
+from .models import ArchivedGrade, ArchivedStudentGPA, FinalizedTerm, Grade, StudentGPA
+
+ARCHIVE_CHUNK_SIZE = 1000
+
+GRADE_FIELDS = [
+    'id', 'student_id', 'subject_id', 'hoc_ky', 'nam_hoc', 'diem_qua_trinh', 'diem_giua_ky',
+    'diem_cuoi_ky', 'diem_tong_ket', 'diem_chu', 'ghi_chu', 'created_at', 'updated_at',
+]
+GPA_FIELDS = ['id', 'student_id', 'hoc_ky', 'nam_hoc', 'gpa', 'tong_tin_chi', 'tong_diem_tich_luy']
+
+
+class ArchiveError(Exception):
+    """Năm học chưa đủ điều kiện lưu trữ"""
+
+
+def archivable_years():
+    """Các năm học còn điểm ở bảng Grade và mọi học kỳ có điểm đều đã khóa"""
+    finalized = set(FinalizedTerm.objects.values_list('hoc_ky', 'nam_hoc'))
+    terms = Grade.objects.order_by().values_list('hoc_ky', 'nam_hoc').distinct()
+    years = {}
+    for hoc_ky, nam_hoc in terms:
+        years[nam_hoc] = years.get(nam_hoc, True) and (hoc_ky, nam_hoc) in finalized
+    return sorted(nam_hoc for nam_hoc, ready in years.items() if ready)
+
+
+def _move(source, target_model, fields, chunk_size, progress=None):
+    """Chuyển các dòng của source sang target_model theo lô, trả về số dòng đã chuyển"""
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(source.select_for_update().order_by('pk').values(*fields)[:chunk_size])
+            if not rows:
+                return moved
+            # ignore_conflicts: lô đã chép nhưng chưa kịp xóa ở lần chạy trước
+            target_model.objects.bulk_create(
+                [target_model(**row) for row in rows], ignore_conflicts=True
+            )
+            source.model.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
+        if progress is not None:
+            progress(moved)
+
+
+def archive_year(nam_hoc, chunk_size=ARCHIVE_CHUNK_SIZE, progress=None):
+    """
+    Chuyển điểm và GPA học kỳ của một năm học sang bảng lưu trữ
+    Mọi học kỳ có điểm của năm học phải đã khóa (ném ArchiveError nếu chưa);
+    chỉ điểm của các học kỳ đã khóa được chuyển.
+    Trả về (số điểm, số GPA học kỳ) đã chuyển.
+    """
+    if nam_hoc not in archivable_years() and not FinalizedTerm.objects.filter(
+        nam_hoc=nam_hoc, da_luu_tru=True
+    ).exists():
+        raise ArchiveError(f"Năm học {nam_hoc} chưa khóa điểm hết các học kỳ hoặc không còn điểm để lưu trữ.")
+
+    # Đánh dấu trước khi chuyển: học kỳ đã lưu trữ không được mở lại
+    FinalizedTerm.objects.filter(nam_hoc=nam_hoc).update(da_luu_tru=True)
+    # Chỉ chuyển điểm của các học kỳ đã đánh dấu: điểm của học kỳ chưa khóa được
+    # nhập sau lần kiểm tra ở trên (hoặc sau lần chạy bị dừng) vẫn ở bảng chính
+    hoc_kys = list(
+        FinalizedTerm.objects.filter(nam_hoc=nam_hoc, da_luu_tru=True).values_list('hoc_ky', flat=True)
+    )
+    grades = _move(
+        Grade.objects.filter(nam_hoc=nam_hoc, hoc_ky__in=hoc_kys), ArchivedGrade, GRADE_FIELDS, chunk_size, progress
+    )
+    gpas = _move(
+        StudentGPA.objects.filter(nam_hoc=nam_hoc, hoc_ky__in=hoc_kys), ArchivedStudentGPA, GPA_FIELDS, chunk_size
+    )
+    return grades, gpas
+
+
+def student_terms(student):
+    """Các (học kỳ, năm học) có điểm của sinh viên trên cả hai bảng, mới nhất trước"""
+    return Grade.objects.filter(student=student).order_by().values_list('hoc_ky', 'nam_hoc').union(
+        ArchivedGrade.objects.filter(student=student).order_by().values_list('hoc_ky', 'nam_hoc')
+    ).order_by('-nam_hoc', '-hoc_ky')
+
+
+def _newest_term_first(records, *keys):
+    records = sorted(records, key=lambda record: tuple(key(record) for key in keys))
+    return sorted(records, key=lambda record: (record.nam_hoc, record.hoc_ky), reverse=True)
+
+
+def student_transcript(student):
+    """
+    Toàn bộ điểm của sinh viên (Grade và ArchivedGrade), mới nhất trước rồi theo mã môn
+    Điểm lưu trữ có is_archived = True (chỉ xem, không sửa/xóa).
+    """
+    grades = list(Grade.objects.filter(student=student).select_related('subject'))
+    grades += ArchivedGrade.objects.filter(student=student).select_related('subject')
+    return _newest_term_first(grades, lambda grade: grade.subject.ma_mon)
+
+
+def student_gpa_history(student):
+    """GPA các học kỳ của sinh viên (StudentGPA và ArchivedStudentGPA), mới nhất trước"""
+    records = list(StudentGPA.objects.filter(student=student))
+    records += ArchivedStudentGPA.objects.filter(student=student)
+    return _newest_term_first(records)
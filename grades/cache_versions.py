@@ -0,0 +1,131 @@
+# grades/cache_versions.py
+# Số phiên bản dữ liệu dùng làm một phần của khóa cache và ETag (dashboard...)
+#
+# Mỗi học kỳ có một số phiên bản, tăng khi Grade/StudentGPA của học kỳ đó thay
+# đổi (apply_grade_changes, refresh_student_gpas, recompute_grades, khóa/mở học
+# kỳ); mỗi giáo viên chủ nhiệm có một số phiên bản, tăng khi điểm/GPA của sinh
+# viên trong các lớp của giáo viên thay đổi; một số phiên bản chung tăng khi
+# lớp, sinh viên, môn học hoặc bảng cảnh báo học vụ thay đổi. Khóa cache chứa số
+# phiên bản chung và số của học kỳ/giáo viên nên ghi xong là khóa cũ không còn
+# được đọc, không cần xóa từng khóa; giá trị cũ tự hết hạn.
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from classes.models import Class
+from student.models import Student
+from .models import Subject
+
+GLOBAL_VERSION_KEY = "grades:version:all"
+
+
+def _term_key(hoc_ky, nam_hoc):
+    return f"grades:version:term:{hoc_ky}:{nam_hoc}"
+
+
+def _teacher_key(teacher_id):
+    return f"grades:version:teacher:{teacher_id}"
+
+
+def _new_version():
+    # Giá trị khởi tạo theo thời gian: khóa phiên bản bị cache đẩy ra rồi tạo lại
+    # không trùng số cũ nên không đọc lại được dữ liệu cache trước đó
+    return time.time_ns()
+
+
+def _current(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def global_stamp():
+    """Chuỗi phiên bản chung, cho dữ liệu không gắn với học kỳ hay giáo viên"""
+    return str(_current([GLOBAL_VERSION_KEY])[0])
+
+
+def term_stamp(hoc_ky, nam_hoc):
+    """Chuỗi phiên bản hiện tại của học kỳ, ghép vào khóa cache của dữ liệu học kỳ"""
+    return '{}.{}'.format(*_current([GLOBAL_VERSION_KEY, _term_key(hoc_ky, nam_hoc)]))
+
+
+def teacher_stamp(teacher_id):
+    """Chuỗi phiên bản hiện tại của dữ liệu các lớp do giáo viên chủ nhiệm"""
+    return '{}.{}'.format(*_current([GLOBAL_VERSION_KEY, _teacher_key(teacher_id)]))
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def bump_terms(terms):
+    """Tăng phiên bản các (học kỳ, năm học) sau khi transaction hiện tại commit"""
+    keys = {_term_key(hoc_ky, nam_hoc) for hoc_ky, nam_hoc in terms}
+    if keys:
+        transaction.on_commit(lambda: _bump(keys))
+
+
+def bump_students(student_ids):
+    """
+    Tăng phiên bản của các giáo viên chủ nhiệm lớp có các sinh viên này sau khi
+    transaction hiện tại commit (một truy vấn tìm giáo viên)
+    """
+    student_ids = set(student_ids)
+    if not student_ids:
+        return
+
+    def bump():
+        teacher_ids = Class.objects.filter(
+            students__in=student_ids, giao_vien_chu_nhiem__isnull=False
+        ).order_by().values_list('giao_vien_chu_nhiem', flat=True).distinct()
+        _bump([_teacher_key(teacher_id) for teacher_id in teacher_ids])
+
+    transaction.on_commit(bump)
+
+
+def bump_changes(changes):
+    """Tăng phiên bản các học kỳ và giáo viên liên quan tới các cặp (before, after) GradeState"""
+    states = [state for pair in changes for state in pair if state is not None]
+    bump_terms((state.hoc_ky, state.nam_hoc) for state in states)
+    bump_students(state.student_id for state in states)
+
+
+def bump_all():
+    """Tăng phiên bản chung: mọi khóa cache theo học kỳ đều hết hiệu lực"""
+    transaction.on_commit(lambda: _bump([GLOBAL_VERSION_KEY]))
+
+
+def _bump_all_receiver(sender, action='post_save', **kwargs):
+    # m2m_changed gửi cả pre_add/pre_remove...: chỉ cần tăng sau khi đã ghi
+    if action.startswith('post_'):
+        bump_all()
+
+
+def _student_created_receiver(sender, created=False, **kwargs):
+    # Sửa hồ sơ sinh viên không đổi số liệu thống kê, thêm mới thì đổi sĩ số
+    if created:
+        bump_all()
+
+
+def connect_signals():
+    """
+    Lớp, danh sách sinh viên của lớp, môn học và việc thêm/xóa sinh viên (xóa kèm
+    điểm, GPA) đi qua form, admin và view, không có đường ghi hàng loạt, nên theo
+    dõi bằng signal
+    """
+    post_save.connect(_student_created_receiver, sender=Student, dispatch_uid='cache_versions:save:Student')
+    for model in (Class, Subject):
+        post_save.connect(_bump_all_receiver, sender=model, dispatch_uid=f'cache_versions:save:{model.__name__}')
+    for model in (Class, Student, Subject):
+        post_delete.connect(_bump_all_receiver, sender=model, dispatch_uid=f'cache_versions:delete:{model.__name__}')
+    m2m_changed.connect(_bump_all_receiver, sender=Class.students.through, dispatch_uid='cache_versions:class_students')
@@ -0,0 +1,158 @@
+# grades/curving.py
+# Điều chỉnh điểm cuối kỳ hàng loạt cho một môn trong một học kỳ
+#
+# Xem trước: một truy vấn aggregate cho phân bố điểm trước và sau khi điều chỉnh.
+# Áp dụng: UPDATE theo tập trong một transaction, sau đó ghi lịch sử và cập nhật
+# GPA theo chênh lệch một lần cho mọi điểm thay đổi (apply_grade_changes).
+
+from django.db.models import Avg, Count, F, Max, Min, Q, Value
+from django.db.models.functions import Greatest, Least, Round
+from django.utils import timezone
+
+from .models import Grade
+from .services import (GPA_TOLERANCE, GradeState, apply_grade_changes,
+                       final_grade_expression, retry_on_conflict)
+
+CURVE_METHODS = [
+    ('add', 'Cộng thêm điểm'),
+    ('scale', 'Nhân hệ số'),
+    ('target_mean', 'Dịch về điểm trung bình mục tiêu'),
+]
+
+MAX_SCORE = 10.0
+
+
+def _curve_queryset(subject, hoc_ky, nam_hoc, students=None):
+    """Các điểm có điểm cuối kỳ của môn trong học kỳ (students: giới hạn sinh viên)"""
+    grades = Grade.objects.filter(
+        subject=subject, hoc_ky=hoc_ky, nam_hoc=nam_hoc, diem_cuoi_ky__isnull=False
+    )
+    if students is not None:
+        grades = grades.filter(student_id__in=students.values('pk'))
+    return grades
+
+
+def curve_expression(method, value, current_mean=None, cap=MAX_SCORE):
+    """
+    Biểu thức SQL của điểm cuối kỳ sau khi điều chỉnh, giới hạn trong [0, cap]
+    current_mean: điểm cuối kỳ trung bình hiện tại (cần cho 'target_mean')
+    """
+    if method == 'add':
+        raw = F('diem_cuoi_ky') + Value(float(value))
+    elif method == 'scale':
+        raw = F('diem_cuoi_ky') * Value(float(value))
+    elif method == 'target_mean':
+        raw = F('diem_cuoi_ky') + Value(float(value) - current_mean)
+    else:
+        raise ValueError(f"Cách điều chỉnh không hợp lệ: {method}")
+    return Round(Least(Greatest(raw, Value(0.0)), Value(float(cap))), 2)
+
+
+def _letter_bands(field):
+    """Điều kiện của từng điểm chữ trên một cột/annotation điểm tổng kết"""
+    bands, upper = [], None
+    for threshold, letter in Grade.LETTER_GRADE_THRESHOLDS:
+        condition = Q(**{f'{field}__gte': threshold})
+        if upper is not None:
+            condition &= Q(**{f'{field}__lt': upper})
+        bands.append((letter, condition))
+        upper = threshold
+    bands.append(('F', Q(**{f'{field}__lt': upper})))
+    return bands
+
+
+def curve_preview(subject, hoc_ky, nam_hoc, method, value, cap=MAX_SCORE, students=None):
+    """
+    Phân bố điểm trước và sau khi điều chỉnh, không ghi gì vào database
+
+    Thống kê trước/sau và phổ điểm chữ được tính trong một truy vấn aggregate
+    ('target_mean' cần thêm một truy vấn AVG). Trả về None nếu không có điểm, hoặc
+    dict {'so_luong', 'so_thay_doi', 'before', 'after', 'histogram'} với
+    before/after gồm tb_cuoi_ky, min_cuoi_ky, max_cuoi_ky, tb_tong_ket và
+    histogram là danh sách (điểm chữ, số lượng trước, số lượng sau).
+    """
+    grades = _curve_queryset(subject, hoc_ky, nam_hoc, students)
+    current_mean = None
+    if method == 'target_mean':
+        current_mean = grades.aggregate(mean=Avg('diem_cuoi_ky'))['mean']
+        if current_mean is None:
+            return None
+
+    new_ck = curve_expression(method, value, current_mean, cap)
+    aggregates = {
+        'so_luong': Count('pk'),
+        'so_thay_doi': Count('pk', filter=~Q(diem_cuoi_ky=F('ck_moi'))),
+    }
+    for prefix, ck, tk in (('before', 'diem_cuoi_ky', 'diem_tong_ket'), ('after', 'ck_moi', 'tk_moi')):
+        aggregates.update({
+            f'{prefix}_tb_cuoi_ky': Avg(ck),
+            f'{prefix}_min_cuoi_ky': Min(ck),
+            f'{prefix}_max_cuoi_ky': Max(ck),
+            f'{prefix}_tb_tong_ket': Avg(tk),
+        })
+    for letter in Grade.LETTER_GRADES:
+        aggregates[f'before_{letter}'] = Count('pk', filter=Q(diem_chu=letter))
+    for letter, condition in _letter_bands('tk_moi'):
+        aggregates[f'after_{letter}'] = Count('pk', filter=condition)
+
+    stats = grades.annotate(
+        ck_moi=new_ck,
+        tk_moi=final_grade_expression(subject.get_weights(hoc_ky, nam_hoc), new_ck),
+    ).aggregate(**aggregates)
+    if not stats['so_luong']:
+        return None
+
+    def side(prefix):
+        return {
+            name: round(stats[f'{prefix}_{name}'], 2)
+            for name in ('tb_cuoi_ky', 'min_cuoi_ky', 'max_cuoi_ky', 'tb_tong_ket')
+        }
+
+    return {
+        'so_luong': stats['so_luong'],
+        'so_thay_doi': stats['so_thay_doi'],
+        'before': side('before'),
+        'after': side('after'),
+        'histogram': [
+            (letter, stats[f'before_{letter}'], stats[f'after_{letter}'])
+            for letter in Grade.LETTER_GRADES
+        ],
+    }
+
+
+@retry_on_conflict
+def apply_curve(subject, hoc_ky, nam_hoc, method, value, cap=MAX_SCORE, students=None, user=None):
+    """
+    Điều chỉnh điểm cuối kỳ và tính lại điểm tổng kết bằng hai câu UPDATE theo tập,
+    rồi ghi lịch sử và cập nhật GPA theo chênh lệch một lần cho các điểm thay đổi.
+    Toàn bộ chạy trong một transaction: lỗi ở bất kỳ bước nào đều rollback hết.
+
+    Trả về số điểm thay đổi.
+    """
+    weights = subject.get_weights(hoc_ky, nam_hoc)
+    credits = subject.so_tin_chi
+    grades = _curve_queryset(subject, hoc_ky, nam_hoc, students)
+
+    fields = ['id', 'student_id', 'diem_qua_trinh', 'diem_giua_ky', 'diem_cuoi_ky', 'diem_tong_ket']
+    before = {row[0]: row for row in grades.select_for_update().order_by('pk').values_list(*fields)}
+    if not before:
+        return 0
+    current_mean = None
+    if method == 'target_mean':
+        current_mean = sum(row[4] for row in before.values()) / len(before)
+
+    # Hai câu UPDATE riêng: MySQL tính các phép gán trong SET theo thứ tự và dùng
+    # giá trị đã gán, nên không gộp điểm cuối kỳ mới và điểm tổng kết vào một câu
+    grades.update(diem_cuoi_ky=curve_expression(method, value, current_mean, cap), updated_at=timezone.now())
+    grades.update(diem_tong_ket=final_grade_expression(weights))
+
+    changes = []
+    for grade_id, diem_cuoi_ky, diem_tong_ket in grades.values_list('id', 'diem_cuoi_ky', 'diem_tong_ket'):
+        _, student_id, qt, gk, old_ck, old_tk = before[grade_id]
+        if (abs(old_ck - diem_cuoi_ky) <= GPA_TOLERANCE and old_tk is not None
+                and abs(old_tk - diem_tong_ket) <= GPA_TOLERANCE):
+            continue
+        old = GradeState(student_id, subject.pk, hoc_ky, nam_hoc, credits, qt, gk, old_ck, old_tk)
+        changes.append((old, old._replace(diem_cuoi_ky=diem_cuoi_ky, diem_tong_ket=diem_tong_ket)))
+    apply_grade_changes(changes, user)
+    return len(changes)
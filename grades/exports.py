@@ -0,0 +1,52 @@
+# grades/exports.py
+# Xuất CSV theo luồng (StreamingHttpResponse) dùng chung cho các app
+
+import csv
+
+from django.http import StreamingHttpResponse
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File giả: csv.writer ghi vào đâu thì trả lại chuỗi đó"""
+
+    def write(self, value):
+        return value
+
+
+def iter_values(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Duyệt queryset theo khóa chính từng lô (keyset), mỗi lô đọc bằng
+    values_list + iterator(chunk_size) nên bộ nhớ không tăng theo số dòng,
+    kể cả trên MySQL (driver không hỗ trợ server-side cursor).
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        count = 0
+        for row in batch.values_list('pk', *fields)[:chunk_size].iterator(chunk_size=chunk_size):
+            count += 1
+            last_pk = row[0]
+            yield row[1:]
+        if count < chunk_size:
+            return
+
+
+def csv_response(filename, header, rows):
+    """
+    Trả về StreamingHttpResponse CSV; dòng tiêu đề được gửi ngay trước khi
+    truy vấn đầu tiên chạy
+    """
+    writer = csv.writer(_Echo())
+
+    def stream():
+        # BOM để Excel đọc đúng tiếng Việt
+        yield '\ufeff' + writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(['' if value is None else value for value in row])
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,218 @@
+# grades/finalization.py
+# Khóa điểm học kỳ và tính sẵn các bảng tổng hợp của học kỳ đã khóa
+#
+# Sau khi khóa, mọi đường ghi điểm vào học kỳ đó bị chặn (services.ensure_terms_open)
+# nên các bảng tổng hợp không bao giờ cũ: trang đọc dùng thẳng các bảng này
+# thay vì aggregate lại từ Grade, và được phép cache lâu ở trình duyệt.
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min, Q
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+
+from classes.models import Class
+from . import cache_versions, rankings
+from .archive import ArchiveError
+from .models import (FinalizedTerm, Grade, StudentGPA, StudentRank, TermClassSummary,
+                     TermStudentSummary, TermSubjectSummary)
+from .score_stats import PASS_SCORE
+from .services import BULK_BATCH_SIZE, TermFinalizedError, refresh_student_gpas
+
+# Thời gian trình duyệt được cache trang của học kỳ đã khóa (giây)
+FINALIZED_CACHE_MAX_AGE = 24 * 60 * 60
+
+
+def get_finalized_term(hoc_ky, nam_hoc):
+    """FinalizedTerm của học kỳ, None nếu học kỳ còn mở"""
+    return FinalizedTerm.objects.filter(hoc_ky=hoc_ky, nam_hoc=nam_hoc).first()
+
+
+def cache_finalized(response, term):
+    """Header cache dài hạn cho trang chỉ đọc dữ liệu của học kỳ đã khóa"""
+    patch_cache_control(response, private=True, max_age=FINALIZED_CACHE_MAX_AGE)
+    response['Last-Modified'] = http_date(term.finalized_at.timestamp())
+    return response
+
+
+def finalize_term(hoc_ky, nam_hoc, user=None):
+    """
+    Khóa điểm một học kỳ và tính sẵn các bảng tổng hợp (toàn học kỳ, sinh viên,
+    lớp, môn) trong một transaction. Ném TermFinalizedError nếu học kỳ đã khóa.
+    Trả về FinalizedTerm.
+    """
+    if user is not None and not user.is_authenticated:
+        user = None
+    with transaction.atomic():
+        # Khóa các dòng điểm của học kỳ: thao tác sửa điểm đang chạy phải xong
+        # trước, thao tác đến sau sẽ thấy học kỳ đã khóa và bị từ chối
+        list(Grade.objects.select_for_update().filter(
+            hoc_ky=hoc_ky, nam_hoc=nam_hoc
+        ).values_list('id', flat=True))
+        term, created = FinalizedTerm.objects.get_or_create(
+            hoc_ky=hoc_ky, nam_hoc=nam_hoc, defaults={'finalized_by': user}
+        )
+        if not created:
+            raise TermFinalizedError(f"Học kỳ {hoc_ky} năm học {nam_hoc} đã được khóa trước đó.")
+
+        # Chốt GPA và xếp hạng bằng cách tính lại toàn bộ một lần
+        student_ids = Grade.objects.filter(
+            hoc_ky=hoc_ky, nam_hoc=nam_hoc
+        ).order_by().values_list('student_id', flat=True).distinct()
+        refresh_student_gpas(student_ids, hoc_ky, nam_hoc)
+        for scope in rankings.SCOPES:
+            rankings.refresh_partitions(scope, hoc_ky, nam_hoc)
+
+        _summarize_term(term)
+        _summarize_students(term)
+        _summarize_subjects(term)
+        _summarize_classes(term)
+        cache_versions.bump_terms([(hoc_ky, nam_hoc)])
+    return term
+
+
+def reopen_term(hoc_ky, nam_hoc):
+    """
+    Mở lại học kỳ đã khóa (xóa các bảng tổng hợp); trả về False nếu học kỳ chưa khóa
+    Ném ArchiveError nếu điểm của học kỳ đã được chuyển sang bảng lưu trữ.
+    """
+    if FinalizedTerm.objects.filter(hoc_ky=hoc_ky, nam_hoc=nam_hoc, da_luu_tru=True).exists():
+        raise ArchiveError(f"Học kỳ {hoc_ky} năm học {nam_hoc} đã lưu trữ, không thể mở lại.")
+    deleted, _ = FinalizedTerm.objects.filter(hoc_ky=hoc_ky, nam_hoc=nam_hoc).delete()
+    if deleted:
+        cache_versions.bump_terms([(hoc_ky, nam_hoc)])
+    return bool(deleted)
+
+
+def _term_grades(term):
+    return Grade.objects.filter(hoc_ky=term.hoc_ky, nam_hoc=term.nam_hoc)
+
+
+def _summarize_term(term):
+    grades = _term_grades(term).filter(diem_tong_ket__isnull=False)
+    stats = grades.aggregate(
+        so_diem=Count('pk'),
+        diem_tb=Avg('diem_tong_ket'),
+        so_sv_dat=Count('student', distinct=True, filter=Q(diem_tong_ket__gte=PASS_SCORE)),
+        so_sv_truot=Count('student', distinct=True, filter=Q(diem_tong_ket__lt=PASS_SCORE)),
+    )
+    term.so_diem = stats['so_diem']
+    term.diem_tb = round(stats['diem_tb'], 2) if stats['diem_tb'] is not None else None
+    term.so_sv_dat = stats['so_sv_dat']
+    term.so_sv_truot = stats['so_sv_truot']
+    term.phan_bo = Grade.letter_histogram(grades)
+    term.save(update_fields=['so_diem', 'diem_tb', 'so_sv_dat', 'so_sv_truot', 'phan_bo'])
+
+
+def _summarize_students(term):
+    """Bảng điểm của từng sinh viên: đọc Grade theo thứ tự sinh viên, ghi theo lô"""
+    gpas = {
+        record.student_id: record
+        for record in StudentGPA.objects.filter(hoc_ky=term.hoc_ky, nam_hoc=term.nam_hoc)
+    }
+    school_ranks = dict(
+        StudentRank.objects.filter(
+            pham_vi='all', nhom='', hoc_ky=term.hoc_ky, nam_hoc=term.nam_hoc
+        ).values_list('student_id', 'hang')
+    )
+
+    batch, current = [], None
+    grades = _term_grades(term).select_related('subject').order_by('student_id', 'subject__ma_mon')
+    for grade in grades.iterator(chunk_size=BULK_BATCH_SIZE):
+        if current is None or current.student_id != grade.student_id:
+            if len(batch) >= BULK_BATCH_SIZE:
+                TermStudentSummary.objects.bulk_create(batch)
+                batch = []
+            gpa = gpas.get(grade.student_id)
+            current = TermStudentSummary(
+                term=term,
+                student_id=grade.student_id,
+                gpa=gpa.gpa if gpa else None,
+                tong_tin_chi=gpa.tong_tin_chi if gpa else 0,
+                tong_diem_tich_luy=gpa.tong_diem_tich_luy if gpa else 0.0,
+                hang_toan_truong=school_ranks.get(grade.student_id),
+                bang_diem=[],
+            )
+            batch.append(current)
+
+        current.so_mon += 1
+        if grade.diem_tong_ket is not None and grade.diem_tong_ket >= PASS_SCORE:
+            current.so_mon_dat += 1
+        current.bang_diem.append({
+            'subject': {
+                'ma_mon': grade.subject.ma_mon,
+                'ten_mon': grade.subject.ten_mon,
+                'so_tin_chi': grade.subject.so_tin_chi,
+            },
+            'diem_qua_trinh': grade.diem_qua_trinh,
+            'diem_giua_ky': grade.diem_giua_ky,
+            'diem_cuoi_ky': grade.diem_cuoi_ky,
+            'diem_tong_ket': grade.diem_tong_ket,
+            'diem_chu': grade.diem_chu,
+            'ghi_chu': grade.ghi_chu,
+        })
+    if batch:
+        TermStudentSummary.objects.bulk_create(batch)
+
+
+def _summarize_subjects(term):
+    """Thống kê theo môn: một truy vấn GROUP BY"""
+    letter_counts = {
+        f'so_{letter}': Count('pk', filter=Q(diem_chu=letter)) for letter in Grade.LETTER_GRADES
+    }
+    rows = _term_grades(term).filter(diem_tong_ket__isnull=False).order_by().values('subject_id').annotate(
+        so_luong=Count('pk'),
+        diem_tb=Avg('diem_tong_ket'),
+        diem_cao_nhat=Max('diem_tong_ket'),
+        diem_thap_nhat=Min('diem_tong_ket'),
+        so_dat=Count('pk', filter=Q(diem_tong_ket__gte=PASS_SCORE)),
+        so_truot=Count('pk', filter=Q(diem_tong_ket__lt=PASS_SCORE)),
+        **letter_counts,
+    )
+    TermSubjectSummary.objects.bulk_create(
+        [
+            TermSubjectSummary(
+                term=term,
+                subject_id=row['subject_id'],
+                so_luong=row['so_luong'],
+                diem_tb=round(row['diem_tb'], 2),
+                diem_cao_nhat=row['diem_cao_nhat'],
+                diem_thap_nhat=row['diem_thap_nhat'],
+                so_dat=row['so_dat'],
+                so_truot=row['so_truot'],
+                phan_bo={letter: row[f'so_{letter}'] for letter in Grade.LETTER_GRADES},
+            )
+            for row in rows
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+
+def _summarize_classes(term):
+    """GPA theo lớp: một truy vấn GROUP BY cho sĩ số và một cho GPA"""
+    si_so = dict(
+        Class.students.through.objects.order_by().values('class_id')
+        .annotate(total=Count('student_id')).values_list('class_id', 'total')
+    )
+    gpa_stats = {
+        row['class_id']: row
+        for row in StudentGPA.objects.filter(
+            hoc_ky=term.hoc_ky, nam_hoc=term.nam_hoc, gpa__isnull=False,
+            student__classes__isnull=False,
+        ).order_by().values(class_id=F('student__classes')).annotate(
+            so_sv=Count('pk'), gpa_tb=Avg('gpa'), gpa_cao_nhat=Max('gpa'), gpa_thap_nhat=Min('gpa'),
+        )
+    }
+
+    summaries = []
+    for class_id, total in si_so.items():
+        stats = gpa_stats.get(class_id)
+        summaries.append(TermClassSummary(
+            term=term,
+            lop_id=class_id,
+            si_so=total,
+            so_sv_co_diem=stats['so_sv'] if stats else 0,
+            gpa_tb=round(stats['gpa_tb'], 2) if stats else None,
+            gpa_cao_nhat=stats['gpa_cao_nhat'] if stats else None,
+            gpa_thap_nhat=stats['gpa_thap_nhat'] if stats else None,
+        ))
+    TermClassSummary.objects.bulk_create(summaries, batch_size=BULK_BATCH_SIZE)
@@ -1,6 +1,7 @@
 from django import forms
 from django.forms import formset_factory, BaseFormSet
-from .models import Grade, Subject, StudentGPA
+from .models import FinalizedTerm, Grade, Subject, StudentGPA
+from .curving import CURVE_METHODS, MAX_SCORE
 from student.models import Student
 
 
@@ -36,8 +37,18 @@ class GradeForm(forms.ModelForm):
             'ghi_chu': forms.Textarea(attrs={'class': 'form-control', 'rows': 2}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Học kỳ của điểm đang sửa, trước khi form ghi đè lên instance
+        self.original_term = (self.instance.hoc_ky, self.instance.nam_hoc) if self.instance.pk else None
+
     def clean(self):
         cleaned_data = super().clean()
+        # Grade.clean chỉ kiểm tra học kỳ mới: không cho chuyển điểm ra khỏi học kỳ đã khóa
+        if self.original_term and FinalizedTerm.is_finalized(*self.original_term):
+            raise forms.ValidationError(
+                f"Học kỳ {self.original_term[0]} năm học {self.original_term[1]} đã khóa điểm, không thể sửa."
+            )
         diem_qt = cleaned_data.get('diem_qua_trinh')
         diem_gk = cleaned_data.get('diem_giua_ky')
         diem_ck = cleaned_data.get('diem_cuoi_ky')
@@ -106,3 +117,77 @@ class SubjectForm(forms.ModelForm):
             'mo_ta': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
 
+
+
+class GradeImportForm(forms.Form):
+    """Form tải lên file điểm (CSV/XLSX)"""
+    file = forms.FileField(
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+        label="File điểm (.csv, .xlsx)"
+    )
+
+
+class GradeCurveForm(forms.Form):
+    """Form điều chỉnh điểm cuối kỳ hàng loạt cho một môn trong một học kỳ"""
+    subject = forms.ModelChoiceField(
+        queryset=Subject.objects.all(),
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        label="Môn học"
+    )
+    hoc_ky = forms.ChoiceField(
+        choices=Grade.HOC_KY_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        label="Học kỳ"
+    )
+    nam_hoc = forms.CharField(
+        max_length=20,
+        initial="2024-2025",
+        widget=forms.TextInput(attrs={'class': 'form-control'}),
+        label="Năm học"
+    )
+    method = forms.ChoiceField(
+        choices=CURVE_METHODS,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        label="Cách điều chỉnh"
+    )
+    value = forms.FloatField(
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.1'}),
+        label="Giá trị",
+        help_text="Số điểm cộng thêm, hệ số nhân hoặc điểm trung bình mục tiêu"
+    )
+    cap = forms.FloatField(
+        initial=MAX_SCORE,
+        min_value=0.0,
+        max_value=MAX_SCORE,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.1'}),
+        label="Điểm tối đa sau điều chỉnh"
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        hoc_ky = cleaned_data.get('hoc_ky')
+        nam_hoc = cleaned_data.get('nam_hoc')
+        if hoc_ky and nam_hoc and FinalizedTerm.is_finalized(hoc_ky, nam_hoc):
+            raise forms.ValidationError(f"Học kỳ {hoc_ky} năm học {nam_hoc} đã khóa điểm.")
+        method = cleaned_data.get('method')
+        value = cleaned_data.get('value')
+        if method is None or value is None:
+            return cleaned_data
+        if method == 'add' and not -MAX_SCORE <= value <= MAX_SCORE:
+            self.add_error('value', "Số điểm cộng thêm phải trong khoảng -10 đến 10")
+        elif method == 'scale' and value <= 0:
+            self.add_error('value', "Hệ số nhân phải lớn hơn 0")
+        elif method == 'target_mean' and not 0 <= value <= MAX_SCORE:
+            self.add_error('value', "Điểm trung bình mục tiêu phải trong khoảng 0 đến 10")
+        return cleaned_data
+
+    def curve_params(self):
+        """Tham số cho curve_preview / apply_curve"""
+        return {
+            'subject': self.cleaned_data['subject'],
+            'hoc_ky': self.cleaned_data['hoc_ky'],
+            'nam_hoc': self.cleaned_data['nam_hoc'],
+            'method': self.cleaned_data['method'],
+            'value': self.cleaned_data['value'],
+            'cap': self.cleaned_data['cap'],
+        }
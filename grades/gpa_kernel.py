@@ -0,0 +1,72 @@
+# grades/gpa_kernel.py
+# Kernel NumPy tính điểm tổng kết và GPA theo lô
+# Không import Django để có thể chạy trong process pool
+
+import numpy as np
+
+
+def _same_rounding(raw, value, stored):
+    """
+    Điểm tổng kết tính bằng ROUND của database (khi đổi trọng số) có thể lệch
+    0.01 so với round() của Python ở đúng biên .xx5; coi như không lệch
+    """
+    at_half = abs(raw * 100 - np.floor(raw * 100) - 0.5) < 1e-6
+    return bool(at_half and abs(value - stored) <= 0.01 + 1e-9)
+
+
+def compute_chunk(chunk):
+    """
+    Tính lại điểm tổng kết và tổng tín chỉ / điểm tích lũy cho một lô điểm
+
+    chunk: dict các list cùng độ dài
+    - 'ids', 'group': id Grade và chỉ số nhóm (sinh viên, học kỳ) liên tiếp
+    - 'qt', 'gk', 'ck', 'stored': điểm thành phần và điểm tổng kết đang lưu (None nếu trống)
+    - 'credits': số tín chỉ của môn
+    - 'weights': trọng số (quá trình, giữa kỳ, cuối kỳ) của từng dòng
+    - 'n_groups': số nhóm
+
+    Trả về dict:
+    - 'changed': [(grade_id, điểm tổng kết mới)] cho các dòng bị lệch
+    - 'credits', 'points': tổng tín chỉ và điểm tích lũy theo nhóm
+    """
+    ids = np.asarray(chunk['ids'], dtype=np.int64)
+    group = np.asarray(chunk['group'], dtype=np.int64)
+    qt = np.asarray(chunk['qt'], dtype=np.float64)
+    gk = np.asarray(chunk['gk'], dtype=np.float64)
+    ck = np.asarray(chunk['ck'], dtype=np.float64)
+    stored = np.asarray(chunk['stored'], dtype=np.float64)
+    credits = np.asarray(chunk['credits'], dtype=np.float64)
+    weights = np.asarray(chunk['weights'], dtype=np.float64).reshape(-1, 3)
+    w_qt, w_gk, w_ck = weights[:, 0], weights[:, 1], weights[:, 2]
+
+    # Cùng thứ tự phép tính với Grade.calculate_final_grade
+    raw = np.nan_to_num(qt) * w_qt + np.nan_to_num(gk) * w_gk + np.nan_to_num(ck) * w_ck
+    has_final = ~np.isnan(ck)
+
+    # Grade.save() giữ nguyên điểm tổng kết khi chưa có điểm cuối kỳ
+    final = np.where(has_final, np.round(raw, 2), stored)
+
+    stored_missing = np.isnan(stored)
+    candidates = has_final & (stored_missing | (np.abs(final - np.nan_to_num(stored)) > 1e-9))
+
+    changed = []
+    for index in np.flatnonzero(candidates):
+        # np.round và round() có thể khác nhau ở biên .5, xác nhận lại bằng round()
+        value = round(float(raw[index]), 2)
+        if not stored_missing[index] and _same_rounding(raw[index], value, stored[index]):
+            final[index] = stored[index]
+            continue
+        final[index] = value
+        if stored_missing[index] or value != stored[index]:
+            changed.append((int(ids[index]), value))
+
+    scored = ~np.isnan(final)
+    n_groups = chunk['n_groups']
+    group_credits = np.bincount(group[scored], weights=credits[scored], minlength=n_groups)
+    group_points = np.bincount(group[scored], weights=(final * credits)[scored], minlength=n_groups)
+
+    return {
+        'changed': changed,
+        'credits': group_credits.astype(np.int64).tolist(),
+        'points': group_points.tolist(),
+    }
@@ -0,0 +1,241 @@
+# grades/importers.py
+# Nhập điểm từ file CSV/XLSX theo luồng, ghi theo từng lô transaction
+
+import codecs
+import csv
+import io
+import os
+import uuid
+import zipfile
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from .models import FinalizedTerm, Grade, Subject
+from .services import TermFinalizedError, bulk_save_grades
+
+IMPORT_COLUMNS = [
+    'ma_sv', 'ma_mon', 'hoc_ky', 'nam_hoc',
+    'diem_qua_trinh', 'diem_giua_ky', 'diem_cuoi_ky', 'ghi_chu',
+]
+REQUIRED_COLUMNS = ['ma_sv', 'ma_mon', 'hoc_ky', 'nam_hoc', 'diem_cuoi_ky']
+SCORE_COLUMNS = ['diem_qua_trinh', 'diem_giua_ky', 'diem_cuoi_ky']
+
+IMPORT_CHUNK_SIZE = 2000
+ERROR_DIR = 'grade_imports'
+
+HOC_KY_VALUES = {value for value, label in Grade.HOC_KY_CHOICES}
+NAM_HOC_MAX_LENGTH = Grade._meta.get_field('nam_hoc').max_length
+
+
+class GradeImportError(Exception):
+    """Lỗi ở mức file (định dạng, thiếu cột) khiến không thể nhập"""
+
+
+@dataclass
+class GradeImportResult:
+    total: int = 0
+    created: int = 0
+    updated: int = 0
+    rejected: int = 0
+    error_file: str = ''
+
+
+def _check_utf8(file):
+    """
+    Giải mã thử cả file trước khi đọc dòng nào: lỗi bảng mã ở giữa file sẽ làm
+    hỏng lần nhập sau khi các lô trước đã được ghi
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    try:
+        for chunk in iter(lambda: file.read(64 * 1024), b''):
+            decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise GradeImportError("File CSV phải được lưu với bảng mã UTF-8.")
+    finally:
+        file.seek(0)
+
+
+def iter_rows(uploaded_file):
+    """Đọc từng dòng của file CSV/XLSX (dòng đầu là tiêu đề) mà không nạp cả file"""
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    if extension == '.csv':
+        _check_utf8(uploaded_file.file)
+        text = io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline='')
+        yield from csv.reader(text)
+    elif extension == '.xlsx':
+        try:
+            from openpyxl import load_workbook
+            from openpyxl.utils.exceptions import InvalidFileException
+        except ImportError:
+            raise GradeImportError("Cần cài đặt openpyxl để nhập file .xlsx.")
+        try:
+            workbook = load_workbook(uploaded_file.file, read_only=True, data_only=True)
+        except (zipfile.BadZipFile, InvalidFileException, KeyError, OSError):
+            raise GradeImportError("File .xlsx bị hỏng hoặc không phải file Excel.")
+        try:
+            for row in workbook.active.iter_rows(values_only=True):
+                yield ['' if value is None else value for value in row]
+        finally:
+            workbook.close()
+    else:
+        raise GradeImportError("Chỉ hỗ trợ file .csv hoặc .xlsx.")
+
+
+def _text(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _parse_score(value, label):
+    """Điểm rỗng trả về None, điểm hợp lệ nằm trong [0, 10] (cùng quy tắc với GradeForm)"""
+    if isinstance(value, (int, float)):
+        score = float(value)
+    else:
+        value = _text(value).replace(',', '.')
+        if not value:
+            return None
+        try:
+            score = float(value)
+        except ValueError:
+            raise ValueError(f"{label} không phải là số")
+    if not 0.0 <= score <= 10.0:
+        raise ValueError(f"{label} phải nằm trong khoảng 0 - 10")
+    return score
+
+
+def _validate(record, student_map, subject_map):
+    """Chuyển một dòng thành (khóa nhóm, dữ liệu điểm), ném ValueError nếu không hợp lệ"""
+    ma_sv = _text(record.get('ma_sv', ''))
+    student_id = student_map.get(ma_sv)
+    if student_id is None:
+        raise ValueError(f"Không tìm thấy sinh viên '{ma_sv}' hoặc không có quyền nhập điểm")
+
+    ma_mon = _text(record.get('ma_mon', ''))
+    subject = subject_map.get(ma_mon)
+    if subject is None:
+        raise ValueError(f"Không tìm thấy môn học '{ma_mon}'")
+
+    hoc_ky = _text(record.get('hoc_ky', ''))
+    if hoc_ky not in HOC_KY_VALUES:
+        raise ValueError(f"Học kỳ '{hoc_ky}' không hợp lệ")
+
+    nam_hoc = _text(record.get('nam_hoc', ''))
+    if not nam_hoc or len(nam_hoc) > NAM_HOC_MAX_LENGTH:
+        raise ValueError("Năm học không hợp lệ")
+
+    values = {
+        'diem_qua_trinh': _parse_score(record.get('diem_qua_trinh', ''), "Điểm quá trình"),
+        'diem_giua_ky': _parse_score(record.get('diem_giua_ky', ''), "Điểm giữa kỳ"),
+        'diem_cuoi_ky': _parse_score(record.get('diem_cuoi_ky', ''), "Điểm cuối kỳ"),
+        'ghi_chu': _text(record.get('ghi_chu', '')),
+    }
+    if values['diem_cuoi_ky'] is None:
+        raise ValueError("Vui lòng nhập điểm cuối kỳ")
+
+    values['student_id'] = student_id
+    return (subject, hoc_ky, nam_hoc), values
+
+
+class _ErrorWriter:
+    """Ghi các dòng bị từ chối ra file CSV trên đĩa, chỉ tạo file khi có lỗi"""
+
+    def __init__(self, header, prefix):
+        self.header = header
+        self.prefix = prefix
+        self.name = ''
+        self._file = None
+        self._writer = None
+
+    def write(self, line_no, row, message):
+        if self._writer is None:
+            directory = os.path.join(settings.MEDIA_ROOT, ERROR_DIR)
+            os.makedirs(directory, exist_ok=True)
+            self.name = f"{self.prefix}_{uuid.uuid4().hex}.csv"
+            self._file = open(os.path.join(directory, self.name), 'w', encoding='utf-8-sig', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(['dong'] + self.header + ['loi'])
+        self._writer.writerow([line_no] + [_text(value) for value in row] + [message])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def error_file_path(name):
+    return os.path.join(settings.MEDIA_ROOT, ERROR_DIR, name)
+
+
+def import_grades(uploaded_file, students, user, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Nhập điểm từ file tải lên
+
+    students: queryset sinh viên được phép nhập điểm (đã lọc theo quyền).
+    user: người nhập, được ghi vào lịch sử điểm và dùng đặt tên file lỗi.
+    Mã sinh viên/mã môn được tra bằng dict dựng một lần; các dòng hợp lệ được
+    ghi theo lô chunk_size dòng, mỗi lô một transaction. Dòng lỗi không làm
+    hỏng cả file mà được ghi ra file lỗi để tải về.
+    """
+    rows = iter_rows(uploaded_file)
+    try:
+        header = [_text(value).lower() for value in next(rows)]
+    except StopIteration:
+        raise GradeImportError("File rỗng.")
+
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise GradeImportError(f"Thiếu cột: {', '.join(missing)}")
+
+    student_map = dict(students.values_list('ma_sv', 'id'))
+    subject_map = {subject.ma_mon: subject for subject in Subject.objects.all()}
+    finalized = set(FinalizedTerm.objects.values_list('hoc_ky', 'nam_hoc'))
+
+    result = GradeImportResult()
+    errors = _ErrorWriter(header, user.pk)
+    pending = []
+
+    def flush():
+        groups = defaultdict(list)
+        for key, values, line_no, row in pending:
+            groups[key].append(values)
+        try:
+            with transaction.atomic():
+                for (subject, hoc_ky, nam_hoc), group_rows in groups.items():
+                    created, updated = bulk_save_grades(subject, hoc_ky, nam_hoc, group_rows, user)
+                    result.created += created
+                    result.updated += updated
+        except (DatabaseError, TermFinalizedError) as exc:
+            for key, values, line_no, row in pending:
+                result.rejected += 1
+                errors.write(line_no, row, f"Lỗi ghi dữ liệu: {exc}")
+        pending.clear()
+
+    try:
+        for line_no, row in enumerate(rows, start=2):
+            if not any(_text(value) for value in row):
+                continue
+            result.total += 1
+            record = dict(zip(header, row))
+            try:
+                key, values = _validate(record, student_map, subject_map)
+                if key[1:] in finalized:
+                    raise ValueError("Học kỳ đã khóa điểm")
+            except ValueError as exc:
+                result.rejected += 1
+                errors.write(line_no, row, str(exc))
+                continue
+
+            pending.append((key, values, line_no, row))
+            if len(pending) >= chunk_size:
+                flush()
+        if pending:
+            flush()
+    finally:
+        errors.close()
+
+    result.error_file = errors.name
+    return result
@@ -0,0 +1,42 @@
+# grades/jobs.py
+# Các tác vụ nền của app điểm (được jobs.apps tự nạp để đăng ký handler)
+
+from jobs.queue import register, set_progress
+from . import academic_warnings, rankings
+from .models import Subject
+from .services import recompute_final_grades, refresh_cumulative_gpas
+
+
+@register('grades.refresh_cumulative_gpa')
+def refresh_cumulative_gpa(job):
+    """Tính lại CumulativeGPA của một sinh viên từ điểm hiện tại (idempotent)"""
+    refresh_cumulative_gpas([job.payload['student_id']])
+
+
+@register('grades.refresh_rankings')
+def refresh_rankings(job):
+    """Tính lại các nhóm xếp hạng đang bị đánh dấu của một học kỳ"""
+    hoc_ky, nam_hoc = job.payload['hoc_ky'], job.payload['nam_hoc']
+    count = rankings.refresh_stale(
+        hoc_ky, nam_hoc,
+        progress=lambda done, total: set_progress(job, done * 100 // total, f"{done}/{total} phạm vi"),
+    )
+    return {'partitions': count}
+
+
+@register('grades.recompute_final_grades')
+def recompute_subject_term(job):
+    """Tính lại điểm tổng kết của một môn trong một học kỳ theo trọng số hiện hành"""
+    subject = Subject.objects.filter(pk=job.payload['subject_id']).first()
+    if subject is None:
+        return {'changed': 0}
+    changed = recompute_final_grades(
+        subject, job.payload['hoc_ky'], job.payload['nam_hoc'], user=job.created_by
+    )
+    return {'changed': changed}
+
+
+@register('grades.evaluate_academic_warnings')
+def evaluate_academic_warnings(job):
+    """Xét lại cảnh báo học vụ cho toàn bộ sinh viên"""
+    return academic_warnings.evaluate_all()
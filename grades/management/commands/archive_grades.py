@@ -0,0 +1,47 @@
+# grades/management/commands/archive_grades.py
+# Chuyển điểm và GPA học kỳ của các năm học cũ đã khóa sang bảng lưu trữ theo lô
+#
+# Chạy: python manage.py archive_grades --list
+#       python manage.py archive_grades --nam-hoc 2022-2023 --chunk-size 1000
+#       python manage.py archive_grades --before 2024-2025
+
+from django.core.management.base import BaseCommand, CommandError
+
+from grades.archive import ARCHIVE_CHUNK_SIZE, ArchiveError, archivable_years, archive_year
+
+
+class Command(BaseCommand):
+    help = "Lưu trữ các năm học đã khóa điểm: chuyển Grade/StudentGPA sang bảng lưu trữ theo lô nhỏ"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nam-hoc', action='append', default=[], help="Năm học cần lưu trữ (lặp lại được)")
+        parser.add_argument('--before', default='',
+                            help="Lưu trữ mọi năm học đủ điều kiện trước năm học này")
+        parser.add_argument('--chunk-size', type=int, default=ARCHIVE_CHUNK_SIZE,
+                            help=f"Số dòng mỗi transaction (mặc định {ARCHIVE_CHUNK_SIZE})")
+        parser.add_argument('--list', action='store_true', help="Chỉ liệt kê các năm học đủ điều kiện")
+
+    def handle(self, *args, **options):
+        ready = archivable_years()
+        if options['list']:
+            for nam_hoc in ready:
+                self.stdout.write(f"  {nam_hoc}")
+            self.stdout.write(self.style.SUCCESS(f"{len(ready)} năm học đủ điều kiện lưu trữ."))
+            return
+
+        years = list(options['nam_hoc'])
+        if options['before']:
+            years += [nam_hoc for nam_hoc in ready if nam_hoc < options['before'] and nam_hoc not in years]
+        if not years:
+            raise CommandError("Cần --nam-hoc hoặc --before (xem --list).")
+
+        chunk_size = max(1, options['chunk_size'])
+        for nam_hoc in years:
+            try:
+                grades, gpas = archive_year(
+                    nam_hoc, chunk_size,
+                    progress=lambda moved, nam_hoc=nam_hoc: self.stdout.write(f"  {nam_hoc}: {moved} điểm..."),
+                )
+            except ArchiveError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"{nam_hoc}: đã lưu trữ {grades} điểm, {gpas} GPA học kỳ."))
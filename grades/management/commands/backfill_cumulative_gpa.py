@@ -0,0 +1,41 @@
+# grades/management/commands/backfill_cumulative_gpa.py
+# Tạo/tính lại bảng GPA tích lũy cho toàn bộ sinh viên theo lô
+#
+# Chạy: python manage.py backfill_cumulative_gpa --chunk-size 1000
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from grades.models import CumulativeGPA
+from grades.services import refresh_cumulative_gpas
+from student.models import Student
+
+
+class Command(BaseCommand):
+    help = "Tính lại GPA tích lũy (môn học lại lấy lần điểm cao nhất) cho tất cả sinh viên theo lô"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help="Số sinh viên trong mỗi lô (mặc định 1000)")
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options['chunk_size'])
+        last_id = 0
+        processed = 0
+        while True:
+            student_ids = list(
+                Student.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:chunk_size]
+            )
+            if not student_ids:
+                break
+            last_id = student_ids[-1]
+            # Mỗi lô một transaction để lỗi giữa chừng không để lại lô dở dang
+            with transaction.atomic():
+                refresh_cumulative_gpas(student_ids)
+            processed += len(student_ids)
+            self.stdout.write(f"  Đã xử lý {processed} sinh viên...")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Hoàn tất: {processed} sinh viên, {CumulativeGPA.objects.count()} bản ghi GPA tích lũy."
+        ))
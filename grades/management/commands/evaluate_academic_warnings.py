@@ -0,0 +1,20 @@
+# grades/management/commands/evaluate_academic_warnings.py
+# Xét lại cảnh báo học vụ cho toàn bộ sinh viên (đặt lịch chạy hằng đêm, ví dụ cron)
+#
+# Chạy: python manage.py evaluate_academic_warnings
+
+from django.core.management.base import BaseCommand
+
+from grades.academic_warnings import evaluate_all
+from grades.models import AcademicWarning
+
+
+class Command(BaseCommand):
+    help = "Xét cảnh báo học vụ (GPA thấp liên tiếp, nợ tín chỉ, GPA tích lũy thấp) theo lô"
+
+    def handle(self, *args, **options):
+        counts = evaluate_all()
+        labels = dict(AcademicWarning.REASON_CHOICES)
+        for reason, count in counts.items():
+            self.stdout.write(f"  {labels[reason]}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Hoàn tất: {sum(counts.values())} cảnh báo."))
@@ -0,0 +1,44 @@
+# grades/management/commands/finalize_term.py
+# Khóa điểm một học kỳ và tính sẵn bảng tổng hợp (hoặc mở lại học kỳ đã khóa)
+#
+# Chạy: python manage.py finalize_term --hoc-ky 1 --nam-hoc 2024-2025
+#       python manage.py finalize_term --hoc-ky 1 --nam-hoc 2024-2025 --reopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+from grades.archive import ArchiveError
+from grades.finalization import finalize_term, reopen_term
+from grades.models import Grade
+from grades.services import TermFinalizedError
+
+
+class Command(BaseCommand):
+    help = "Khóa điểm một học kỳ: chặn sửa điểm và tính sẵn bảng tổng hợp sinh viên, lớp, môn"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hoc-ky', required=True, choices=[value for value, label in Grade.HOC_KY_CHOICES])
+        parser.add_argument('--nam-hoc', required=True)
+        parser.add_argument('--reopen', action='store_true',
+                            help="Mở lại học kỳ đã khóa (xóa bảng tổng hợp)")
+
+    def handle(self, *args, **options):
+        hoc_ky, nam_hoc = options['hoc_ky'], options['nam_hoc']
+        if options['reopen']:
+            try:
+                reopened = reopen_term(hoc_ky, nam_hoc)
+            except ArchiveError as e:
+                raise CommandError(str(e))
+            if not reopened:
+                raise CommandError(f"Học kỳ {hoc_ky} năm học {nam_hoc} chưa được khóa.")
+            self.stdout.write(self.style.SUCCESS(f"Đã mở lại học kỳ {hoc_ky} năm học {nam_hoc}."))
+            return
+
+        try:
+            term = finalize_term(hoc_ky, nam_hoc)
+        except TermFinalizedError as e:
+            raise CommandError(e.message)
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã khóa học kỳ {hoc_ky} năm học {nam_hoc}: {term.so_diem} điểm, "
+            f"{term.student_summaries.count()} sinh viên, {term.subject_summaries.count()} môn, "
+            f"{term.class_summaries.count()} lớp."
+        ))
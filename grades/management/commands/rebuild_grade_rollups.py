@@ -0,0 +1,22 @@
+# grades/management/commands/rebuild_grade_rollups.py
+# Tính lại bảng tổng hợp điểm theo (môn, học kỳ, lớp) từ Grade và ArchivedGrade
+#
+# Chạy lần đầu sau khi thêm bảng, hoặc khi dữ liệu bị sửa ngoài apply_grade_changes
+# (xóa sinh viên kèm điểm, sửa trực tiếp trong cơ sở dữ liệu...)
+# Chạy: python manage.py rebuild_grade_rollups
+#       python manage.py rebuild_grade_rollups --nam-hoc 2024-2025
+
+from django.core.management.base import BaseCommand
+
+from grades import rollups
+
+
+class Command(BaseCommand):
+    help = "Tính lại bảng tổng hợp điểm theo môn, học kỳ và lớp (một câu GROUP BY mỗi bảng điểm)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nam-hoc', default='', help="Chỉ tính một năm học")
+
+    def handle(self, *args, **options):
+        count = rollups.rebuild(options['nam_hoc'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Hoàn tất: {count} dòng tổng hợp."))
@@ -0,0 +1,259 @@
+# grades/management/commands/recompute_grades.py
+# Tính lại điểm tổng kết và GPA toàn bộ lịch sử, chỉ ghi các dòng bị lệch
+#
+# Chạy: python manage.py recompute_grades --workers 4
+#       python manage.py recompute_grades --nam-hoc 2024-2025 --dry-run
+
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from grades import cache_versions, rollups
+from grades.gpa_kernel import compute_chunk
+from grades.models import FinalizedTerm, Grade, GradeWeightScheme, StudentGPA, resolve_weights
+from grades.services import (BULK_BATCH_SIZE, GPA_TOLERANCE, GradeState, mark_rankings_stale,
+                             record_grade_history, refresh_cumulative_gpas)
+
+
+class Command(BaseCommand):
+    help = "Tính lại điểm tổng kết và GPA theo lô (NumPy), ghi lại các dòng lệch và báo cáo sai lệch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Số sinh viên trong mỗi lô (mặc định 500)")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Số process tính toán song song (mặc định 1: chạy trực tiếp)")
+        parser.add_argument('--nam-hoc', default='',
+                            help="Chỉ tính lại một năm học")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Chỉ báo cáo sai lệch, không ghi vào database")
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.nam_hoc = options['nam_hoc']
+        # Học kỳ đã khóa giữ nguyên điểm và GPA đã chốt
+        self.finalized = set(FinalizedTerm.objects.values_list('hoc_ky', 'nam_hoc'))
+        self.report = {
+            'students': 0,
+            'grades': 0,
+            'grades_wrong': 0,
+            'gpa_checked': 0,
+            'gpa_wrong': 0,
+            'gpa_missing': 0,
+            'gpa_orphaned': 0,
+        }
+
+        self.schemes = defaultdict(list)
+        for scheme in GradeWeightScheme.objects.all():
+            self.schemes[scheme.subject_id].append(scheme)
+        self.weights = {}
+
+        workers = max(1, options['workers'])
+        chunks = self._iter_chunks(max(1, options['chunk_size']))
+
+        if workers == 1:
+            for chunk in chunks:
+                self._apply(chunk, compute_chunk(chunk['payload']))
+        else:
+            # Giới hạn số lô đang chờ để bộ nhớ không tăng theo kích thước dữ liệu
+            pending = deque()
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for chunk in chunks:
+                    pending.append((chunk, pool.submit(compute_chunk, chunk['payload'])))
+                    if len(pending) >= workers * 2:
+                        done_chunk, future = pending.popleft()
+                        self._apply(done_chunk, future.result())
+                while pending:
+                    done_chunk, future = pending.popleft()
+                    self._apply(done_chunk, future.result())
+
+        self._print_report()
+
+    def _base_queryset(self):
+        grades = Grade.objects.all()
+        if self.nam_hoc:
+            grades = grades.filter(nam_hoc=self.nam_hoc)
+        for hoc_ky, nam_hoc in self.finalized:
+            grades = grades.exclude(hoc_ky=hoc_ky, nam_hoc=nam_hoc)
+        return grades
+
+    def _iter_chunks(self, chunk_size):
+        """
+        Đọc Grade theo thứ tự (student_id, nam_hoc, hoc_ky), mỗi lô gồm trọn
+        điểm của chunk_size sinh viên
+        """
+        last_student_id = 0
+        while True:
+            student_ids = list(
+                self._base_queryset().filter(student_id__gt=last_student_id)
+                .order_by('student_id').values_list('student_id', flat=True)
+                .distinct()[:chunk_size]
+            )
+            if not student_ids:
+                return
+            last_student_id = student_ids[-1]
+
+            rows = self._base_queryset().filter(
+                student_id__gte=student_ids[0],
+                student_id__lte=student_ids[-1]
+            ).order_by('student_id', 'nam_hoc', 'hoc_ky', 'id').values_list(
+                'id', 'student_id', 'hoc_ky', 'nam_hoc',
+                'diem_qua_trinh', 'diem_giua_ky', 'diem_cuoi_ky', 'diem_tong_ket',
+                'subject__so_tin_chi', 'subject_id'
+            )
+
+            payload = {
+                'ids': [], 'group': [], 'qt': [], 'gk': [], 'ck': [],
+                'stored': [], 'credits': [], 'weights': [],
+            }
+            group_keys = []
+            subject_ids = []
+            for grade_id, student_id, hoc_ky, nam_hoc, qt, gk, ck, stored, credits, subject_id in rows:
+                key = (student_id, hoc_ky, nam_hoc)
+                if not group_keys or group_keys[-1] != key:
+                    group_keys.append(key)
+                payload['ids'].append(grade_id)
+                payload['group'].append(len(group_keys) - 1)
+                payload['qt'].append(qt)
+                payload['gk'].append(gk)
+                payload['ck'].append(ck)
+                payload['stored'].append(stored)
+                payload['credits'].append(credits)
+                subject_ids.append(subject_id)
+                payload['weights'].append(self._weights_for(subject_id, hoc_ky, nam_hoc))
+            payload['n_groups'] = len(group_keys)
+
+            yield {
+                'student_ids': student_ids,
+                'group_keys': group_keys,
+                'subject_ids': subject_ids,
+                'payload': payload,
+            }
+
+    def _weights_for(self, subject_id, hoc_ky, nam_hoc):
+        """Trọng số theo (môn, học kỳ), tra một lần rồi nhớ lại"""
+        key = (subject_id, hoc_ky, nam_hoc)
+        if key not in self.weights:
+            self.weights[key] = resolve_weights(self.schemes[subject_id], hoc_ky, nam_hoc)
+        return self.weights[key]
+
+    def _apply(self, chunk, result):
+        """So sánh kết quả của một lô với dữ liệu đang lưu và ghi các dòng lệch"""
+        report = self.report
+        report['students'] += len(chunk['student_ids'])
+        report['grades'] += len(chunk['payload']['ids'])
+        report['grades_wrong'] += len(result['changed'])
+
+        stored_gpa = StudentGPA.objects.filter(
+            student_id__gte=chunk['student_ids'][0],
+            student_id__lte=chunk['student_ids'][-1]
+        )
+        if self.nam_hoc:
+            stored_gpa = stored_gpa.filter(nam_hoc=self.nam_hoc)
+        existing = {
+            (record.student_id, record.hoc_ky, record.nam_hoc): record
+            for record in stored_gpa
+            if (record.hoc_ky, record.nam_hoc) not in self.finalized
+        }
+
+        to_create, to_update = [], []
+        computed_keys = set()
+        for key, total_credits, total_points in zip(
+            chunk['group_keys'], result['credits'], result['points']
+        ):
+            if total_credits == 0:
+                continue
+            computed_keys.add(key)
+            gpa = round(total_points / total_credits, 2)
+            record = existing.get(key)
+            report['gpa_checked'] += 1
+            if record is None:
+                report['gpa_missing'] += 1
+                student_id, hoc_ky, nam_hoc = key
+                to_create.append(StudentGPA(
+                    student_id=student_id,
+                    hoc_ky=hoc_ky,
+                    nam_hoc=nam_hoc,
+                    gpa=gpa,
+                    tong_tin_chi=total_credits,
+                    tong_diem_tich_luy=total_points,
+                ))
+            elif (record.gpa != gpa or record.tong_tin_chi != total_credits
+                    or abs(record.tong_diem_tich_luy - total_points) > GPA_TOLERANCE):
+                report['gpa_wrong'] += 1
+                record.gpa = gpa
+                record.tong_tin_chi = total_credits
+                record.tong_diem_tich_luy = total_points
+                to_update.append(record)
+
+        # Bản ghi GPA không còn điểm nào tương ứng
+        orphaned = [record.pk for key, record in existing.items() if key not in computed_keys]
+        report['gpa_orphaned'] += len(orphaned)
+
+        if self.dry_run:
+            return
+
+        with transaction.atomic():
+            if result['changed']:
+                Grade.objects.bulk_update(
+                    [Grade(id=grade_id, diem_tong_ket=value) for grade_id, value in result['changed']],
+                    ['diem_tong_ket'],
+                    batch_size=BULK_BATCH_SIZE
+                )
+                changes = self._history_changes(chunk, result['changed'])
+                record_grade_history(changes)
+                refresh_cumulative_gpas(before.student_id for before, after in changes)
+                mark_rankings_stale(changes)
+                rollups.apply_changes(changes)
+                cache_versions.bump_changes(changes)
+            if to_create:
+                StudentGPA.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+            if to_update:
+                StudentGPA.objects.bulk_update(
+                    to_update, ['gpa', 'tong_tin_chi', 'tong_diem_tich_luy'], batch_size=BULK_BATCH_SIZE
+                )
+            if orphaned:
+                StudentGPA.objects.filter(pk__in=orphaned).delete()
+            written = [key for key, record in existing.items() if key not in computed_keys]
+            written += [(record.student_id, record.hoc_ky, record.nam_hoc) for record in to_create + to_update]
+            cache_versions.bump_terms(key[1:] for key in written)
+            cache_versions.bump_students(key[0] for key in written)
+
+    @staticmethod
+    def _history_changes(chunk, changed):
+        """Cặp (before, after) GradeState cho các điểm tổng kết được sửa"""
+        payload = chunk['payload']
+        index = {grade_id: i for i, grade_id in enumerate(payload['ids'])}
+        changes = []
+        for grade_id, value in changed:
+            i = index[grade_id]
+            student_id, hoc_ky, nam_hoc = chunk['group_keys'][payload['group'][i]]
+            before = GradeState(
+                student_id, chunk['subject_ids'][i], hoc_ky, nam_hoc, payload['credits'][i],
+                payload['qt'][i], payload['gk'][i], payload['ck'][i], payload['stored'][i],
+            )
+            changes.append((before, before._replace(diem_tong_ket=value)))
+        return changes
+
+    def _print_report(self):
+        report = self.report
+        title = "BÁO CÁO SAI LỆCH (dry-run)" if self.dry_run else "BÁO CÁO SAI LỆCH"
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        self.stdout.write(f"  Sinh viên đã quét:          {report['students']}")
+        self.stdout.write(f"  Điểm đã quét:               {report['grades']}")
+        self.stdout.write(f"  Điểm tổng kết bị lệch:      {report['grades_wrong']}")
+        self.stdout.write(f"  GPA đã kiểm tra:            {report['gpa_checked']}")
+        self.stdout.write(f"  GPA bị lệch:                {report['gpa_wrong']}")
+        self.stdout.write(f"  GPA bị thiếu:               {report['gpa_missing']}")
+        self.stdout.write(f"  GPA thừa (không còn điểm):  {report['gpa_orphaned']}")
+
+        drift = (report['grades_wrong'] + report['gpa_wrong']
+                 + report['gpa_missing'] + report['gpa_orphaned'])
+        if drift == 0:
+            self.stdout.write(self.style.SUCCESS("Không có sai lệch."))
+        elif self.dry_run:
+            self.stdout.write(self.style.WARNING(f"Phát hiện {drift} sai lệch (chưa ghi)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Đã sửa {drift} sai lệch."))
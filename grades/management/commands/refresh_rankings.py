@@ -0,0 +1,53 @@
+# grades/management/commands/refresh_rankings.py
+# Tính lại bảng xếp hạng (lớp, lớp sinh hoạt, môn, toàn trường) theo học kỳ
+#
+# Chạy: python manage.py refresh_rankings
+#       python manage.py refresh_rankings --nam-hoc 2024-2025 --stale-only
+
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from grades.models import RankPartition, StudentGPA
+from grades.rankings import SCOPES, refresh_partitions
+
+
+class Command(BaseCommand):
+    help = "Tính lại xếp hạng bằng window function cho từng học kỳ, mỗi phạm vi một truy vấn"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nam-hoc', default='', help="Chỉ tính một năm học")
+        parser.add_argument('--hoc-ky', default='', help="Chỉ tính một học kỳ")
+        parser.add_argument('--stale-only', action='store_true',
+                            help="Chỉ tính các nhóm đang bị đánh dấu cần tính lại")
+
+    def handle(self, *args, **options):
+        if options['stale_only']:
+            partitions = RankPartition.objects.filter(is_stale=True)
+        else:
+            partitions = None
+        terms = StudentGPA.objects.order_by().values_list('hoc_ky', 'nam_hoc').distinct()
+        if options['nam_hoc']:
+            terms = terms.filter(nam_hoc=options['nam_hoc'])
+            if partitions is not None:
+                partitions = partitions.filter(nam_hoc=options['nam_hoc'])
+        if options['hoc_ky']:
+            terms = terms.filter(hoc_ky=options['hoc_ky'])
+            if partitions is not None:
+                partitions = partitions.filter(hoc_ky=options['hoc_ky'])
+
+        if partitions is not None:
+            groups = defaultdict(set)
+            for scope, key, hoc_ky, nam_hoc in partitions.values_list('pham_vi', 'nhom', 'hoc_ky', 'nam_hoc'):
+                groups[(scope, hoc_ky, nam_hoc)].add(key)
+            jobs = [(scope, hoc_ky, nam_hoc, keys) for (scope, hoc_ky, nam_hoc), keys in groups.items()]
+        else:
+            jobs = [(scope, hoc_ky, nam_hoc, None) for hoc_ky, nam_hoc in terms for scope in SCOPES]
+
+        total = 0
+        for scope, hoc_ky, nam_hoc, keys in jobs:
+            count = refresh_partitions(scope, hoc_ky, nam_hoc, keys) or 0
+            total += count
+            self.stdout.write(f"  HK{hoc_ky} {nam_hoc} - {scope}: {count} dòng")
+
+        self.stdout.write(self.style.SUCCESS(f"Hoàn tất: {len(jobs)} nhóm việc, {total} dòng xếp hạng."))
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH_SIZE = 2000
+
+
+def seed_history(apps, schema_editor):
+    """Mỗi điểm đang có được ghi một dòng 'create' tại updated_at làm mốc ban đầu"""
+    Grade = apps.get_model('grades', 'Grade')
+    GradeHistory = apps.get_model('grades', 'GradeHistory')
+    last_pk = 0
+    while True:
+        batch = list(Grade.objects.filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        GradeHistory.objects.bulk_create([
+            GradeHistory(
+                student_id=grade.student_id,
+                subject_id=grade.subject_id,
+                hoc_ky=grade.hoc_ky,
+                nam_hoc=grade.nam_hoc,
+                action='create',
+                new_qua_trinh=grade.diem_qua_trinh,
+                new_giua_ky=grade.diem_giua_ky,
+                new_cuoi_ky=grade.diem_cuoi_ky,
+                new_tong_ket=grade.diem_tong_ket,
+                changed_at=grade.updated_at,
+            )
+            for grade in batch
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0001_initial'),
+        ('student', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hoc_ky', models.CharField(choices=[('1', 'Học kỳ 1'), ('2', 'Học kỳ 2'), ('3', 'Học kỳ hè')], max_length=1, verbose_name='Học kỳ')),
+                ('nam_hoc', models.CharField(max_length=20, verbose_name='Năm học')),
+                ('action', models.CharField(choices=[('create', 'Tạo mới'), ('update', 'Cập nhật'), ('delete', 'Xóa')], max_length=6, verbose_name='Thao tác')),
+                ('old_qua_trinh', models.FloatField(blank=True, null=True)),
+                ('old_giua_ky', models.FloatField(blank=True, null=True)),
+                ('old_cuoi_ky', models.FloatField(blank=True, null=True)),
+                ('old_tong_ket', models.FloatField(blank=True, null=True)),
+                ('new_qua_trinh', models.FloatField(blank=True, null=True)),
+                ('new_giua_ky', models.FloatField(blank=True, null=True)),
+                ('new_cuoi_ky', models.FloatField(blank=True, null=True)),
+                ('new_tong_ket', models.FloatField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Thời điểm')),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Người thay đổi')),
+                ('student', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='grade_history', to='student.student', verbose_name='Sinh viên')),
+                ('subject', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='grade_history', to='grades.subject', verbose_name='Môn học')),
+            ],
+            options={
+                'verbose_name': 'Lịch sử điểm',
+                'verbose_name_plural': 'Lịch sử điểm',
+                'ordering': ['-changed_at', '-id'],
+                'indexes': [models.Index(fields=['student', 'hoc_ky', 'nam_hoc', 'changed_at'], name='grade_hist_student_term_idx'), models.Index(fields=['subject', 'hoc_ky', 'nam_hoc', 'student', 'changed_at'], name='grade_hist_subject_term_idx')],
+            },
+        ),
+        migrations.RunPython(seed_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0002_gradehistory'),
+        ('student', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CumulativeGPA',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gpa', models.FloatField(blank=True, null=True, verbose_name='GPA tích lũy')),
+                ('tong_tin_chi', models.IntegerField(default=0, verbose_name='Tổng tín chỉ tích lũy')),
+                ('tong_diem_tich_luy', models.FloatField(default=0.0, verbose_name='Tổng điểm tích lũy')),
+                ('hoc_ky_cuoi', models.CharField(blank=True, choices=[('1', 'Học kỳ 1'), ('2', 'Học kỳ 2'), ('3', 'Học kỳ hè')], max_length=1, verbose_name='Học kỳ gần nhất')),
+                ('nam_hoc_cuoi', models.CharField(blank=True, max_length=20, verbose_name='Năm học gần nhất')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cumulative_gpa', to='student.student', verbose_name='Sinh viên')),
+            ],
+            options={
+                'verbose_name': 'GPA tích lũy',
+                'verbose_name_plural': 'GPA tích lũy',
+            },
+        ),
+    ]
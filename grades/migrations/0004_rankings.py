@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0003_cumulativegpa'),
+        ('student', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pham_vi', models.CharField(max_length=7, verbose_name='Phạm vi')),
+                ('nhom', models.CharField(blank=True, max_length=50, verbose_name='Nhóm')),
+                ('hoc_ky', models.CharField(choices=[('1', 'Học kỳ 1'), ('2', 'Học kỳ 2'), ('3', 'Học kỳ hè')], max_length=1, verbose_name='Học kỳ')),
+                ('nam_hoc', models.CharField(max_length=20, verbose_name='Năm học')),
+                ('is_stale', models.BooleanField(default=True, verbose_name='Cần tính lại')),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True, verbose_name='Tính lúc')),
+            ],
+            options={
+                'verbose_name': 'Nhóm xếp hạng',
+                'verbose_name_plural': 'Nhóm xếp hạng',
+                'unique_together': {('pham_vi', 'hoc_ky', 'nam_hoc', 'nhom')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentRank',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pham_vi', models.CharField(choices=[('all', 'Toàn trường'), ('class', 'Lớp học'), ('cohort', 'Lớp sinh hoạt'), ('subject', 'Môn học')], max_length=7, verbose_name='Phạm vi')),
+                ('nhom', models.CharField(blank=True, max_length=50, verbose_name='Nhóm')),
+                ('hoc_ky', models.CharField(choices=[('1', 'Học kỳ 1'), ('2', 'Học kỳ 2'), ('3', 'Học kỳ hè')], max_length=1, verbose_name='Học kỳ')),
+                ('nam_hoc', models.CharField(max_length=20, verbose_name='Năm học')),
+                ('gia_tri', models.FloatField(verbose_name='Giá trị')),
+                ('hang', models.PositiveIntegerField(verbose_name='Hạng')),
+                ('top_phan_tram', models.FloatField(verbose_name='Top %')),
+                ('si_so', models.PositiveIntegerField(verbose_name='Sĩ số')),
+                ('student', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ranks', to='student.student', verbose_name='Sinh viên')),
+            ],
+            options={
+                'verbose_name': 'Xếp hạng',
+                'verbose_name_plural': 'Xếp hạng',
+                'indexes': [models.Index(fields=['pham_vi', 'hoc_ky', 'nam_hoc', 'nhom', 'hang'], name='rank_board_idx'), models.Index(fields=['student', 'hoc_ky', 'nam_hoc'], name='rank_student_term_idx')],
+                'unique_together': {('pham_vi', 'hoc_ky', 'nam_hoc', 'nhom', 'student')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:45
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0004_rankings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeWeightScheme',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trong_so_qua_trinh', models.FloatField(validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(1.0)], verbose_name='Trọng số quá trình')),
+                ('trong_so_giua_ky', models.FloatField(validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(1.0)], verbose_name='Trọng số giữa kỳ')),
+                ('trong_so_cuoi_ky', models.FloatField(validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(1.0)], verbose_name='Trọng số cuối kỳ')),
+                ('tu_hoc_ky', models.CharField(choices=[('1', 'Học kỳ 1'), ('2', 'Học kỳ 2'), ('3', 'Học kỳ hè')], max_length=1, verbose_name='Từ học kỳ')),
+                ('tu_nam_hoc', models.CharField(max_length=20, verbose_name='Từ năm học')),
+                ('den_hoc_ky', models.CharField(blank=True, choices=[('1', 'Học kỳ 1'), ('2', 'Học kỳ 2'), ('3', 'Học kỳ hè')], max_length=1, verbose_name='Đến học kỳ')),
+                ('den_nam_hoc', models.CharField(blank=True, max_length=20, verbose_name='Đến năm học')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weight_schemes', to='grades.subject', verbose_name='Môn học')),
+            ],
+            options={
+                'verbose_name': 'Trọng số điểm',
+                'verbose_name_plural': 'Trọng số điểm',
+                'ordering': ['subject', '-tu_nam_hoc', '-tu_hoc_ky'],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0005_gradeweightscheme'),
+        ('student', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grade',
+            name='diem_chu',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(diem_tong_ket__gte=9.0, then=models.Value('A+')), models.When(diem_tong_ket__gte=8.5, then=models.Value('A')), models.When(diem_tong_ket__gte=8.0, then=models.Value('B+')), models.When(diem_tong_ket__gte=7.0, then=models.Value('B')), models.When(diem_tong_ket__gte=6.5, then=models.Value('C+')), models.When(diem_tong_ket__gte=5.5, then=models.Value('C')), models.When(diem_tong_ket__gte=5.0, then=models.Value('D+')), models.When(diem_tong_ket__gte=4.0, then=models.Value('D')), models.When(diem_tong_ket__isnull=False, then=models.Value('F')), default=None), output_field=models.CharField(max_length=2, null=True), verbose_name='Điểm chữ'),
+        ),
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['hoc_ky', 'nam_hoc', 'diem_chu'], name='grade_term_letter_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['subject', 'hoc_ky', 'nam_hoc', 'diem_tong_ket'], name='grade_subject_term_score_idx'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0001_initial'),
+        ('grades', '0006_grade_letter'),
+        ('student', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FinalizedTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hoc_ky', models.CharField(choices=[('1', 'Học kỳ 1'), ('2', 'Học kỳ 2'), ('3', 'Học kỳ hè')], max_length=1, verbose_name='Học kỳ')),
+                ('nam_hoc', models.CharField(max_length=20, verbose_name='Năm học')),
+                ('so_diem', models.PositiveIntegerField(default=0, verbose_name='Số điểm')),
+                ('diem_tb', models.FloatField(blank=True, null=True, verbose_name='Điểm tổng kết trung bình')),
+                ('so_sv_dat', models.PositiveIntegerField(default=0, verbose_name='Số SV có môn đạt')),
+                ('so_sv_truot', models.PositiveIntegerField(default=0, verbose_name='Số SV có môn trượt')),
+                ('phan_bo', models.JSONField(default=dict, verbose_name='Phổ điểm chữ')),
+                ('finalized_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Khóa lúc')),
+                ('finalized_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Người khóa')),
+            ],
+            options={
+                'verbose_name': 'Học kỳ đã khóa',
+                'verbose_name_plural': 'Học kỳ đã khóa',
+                'ordering': ['-nam_hoc', '-hoc_ky'],
+                'unique_together': {('hoc_ky', 'nam_hoc')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TermClassSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('si_so', models.PositiveIntegerField(default=0, verbose_name='Sĩ số')),
+                ('so_sv_co_diem', models.PositiveIntegerField(default=0, verbose_name='Số SV có GPA')),
+                ('gpa_tb', models.FloatField(blank=True, null=True, verbose_name='GPA trung bình')),
+                ('gpa_cao_nhat', models.FloatField(blank=True, null=True, verbose_name='GPA cao nhất')),
+                ('gpa_thap_nhat', models.FloatField(blank=True, null=True, verbose_name='GPA thấp nhất')),
+                ('lop', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='term_summaries', to='classes.class', verbose_name='Lớp')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='class_summaries', to='grades.finalizedterm')),
+            ],
+            options={
+                'verbose_name': 'Tổng hợp lớp (học kỳ đã khóa)',
+                'verbose_name_plural': 'Tổng hợp lớp (học kỳ đã khóa)',
+                'unique_together': {('lop', 'term')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TermStudentSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gpa', models.FloatField(blank=True, null=True, verbose_name='GPA')),
+                ('tong_tin_chi', models.IntegerField(default=0, verbose_name='Tổng tín chỉ')),
+                ('tong_diem_tich_luy', models.FloatField(default=0.0, verbose_name='Tổng điểm tích lũy')),
+                ('so_mon', models.PositiveIntegerField(default=0, verbose_name='Số môn')),
+                ('so_mon_dat', models.PositiveIntegerField(default=0, verbose_name='Số môn đạt')),
+                ('hang_toan_truong', models.PositiveIntegerField(blank=True, null=True, verbose_name='Hạng toàn trường')),
+                ('bang_diem', models.JSONField(default=list, verbose_name='Bảng điểm')),
+                ('student', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='term_summaries', to='student.student', verbose_name='Sinh viên')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_summaries', to='grades.finalizedterm')),
+            ],
+            options={
+                'verbose_name': 'Tổng hợp sinh viên (học kỳ đã khóa)',
+                'verbose_name_plural': 'Tổng hợp sinh viên (học kỳ đã khóa)',
+                'unique_together': {('student', 'term')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TermSubjectSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('so_luong', models.PositiveIntegerField(default=0, verbose_name='Số điểm')),
+                ('diem_tb', models.FloatField(blank=True, null=True, verbose_name='Điểm trung bình')),
+                ('diem_cao_nhat', models.FloatField(blank=True, null=True, verbose_name='Điểm cao nhất')),
+                ('diem_thap_nhat', models.FloatField(blank=True, null=True, verbose_name='Điểm thấp nhất')),
+                ('so_dat', models.PositiveIntegerField(default=0, verbose_name='Số đạt')),
+                ('so_truot', models.PositiveIntegerField(default=0, verbose_name='Số trượt')),
+                ('phan_bo', models.JSONField(default=dict, verbose_name='Phổ điểm chữ')),
+                ('subject', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='term_summaries', to='grades.subject', verbose_name='Môn học')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subject_summaries', to='grades.finalizedterm')),
+            ],
+            options={
+                'verbose_name': 'Tổng hợp môn (học kỳ đã khóa)',
+                'verbose_name_plural': 'Tổng hợp môn (học kỳ đã khóa)',
+                'unique_together': {('subject', 'term')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0007_finalizedterm_termclasssummary_termstudentsummary_and_more'),
+        ('student', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AcademicWarning',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ly_do', models.CharField(choices=[('low_gpa_streak', 'GPA học kỳ thấp liên tiếp'), ('failed_credits', 'Nợ tín chỉ'), ('low_cumulative', 'GPA tích lũy thấp')], max_length=20, verbose_name='Lý do')),
+                ('muc_do', models.PositiveSmallIntegerField(choices=[(1, 'Nhắc nhở'), (2, 'Cảnh báo'), (3, 'Nghiêm trọng')], verbose_name='Mức độ')),
+                ('gia_tri', models.FloatField(verbose_name='Giá trị')),
+                ('mo_ta', models.CharField(max_length=255, verbose_name='Mô tả')),
+                ('hoc_ky', models.CharField(blank=True, choices=[('1', 'Học kỳ 1'), ('2', 'Học kỳ 2'), ('3', 'Học kỳ hè')], max_length=1, verbose_name='Học kỳ')),
+                ('nam_hoc', models.CharField(blank=True, max_length=20, verbose_name='Năm học')),
+                ('evaluated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Xét lúc')),
+                ('student', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='academic_warnings', to='student.student', verbose_name='Sinh viên')),
+            ],
+            options={
+                'verbose_name': 'Cảnh báo học vụ',
+                'verbose_name_plural': 'Cảnh báo học vụ',
+                'indexes': [models.Index(fields=['muc_do', 'ly_do'], name='acad_warning_level_idx')],
+                'unique_together': {('student', 'ly_do')},
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0008_academicwarning'),
+        ('student', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='finalizedterm',
+            name='da_luu_tru',
+            field=models.BooleanField(default=False, verbose_name='Đã lưu trữ'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedGrade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hoc_ky', models.CharField(choices=[('1', 'Học kỳ 1'), ('2', 'Học kỳ 2'), ('3', 'Học kỳ hè')], max_length=1, verbose_name='Học kỳ')),
+                ('nam_hoc', models.CharField(max_length=20, verbose_name='Năm học')),
+                ('diem_qua_trinh', models.FloatField(blank=True, null=True, verbose_name='Điểm quá trình')),
+                ('diem_giua_ky', models.FloatField(blank=True, null=True, verbose_name='Điểm giữa kỳ')),
+                ('diem_cuoi_ky', models.FloatField(blank=True, null=True, verbose_name='Điểm cuối kỳ')),
+                ('diem_tong_ket', models.FloatField(blank=True, null=True, verbose_name='Điểm tổng kết')),
+                ('diem_chu', models.CharField(blank=True, max_length=2, null=True, verbose_name='Điểm chữ')),
+                ('ghi_chu', models.TextField(blank=True, verbose_name='Ghi chú')),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('student', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_grades', to='student.student', verbose_name='Sinh viên')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_grades', to='grades.subject', verbose_name='Môn học')),
+            ],
+            options={
+                'verbose_name': 'Điểm số (lưu trữ)',
+                'verbose_name_plural': 'Điểm số (lưu trữ)',
+                'ordering': ['-nam_hoc', 'hoc_ky', 'subject'],
+                'unique_together': {('student', 'subject', 'hoc_ky', 'nam_hoc')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedStudentGPA',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hoc_ky', models.CharField(choices=[('1', 'Học kỳ 1'), ('2', 'Học kỳ 2'), ('3', 'Học kỳ hè')], max_length=1, verbose_name='Học kỳ')),
+                ('nam_hoc', models.CharField(max_length=20, verbose_name='Năm học')),
+                ('gpa', models.FloatField(blank=True, null=True, verbose_name='GPA')),
+                ('tong_tin_chi', models.IntegerField(default=0, verbose_name='Tổng tín chỉ')),
+                ('tong_diem_tich_luy', models.FloatField(default=0.0, verbose_name='Tổng điểm tích lũy')),
+                ('student', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_gpa_records', to='student.student', verbose_name='Sinh viên')),
+            ],
+            options={
+                'verbose_name': 'GPA học kỳ (lưu trữ)',
+                'verbose_name_plural': 'GPA học kỳ (lưu trữ)',
+                'ordering': ['-nam_hoc', 'hoc_ky'],
+                'unique_together': {('student', 'hoc_ky', 'nam_hoc')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0009_finalizedterm_da_luu_tru_archivedgrade_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nhom', models.CharField(blank=True, max_length=50, verbose_name='Nhóm')),
+                ('hoc_ky', models.CharField(choices=[('1', 'Học kỳ 1'), ('2', 'Học kỳ 2'), ('3', 'Học kỳ hè')], max_length=1, verbose_name='Học kỳ')),
+                ('nam_hoc', models.CharField(max_length=20, verbose_name='Năm học')),
+                ('so_luong', models.PositiveIntegerField(default=0, verbose_name='Số điểm')),
+                ('tong_diem', models.FloatField(default=0.0, verbose_name='Tổng điểm')),
+                ('tong_binh_phuong', models.FloatField(default=0.0, verbose_name='Tổng bình phương điểm')),
+                ('so_dat', models.PositiveIntegerField(default=0, verbose_name='Số đạt')),
+                ('so_truot', models.PositiveIntegerField(default=0, verbose_name='Số trượt')),
+                ('phan_bo', models.JSONField(default=list, verbose_name='Phổ điểm')),
+                ('subject', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='grades.subject', verbose_name='Môn học')),
+            ],
+            options={
+                'verbose_name': 'Tổng hợp điểm theo học kỳ',
+                'verbose_name_plural': 'Tổng hợp điểm theo học kỳ',
+                'indexes': [models.Index(fields=['nhom', 'nam_hoc', 'hoc_ky'], name='rollup_group_term_idx')],
+                'unique_together': {('subject', 'nhom', 'nam_hoc', 'hoc_ky')},
+            },
+        ),
+    ]
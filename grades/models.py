@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models import Avg, Sum
+from django.db.models import Avg, Count, F, Max, Sum
+from django.db.models.functions import Concat
 from student.models import Student
 
 
@@ -22,6 +26,29 @@ class Subject(models.Model):
     def __str__(self):
         return f"{self.ma_mon} - {self.ten_mon}"
 
+    def get_weights(self, hoc_ky, nam_hoc):
+        """Trọng số (quá trình, giữa kỳ, cuối kỳ) áp dụng cho môn trong một học kỳ"""
+        return resolve_weights(self.weight_schemes.all(), hoc_ky, nam_hoc)
+
+
+def term_key(hoc_ky, nam_hoc):
+    """Khóa so sánh được của học kỳ, ví dụ '2024-20252' (cùng cách với CumulativeGPA)"""
+    return f"{nam_hoc}{hoc_ky}"
+
+
+def resolve_weights(schemes, hoc_ky, nam_hoc):
+    """
+    Chọn trọng số có hiệu lực tại học kỳ từ danh sách GradeWeightScheme của
+    một môn: bảng có thời điểm bắt đầu muộn nhất còn bao học kỳ đó; không có
+    thì dùng Grade.FINAL_GRADE_WEIGHTS
+    """
+    key = term_key(hoc_ky, nam_hoc)
+    best = None
+    for scheme in schemes:
+        if scheme.covers(key) and (best is None or scheme.start_key > best.start_key):
+            best = scheme
+    return best.weights if best is not None else Grade.FINAL_GRADE_WEIGHTS
+
 
 class Grade(models.Model):
     """Model điểm số"""
@@ -30,6 +57,14 @@ class Grade(models.Model):
         ('2', 'Học kỳ 2'),
         ('3', 'Học kỳ hè'),
     ]
+    # Trọng số (quá trình, giữa kỳ, cuối kỳ) của điểm tổng kết
+    FINAL_GRADE_WEIGHTS = (0.2, 0.3, 0.5)
+    # Ngưỡng điểm chữ, xét từ cao xuống thấp; dưới ngưỡng cuối là F
+    LETTER_GRADE_THRESHOLDS = [
+        (9.0, 'A+'), (8.5, 'A'), (8.0, 'B+'), (7.0, 'B'),
+        (6.5, 'C+'), (5.5, 'C'), (5.0, 'D+'), (4.0, 'D'),
+    ]
+    LETTER_GRADES = [letter for threshold, letter in LETTER_GRADE_THRESHOLDS] + ['F']
 
     student = models.ForeignKey(
         Student,
@@ -69,6 +104,21 @@ class Grade(models.Model):
         blank=True,
         verbose_name="Điểm tổng kết"
     )
+    # Điểm chữ do database tính từ diem_tong_ket nên luôn khớp, kể cả với
+    # bulk_create / bulk_update / QuerySet.update
+    diem_chu = models.GeneratedField(
+        expression=models.Case(
+            *[
+                models.When(diem_tong_ket__gte=threshold, then=models.Value(letter))
+                for threshold, letter in LETTER_GRADE_THRESHOLDS
+            ],
+            models.When(diem_tong_ket__isnull=False, then=models.Value('F')),
+            default=None,
+        ),
+        output_field=models.CharField(max_length=2, null=True),
+        db_persist=True,
+        verbose_name="Điểm chữ"
+    )
     ghi_chu = models.TextField(blank=True, verbose_name="Ghi chú")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -78,20 +128,35 @@ class Grade(models.Model):
         verbose_name_plural = "Điểm số"
         unique_together = ['student', 'subject', 'hoc_ky', 'nam_hoc']
         ordering = ['-nam_hoc', 'hoc_ky', 'subject']
+        indexes = [
+            models.Index(fields=['hoc_ky', 'nam_hoc', 'diem_chu'], name='grade_term_letter_idx'),
+            models.Index(fields=['subject', 'hoc_ky', 'nam_hoc', 'diem_tong_ket'], name='grade_subject_term_score_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.ma_sv} - {self.subject.ten_mon} - HK{self.hoc_ky}"
 
-    def calculate_final_grade(self):
-        """Tính điểm tổng kết dựa trên điểm quá trình, giữa kỳ và cuối kỳ"""
+    def calculate_final_grade(self, weights=None):
+        """
+        Tính điểm tổng kết dựa trên điểm quá trình, giữa kỳ và cuối kỳ
+        weights: trọng số đã tra sẵn; None thì lấy theo bảng trọng số của môn
+        """
         if self.diem_cuoi_ky is not None:
-            # Công thức: 20% quá trình + 30% giữa kỳ + 50% cuối kỳ
+            # Mặc định: 20% quá trình + 30% giữa kỳ + 50% cuối kỳ
             diem_qt = self.diem_qua_trinh or 0
             diem_gk = self.diem_giua_ky or 0
             diem_ck = self.diem_cuoi_ky or 0
-            return round(diem_qt * 0.2 + diem_gk * 0.3 + diem_ck * 0.5, 2)
+            if weights is None:
+                weights = self.subject.get_weights(self.hoc_ky, self.nam_hoc)
+            w_qt, w_gk, w_ck = weights
+            return round(diem_qt * w_qt + diem_gk * w_gk + diem_ck * w_ck, 2)
         return None
 
+    def clean(self):
+        super().clean()
+        if self.hoc_ky and self.nam_hoc and FinalizedTerm.is_finalized(self.hoc_ky, self.nam_hoc):
+            raise ValidationError(f"Học kỳ {self.hoc_ky} năm học {self.nam_hoc} đã khóa điểm.")
+
     def save(self, *args, **kwargs):
         """Tự động tính điểm tổng kết khi lưu"""
         if self.diem_cuoi_ky is not None:
@@ -99,27 +164,92 @@ class Grade(models.Model):
         super().save(*args, **kwargs)
 
     def get_letter_grade(self):
-        """Chuyển đổi điểm số sang chữ"""
+        """
+        Chuyển đổi điểm số sang chữ theo cùng ngưỡng với cột diem_chu
+        (dùng cho đối tượng chưa lưu hoặc vừa sửa; khi đọc từ database dùng diem_chu)
+        """
         if self.diem_tong_ket is None:
             return "Chưa có điểm"
-        if self.diem_tong_ket >= 9.0:
-            return "A+"
-        elif self.diem_tong_ket >= 8.5:
-            return "A"
-        elif self.diem_tong_ket >= 8.0:
-            return "B+"
-        elif self.diem_tong_ket >= 7.0:
-            return "B"
-        elif self.diem_tong_ket >= 6.5:
-            return "C+"
-        elif self.diem_tong_ket >= 5.5:
-            return "C"
-        elif self.diem_tong_ket >= 5.0:
-            return "D+"
-        elif self.diem_tong_ket >= 4.0:
-            return "D"
-        else:
-            return "F"
+        for threshold, letter in self.LETTER_GRADE_THRESHOLDS:
+            if self.diem_tong_ket >= threshold:
+                return letter
+        return "F"
+
+    @staticmethod
+    def letter_histogram(queryset):
+        """Số điểm theo từng điểm chữ, một truy vấn GROUP BY trong database"""
+        counts = dict(
+            queryset.filter(diem_chu__isnull=False).order_by()
+            .values_list('diem_chu').annotate(total=Count('id'))
+        )
+        return {letter: counts.get(letter, 0) for letter in Grade.LETTER_GRADES}
+
+
+class GradeWeightScheme(models.Model):
+    """Trọng số điểm tổng kết của một môn, có hiệu lực trong một khoảng học kỳ"""
+    subject = models.ForeignKey(
+        Subject,
+        on_delete=models.CASCADE,
+        related_name='weight_schemes',
+        verbose_name="Môn học"
+    )
+    trong_so_qua_trinh = models.FloatField(
+        validators=[MinValueValidator(0.0), MaxValueValidator(1.0)],
+        verbose_name="Trọng số quá trình"
+    )
+    trong_so_giua_ky = models.FloatField(
+        validators=[MinValueValidator(0.0), MaxValueValidator(1.0)],
+        verbose_name="Trọng số giữa kỳ"
+    )
+    trong_so_cuoi_ky = models.FloatField(
+        validators=[MinValueValidator(0.0), MaxValueValidator(1.0)],
+        verbose_name="Trọng số cuối kỳ"
+    )
+    tu_hoc_ky = models.CharField(max_length=1, choices=Grade.HOC_KY_CHOICES, verbose_name="Từ học kỳ")
+    tu_nam_hoc = models.CharField(max_length=20, verbose_name="Từ năm học")
+    # Bỏ trống: còn hiệu lực
+    den_hoc_ky = models.CharField(max_length=1, choices=Grade.HOC_KY_CHOICES, blank=True, verbose_name="Đến học kỳ")
+    den_nam_hoc = models.CharField(max_length=20, blank=True, verbose_name="Đến năm học")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Trọng số điểm"
+        verbose_name_plural = "Trọng số điểm"
+        ordering = ['subject', '-tu_nam_hoc', '-tu_hoc_ky']
+
+    def __str__(self):
+        qt, gk, ck = (round(w * 100) for w in self.weights)
+        return f"{self.subject.ma_mon}: {qt}/{gk}/{ck} từ HK{self.tu_hoc_ky} {self.tu_nam_hoc}"
+
+    @property
+    def weights(self):
+        return (self.trong_so_qua_trinh, self.trong_so_giua_ky, self.trong_so_cuoi_ky)
+
+    @property
+    def start_key(self):
+        return term_key(self.tu_hoc_ky, self.tu_nam_hoc)
+
+    @property
+    def end_key(self):
+        if not self.den_nam_hoc:
+            return None
+        return term_key(self.den_hoc_ky or '3', self.den_nam_hoc)
+
+    def covers(self, key):
+        """key: term_key(hoc_ky, nam_hoc)"""
+        end_key = self.end_key
+        return self.start_key <= key and (end_key is None or key <= end_key)
+
+    def clean(self):
+        if None in self.weights:
+            return
+        if abs(sum(self.weights) - 1.0) > 1e-6:
+            raise ValidationError("Tổng ba trọng số phải bằng 1 (100%).")
+        if self.den_hoc_ky and not self.den_nam_hoc:
+            raise ValidationError("Vui lòng nhập năm học kết thúc.")
+        if self.end_key is not None and self.end_key < self.start_key:
+            raise ValidationError("Học kỳ kết thúc phải sau học kỳ bắt đầu.")
 
 
 class StudentGPA(models.Model):
@@ -150,30 +280,535 @@ class StudentGPA(models.Model):
     def __str__(self):
         return f"{self.student.ma_sv} - HK{self.hoc_ky} - GPA: {self.gpa or 'N/A'}"
 
+    @staticmethod
+    def _credit_totals():
+        """Biểu thức tổng tín chỉ và tổng điểm tích lũy (tính trong database)"""
+        return {
+            'total_credits': Sum('subject__so_tin_chi'),
+            'total_points': Sum(
+                F('diem_tong_ket') * F('subject__so_tin_chi'),
+                output_field=models.FloatField()
+            ),
+        }
+
     @staticmethod
     def calculate_gpa(student, hoc_ky, nam_hoc):
-        """Tính GPA cho sinh viên trong một học kỳ"""
-        grades = Grade.objects.filter(
+        """Tính GPA cho sinh viên trong một học kỳ (một truy vấn aggregate)"""
+        totals = Grade.objects.filter(
             student=student,
             hoc_ky=hoc_ky,
             nam_hoc=nam_hoc,
             diem_tong_ket__isnull=False
-        )
+        ).aggregate(**StudentGPA._credit_totals())
 
-        if not grades.exists():
+        total_credits = totals['total_credits'] or 0
+        total_points = totals['total_points'] or 0.0
+        if total_credits == 0:
             return None, 0, 0.0
 
-        total_credits = 0
-        total_points = 0.0
+        gpa = round(total_points / total_credits, 2)
+        return gpa, total_credits, total_points
 
-        for grade in grades:
-            credits = grade.subject.so_tin_chi
-            score = grade.diem_tong_ket
-            total_credits += credits
-            total_points += score * credits
+    @staticmethod
+    def calculate_gpa_many(student_ids, hoc_ky, nam_hoc):
+        """
+        Tính GPA cho nhiều sinh viên trong một học kỳ bằng một truy vấn GROUP BY
+        Trả về dict {student_id: (gpa, tổng tín chỉ, tổng điểm tích lũy)},
+        sinh viên không có điểm sẽ không có trong kết quả.
+        """
+        rows = Grade.objects.filter(
+            student_id__in=student_ids,
+            hoc_ky=hoc_ky,
+            nam_hoc=nam_hoc,
+            diem_tong_ket__isnull=False
+        ).order_by().values('student_id').annotate(**StudentGPA._credit_totals())
 
-        if total_credits == 0:
-            return None, 0, 0.0
+        result = {}
+        for row in rows:
+            total_credits = row['total_credits'] or 0
+            if total_credits == 0:
+                continue
+            total_points = row['total_points'] or 0.0
+            result[row['student_id']] = (
+                round(total_points / total_credits, 2), total_credits, total_points
+            )
+        return result
 
-        gpa = round(total_points / total_credits, 2)
-        return gpa, total_credits, total_points
\ No newline at end of file
+
+class CumulativeGPA(models.Model):
+    """GPA tích lũy của sinh viên qua tất cả học kỳ (môn học lại chỉ tính lần điểm cao nhất)"""
+    student = models.OneToOneField(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='cumulative_gpa',
+        verbose_name="Sinh viên"
+    )
+    gpa = models.FloatField(null=True, blank=True, verbose_name="GPA tích lũy")
+    tong_tin_chi = models.IntegerField(default=0, verbose_name="Tổng tín chỉ tích lũy")
+    tong_diem_tich_luy = models.FloatField(default=0.0, verbose_name="Tổng điểm tích lũy")
+    hoc_ky_cuoi = models.CharField(max_length=1, choices=Grade.HOC_KY_CHOICES, blank=True, verbose_name="Học kỳ gần nhất")
+    nam_hoc_cuoi = models.CharField(max_length=20, blank=True, verbose_name="Năm học gần nhất")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "GPA tích lũy"
+        verbose_name_plural = "GPA tích lũy"
+
+    def __str__(self):
+        return f"{self.student.ma_sv} - GPA tích lũy: {self.gpa or 'N/A'}"
+
+    @staticmethod
+    def calculate_many(student_ids):
+        """
+        Tính GPA tích lũy cho nhiều sinh viên bằng truy vấn GROUP BY (sinh viên,
+        môn) trên Grade và ArchivedGrade: mỗi môn lấy điểm tổng kết cao nhất qua
+        các lần học.
+        Trả về dict {student_id: (gpa, tổng tín chỉ, tổng điểm tích lũy,
+        học kỳ gần nhất, năm học gần nhất)}; sinh viên không có điểm không có
+        trong kết quả.
+        """
+        # Điểm của năm học đã lưu trữ nằm ở ArchivedGrade: gộp hai bảng theo (sinh viên, môn)
+        subjects = {}
+        for model in (Grade, ArchivedGrade):
+            rows = model.objects.filter(student_id__in=student_ids).order_by().values(
+                'student_id', 'subject_id', 'subject__so_tin_chi'
+            ).annotate(
+                best=Max('diem_tong_ket'),
+                # nam_hoc + hoc_ky, ví dụ '2024-20252', so sánh được theo chuỗi
+                last_term=Max(Concat('nam_hoc', 'hoc_ky'))
+            )
+            for row in rows:
+                key = (row['student_id'], row['subject_id'])
+                credits, best, last_term = subjects.get(key, (row['subject__so_tin_chi'], None, ''))
+                if row['best'] is not None and (best is None or row['best'] > best):
+                    best = row['best']
+                subjects[key] = (credits, best, max(last_term, row['last_term']))
+
+        totals = {}
+        for (student_id, subject_id), (subject_credits, best, subject_last_term) in subjects.items():
+            credits, points, last_term = totals.get(student_id, (0, 0.0, ''))
+            if best is not None:
+                credits += subject_credits
+                points += best * subject_credits
+            totals[student_id] = (credits, points, max(last_term, subject_last_term))
+
+        result = {}
+        for student_id, (credits, points, last_term) in totals.items():
+            gpa = round(points / credits, 2) if credits else None
+            result[student_id] = (gpa, credits, round(points, 4), last_term[-1:], last_term[:-1])
+        return result
+
+
+class RankPartition(models.Model):
+    """Trạng thái của một nhóm xếp hạng (phạm vi + nhóm + học kỳ)"""
+    pham_vi = models.CharField(max_length=7, verbose_name="Phạm vi")
+    nhom = models.CharField(max_length=50, blank=True, verbose_name="Nhóm")
+    hoc_ky = models.CharField(max_length=1, choices=Grade.HOC_KY_CHOICES, verbose_name="Học kỳ")
+    nam_hoc = models.CharField(max_length=20, verbose_name="Năm học")
+    is_stale = models.BooleanField(default=True, verbose_name="Cần tính lại")
+    refreshed_at = models.DateTimeField(null=True, blank=True, verbose_name="Tính lúc")
+
+    class Meta:
+        verbose_name = "Nhóm xếp hạng"
+        verbose_name_plural = "Nhóm xếp hạng"
+        unique_together = ['pham_vi', 'hoc_ky', 'nam_hoc', 'nhom']
+
+    def __str__(self):
+        return f"{self.pham_vi}:{self.nhom} - HK{self.hoc_ky} {self.nam_hoc}"
+
+
+class StudentRank(models.Model):
+    """Thứ hạng đã tính sẵn của sinh viên trong một nhóm xếp hạng"""
+    SCOPE_CHOICES = [
+        ('all', 'Toàn trường'),
+        ('class', 'Lớp học'),
+        ('cohort', 'Lớp sinh hoạt'),
+        ('subject', 'Môn học'),
+    ]
+
+    pham_vi = models.CharField(max_length=7, choices=SCOPE_CHOICES, verbose_name="Phạm vi")
+    # id lớp / tên lớp sinh hoạt (Student.lop) / id môn, rỗng với 'all'
+    nhom = models.CharField(max_length=50, blank=True, verbose_name="Nhóm")
+    hoc_ky = models.CharField(max_length=1, choices=Grade.HOC_KY_CHOICES, verbose_name="Học kỳ")
+    nam_hoc = models.CharField(max_length=20, verbose_name="Năm học")
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='ranks',
+        db_index=False,
+        verbose_name="Sinh viên"
+    )
+    # GPA học kỳ, hoặc điểm tổng kết với phạm vi 'subject'
+    gia_tri = models.FloatField(verbose_name="Giá trị")
+    hang = models.PositiveIntegerField(verbose_name="Hạng")
+    top_phan_tram = models.FloatField(verbose_name="Top %")
+    si_so = models.PositiveIntegerField(verbose_name="Sĩ số")
+
+    class Meta:
+        verbose_name = "Xếp hạng"
+        verbose_name_plural = "Xếp hạng"
+        unique_together = ['pham_vi', 'hoc_ky', 'nam_hoc', 'nhom', 'student']
+        indexes = [
+            models.Index(
+                fields=['pham_vi', 'hoc_ky', 'nam_hoc', 'nhom', 'hang'],
+                name='rank_board_idx'
+            ),
+            models.Index(fields=['student', 'hoc_ky', 'nam_hoc'], name='rank_student_term_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.pham_vi}:{self.nhom} - hạng {self.hang}/{self.si_so}"
+
+
+class GradeHistory(models.Model):
+    """Lịch sử thay đổi điểm (chỉ ghi thêm, không sửa/xóa)"""
+    ACTION_CHOICES = [
+        ('create', 'Tạo mới'),
+        ('update', 'Cập nhật'),
+        ('delete', 'Xóa'),
+    ]
+
+    # Khóa của Grade (student, subject, hoc_ky, nam_hoc) thay cho grade_id để
+    # lịch sử còn nguyên sau khi điểm bị xóa
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='grade_history',
+        db_index=False,
+        verbose_name="Sinh viên"
+    )
+    subject = models.ForeignKey(
+        Subject,
+        on_delete=models.CASCADE,
+        related_name='grade_history',
+        db_index=False,
+        verbose_name="Môn học"
+    )
+    hoc_ky = models.CharField(max_length=1, choices=Grade.HOC_KY_CHOICES, verbose_name="Học kỳ")
+    nam_hoc = models.CharField(max_length=20, verbose_name="Năm học")
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES, verbose_name="Thao tác")
+    old_qua_trinh = models.FloatField(null=True, blank=True)
+    old_giua_ky = models.FloatField(null=True, blank=True)
+    old_cuoi_ky = models.FloatField(null=True, blank=True)
+    old_tong_ket = models.FloatField(null=True, blank=True)
+    new_qua_trinh = models.FloatField(null=True, blank=True)
+    new_giua_ky = models.FloatField(null=True, blank=True)
+    new_cuoi_ky = models.FloatField(null=True, blank=True)
+    new_tong_ket = models.FloatField(null=True, blank=True)
+    changed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Người thay đổi"
+    )
+    changed_at = models.DateTimeField(default=timezone.now, verbose_name="Thời điểm")
+
+    class Meta:
+        verbose_name = "Lịch sử điểm"
+        verbose_name_plural = "Lịch sử điểm"
+        ordering = ['-changed_at', '-id']
+        indexes = [
+            models.Index(
+                fields=['student', 'hoc_ky', 'nam_hoc', 'changed_at'],
+                name='grade_hist_student_term_idx'
+            ),
+            models.Index(
+                fields=['subject', 'hoc_ky', 'nam_hoc', 'student', 'changed_at'],
+                name='grade_hist_subject_term_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.subject_id} - HK{self.hoc_ky} {self.nam_hoc} - {self.action}"
+
+
+class FinalizedTerm(models.Model):
+    """
+    Học kỳ đã khóa điểm: không sửa điểm được nữa, các trang đọc dùng bảng
+    tổng hợp tính sẵn (TermStudentSummary, TermClassSummary, TermSubjectSummary)
+    """
+    hoc_ky = models.CharField(max_length=1, choices=Grade.HOC_KY_CHOICES, verbose_name="Học kỳ")
+    nam_hoc = models.CharField(max_length=20, verbose_name="Năm học")
+    # Tổng hợp cả học kỳ (cho dashboard)
+    so_diem = models.PositiveIntegerField(default=0, verbose_name="Số điểm")
+    diem_tb = models.FloatField(null=True, blank=True, verbose_name="Điểm tổng kết trung bình")
+    so_sv_dat = models.PositiveIntegerField(default=0, verbose_name="Số SV có môn đạt")
+    so_sv_truot = models.PositiveIntegerField(default=0, verbose_name="Số SV có môn trượt")
+    phan_bo = models.JSONField(default=dict, verbose_name="Phổ điểm chữ")
+    finalized_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Người khóa"
+    )
+    finalized_at = models.DateTimeField(default=timezone.now, verbose_name="Khóa lúc")
+    # Điểm và GPA của học kỳ đã được chuyển sang ArchivedGrade / ArchivedStudentGPA
+    da_luu_tru = models.BooleanField(default=False, verbose_name="Đã lưu trữ")
+
+    class Meta:
+        verbose_name = "Học kỳ đã khóa"
+        verbose_name_plural = "Học kỳ đã khóa"
+        unique_together = ['hoc_ky', 'nam_hoc']
+        ordering = ['-nam_hoc', '-hoc_ky']
+
+    def __str__(self):
+        return f"HK{self.hoc_ky} {self.nam_hoc}"
+
+    @staticmethod
+    def is_finalized(hoc_ky, nam_hoc):
+        return FinalizedTerm.objects.filter(hoc_ky=hoc_ky, nam_hoc=nam_hoc).exists()
+
+    @staticmethod
+    def finalized_among(terms):
+        """Các (học kỳ, năm học) đã khóa trong terms, một truy vấn"""
+        terms = set(terms)
+        if not terms:
+            return set()
+        condition = models.Q()
+        for hoc_ky, nam_hoc in terms:
+            condition |= models.Q(hoc_ky=hoc_ky, nam_hoc=nam_hoc)
+        return set(FinalizedTerm.objects.filter(condition).values_list('hoc_ky', 'nam_hoc'))
+
+
+class TermStudentSummary(models.Model):
+    """Bảng điểm và GPA của sinh viên trong học kỳ đã khóa (không đổi sau khi khóa)"""
+    term = models.ForeignKey(FinalizedTerm, on_delete=models.CASCADE, related_name='student_summaries')
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='term_summaries',
+        db_index=False,
+        verbose_name="Sinh viên"
+    )
+    gpa = models.FloatField(null=True, blank=True, verbose_name="GPA")
+    tong_tin_chi = models.IntegerField(default=0, verbose_name="Tổng tín chỉ")
+    tong_diem_tich_luy = models.FloatField(default=0.0, verbose_name="Tổng điểm tích lũy")
+    so_mon = models.PositiveIntegerField(default=0, verbose_name="Số môn")
+    so_mon_dat = models.PositiveIntegerField(default=0, verbose_name="Số môn đạt")
+    hang_toan_truong = models.PositiveIntegerField(null=True, blank=True, verbose_name="Hạng toàn trường")
+    # [{'subject': {'ma_mon', 'ten_mon', 'so_tin_chi'}, 'diem_qua_trinh', ..., 'diem_chu'}]
+    bang_diem = models.JSONField(default=list, verbose_name="Bảng điểm")
+
+    class Meta:
+        verbose_name = "Tổng hợp sinh viên (học kỳ đã khóa)"
+        verbose_name_plural = "Tổng hợp sinh viên (học kỳ đã khóa)"
+        unique_together = ['student', 'term']
+
+    def __str__(self):
+        return f"{self.student_id} - {self.term}"
+
+
+class TermClassSummary(models.Model):
+    """GPA của lớp trong học kỳ đã khóa"""
+    term = models.ForeignKey(FinalizedTerm, on_delete=models.CASCADE, related_name='class_summaries')
+    lop = models.ForeignKey(
+        'classes.Class',
+        on_delete=models.CASCADE,
+        related_name='term_summaries',
+        db_index=False,
+        verbose_name="Lớp"
+    )
+    si_so = models.PositiveIntegerField(default=0, verbose_name="Sĩ số")
+    so_sv_co_diem = models.PositiveIntegerField(default=0, verbose_name="Số SV có GPA")
+    gpa_tb = models.FloatField(null=True, blank=True, verbose_name="GPA trung bình")
+    gpa_cao_nhat = models.FloatField(null=True, blank=True, verbose_name="GPA cao nhất")
+    gpa_thap_nhat = models.FloatField(null=True, blank=True, verbose_name="GPA thấp nhất")
+
+    class Meta:
+        verbose_name = "Tổng hợp lớp (học kỳ đã khóa)"
+        verbose_name_plural = "Tổng hợp lớp (học kỳ đã khóa)"
+        unique_together = ['lop', 'term']
+
+    def __str__(self):
+        return f"{self.lop_id} - {self.term}"
+
+
+class TermSubjectSummary(models.Model):
+    """Thống kê điểm của môn trong học kỳ đã khóa"""
+    term = models.ForeignKey(FinalizedTerm, on_delete=models.CASCADE, related_name='subject_summaries')
+    subject = models.ForeignKey(
+        Subject,
+        on_delete=models.CASCADE,
+        related_name='term_summaries',
+        db_index=False,
+        verbose_name="Môn học"
+    )
+    so_luong = models.PositiveIntegerField(default=0, verbose_name="Số điểm")
+    diem_tb = models.FloatField(null=True, blank=True, verbose_name="Điểm trung bình")
+    diem_cao_nhat = models.FloatField(null=True, blank=True, verbose_name="Điểm cao nhất")
+    diem_thap_nhat = models.FloatField(null=True, blank=True, verbose_name="Điểm thấp nhất")
+    so_dat = models.PositiveIntegerField(default=0, verbose_name="Số đạt")
+    so_truot = models.PositiveIntegerField(default=0, verbose_name="Số trượt")
+    phan_bo = models.JSONField(default=dict, verbose_name="Phổ điểm chữ")
+
+    class Meta:
+        verbose_name = "Tổng hợp môn (học kỳ đã khóa)"
+        verbose_name_plural = "Tổng hợp môn (học kỳ đã khóa)"
+        unique_together = ['subject', 'term']
+
+    def __str__(self):
+        return f"{self.subject_id} - {self.term}"
+
+    @property
+    def ty_le_dat(self):
+        return round(self.so_dat / self.so_luong * 100, 1) if self.so_luong else 0
+
+
+class AcademicWarning(models.Model):
+    """
+    Cảnh báo học vụ của sinh viên, ghi lại toàn bộ mỗi lần chạy
+    academic_warnings.evaluate_all (hằng đêm); dashboard chỉ đọc bảng này
+    """
+    REASON_CHOICES = [
+        ('low_gpa_streak', 'GPA học kỳ thấp liên tiếp'),
+        ('failed_credits', 'Nợ tín chỉ'),
+        ('low_cumulative', 'GPA tích lũy thấp'),
+    ]
+    LEVEL_CHOICES = [
+        (1, 'Nhắc nhở'),
+        (2, 'Cảnh báo'),
+        (3, 'Nghiêm trọng'),
+    ]
+
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='academic_warnings',
+        db_index=False,
+        verbose_name="Sinh viên"
+    )
+    ly_do = models.CharField(max_length=20, choices=REASON_CHOICES, verbose_name="Lý do")
+    muc_do = models.PositiveSmallIntegerField(choices=LEVEL_CHOICES, verbose_name="Mức độ")
+    gia_tri = models.FloatField(verbose_name="Giá trị")
+    mo_ta = models.CharField(max_length=255, verbose_name="Mô tả")
+    # Học kỳ gần nhất của sinh viên khi xét
+    hoc_ky = models.CharField(max_length=1, choices=Grade.HOC_KY_CHOICES, blank=True, verbose_name="Học kỳ")
+    nam_hoc = models.CharField(max_length=20, blank=True, verbose_name="Năm học")
+    evaluated_at = models.DateTimeField(default=timezone.now, verbose_name="Xét lúc")
+
+    class Meta:
+        verbose_name = "Cảnh báo học vụ"
+        verbose_name_plural = "Cảnh báo học vụ"
+        unique_together = ['student', 'ly_do']
+        indexes = [
+            # Danh sách cảnh báo nặng nhất trước (dashboard admin)
+            models.Index(fields=['muc_do', 'ly_do'], name='acad_warning_level_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.get_ly_do_display()} ({self.get_muc_do_display()})"
+
+
+class ArchivedGrade(models.Model):
+    """
+    Điểm của các năm học cũ đã khóa, chuyển khỏi bảng Grade (archive.archive_year)
+    Giữ nguyên id và các cột của Grade; diem_chu là cột thường vì không còn thay đổi.
+    """
+    is_archived = True
+
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='archived_grades',
+        db_index=False,
+        verbose_name="Sinh viên"
+    )
+    subject = models.ForeignKey(
+        Subject,
+        on_delete=models.CASCADE,
+        related_name='archived_grades',
+        verbose_name="Môn học"
+    )
+    hoc_ky = models.CharField(max_length=1, choices=Grade.HOC_KY_CHOICES, verbose_name="Học kỳ")
+    nam_hoc = models.CharField(max_length=20, verbose_name="Năm học")
+    diem_qua_trinh = models.FloatField(null=True, blank=True, verbose_name="Điểm quá trình")
+    diem_giua_ky = models.FloatField(null=True, blank=True, verbose_name="Điểm giữa kỳ")
+    diem_cuoi_ky = models.FloatField(null=True, blank=True, verbose_name="Điểm cuối kỳ")
+    diem_tong_ket = models.FloatField(null=True, blank=True, verbose_name="Điểm tổng kết")
+    diem_chu = models.CharField(max_length=2, null=True, blank=True, verbose_name="Điểm chữ")
+    ghi_chu = models.TextField(blank=True, verbose_name="Ghi chú")
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Điểm số (lưu trữ)"
+        verbose_name_plural = "Điểm số (lưu trữ)"
+        unique_together = ['student', 'subject', 'hoc_ky', 'nam_hoc']
+        ordering = ['-nam_hoc', 'hoc_ky', 'subject']
+
+    def __str__(self):
+        return f"{self.student_id} - {self.subject_id} - HK{self.hoc_ky} {self.nam_hoc}"
+
+
+class ArchivedStudentGPA(models.Model):
+    """GPA học kỳ của các năm học đã lưu trữ, cùng cột với StudentGPA"""
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='archived_gpa_records',
+        db_index=False,
+        verbose_name="Sinh viên"
+    )
+    hoc_ky = models.CharField(max_length=1, choices=Grade.HOC_KY_CHOICES, verbose_name="Học kỳ")
+    nam_hoc = models.CharField(max_length=20, verbose_name="Năm học")
+    gpa = models.FloatField(null=True, blank=True, verbose_name="GPA")
+    tong_tin_chi = models.IntegerField(default=0, verbose_name="Tổng tín chỉ")
+    tong_diem_tich_luy = models.FloatField(default=0.0, verbose_name="Tổng điểm tích lũy")
+
+    class Meta:
+        verbose_name = "GPA học kỳ (lưu trữ)"
+        verbose_name_plural = "GPA học kỳ (lưu trữ)"
+        unique_together = ['student', 'hoc_ky', 'nam_hoc']
+        ordering = ['-nam_hoc', 'hoc_ky']
+
+    def __str__(self):
+        return f"{self.student_id} - HK{self.hoc_ky} {self.nam_hoc} - GPA: {self.gpa or 'N/A'}"
+
+
+class GradeRollup(models.Model):
+    """
+    Số liệu cộng dồn của điểm tổng kết theo (môn, học kỳ, lớp), duy trì bởi
+    grades/rollups.py; các truy vấn xu hướng qua nhiều học kỳ chỉ đọc bảng này
+    """
+    subject = models.ForeignKey(
+        Subject,
+        on_delete=models.CASCADE,
+        related_name='rollups',
+        db_index=False,
+        verbose_name="Môn học"
+    )
+    # id lớp, rỗng với dòng tổng của cả môn (sinh viên có thể thuộc nhiều lớp hoặc không lớp nào)
+    nhom = models.CharField(max_length=50, blank=True, verbose_name="Nhóm")
+    hoc_ky = models.CharField(max_length=1, choices=Grade.HOC_KY_CHOICES, verbose_name="Học kỳ")
+    nam_hoc = models.CharField(max_length=20, verbose_name="Năm học")
+    so_luong = models.PositiveIntegerField(default=0, verbose_name="Số điểm")
+    tong_diem = models.FloatField(default=0.0, verbose_name="Tổng điểm")
+    tong_binh_phuong = models.FloatField(default=0.0, verbose_name="Tổng bình phương điểm")
+    so_dat = models.PositiveIntegerField(default=0, verbose_name="Số đạt")
+    so_truot = models.PositiveIntegerField(default=0, verbose_name="Số trượt")
+    # Số điểm trong từng khoảng 0.5 (như phổ điểm của score_stats)
+    phan_bo = models.JSONField(default=list, verbose_name="Phổ điểm")
+
+    class Meta:
+        verbose_name = "Tổng hợp điểm theo học kỳ"
+        verbose_name_plural = "Tổng hợp điểm theo học kỳ"
+        unique_together = ['subject', 'nhom', 'nam_hoc', 'hoc_ky']
+        indexes = [
+            # Xu hướng của một lớp (mọi môn) và của toàn trường (nhom rỗng)
+            models.Index(fields=['nhom', 'nam_hoc', 'hoc_ky'], name='rollup_group_term_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject_id}:{self.nhom} - HK{self.hoc_ky} {self.nam_hoc}"
+
+    @property
+    def diem_tb(self):
+        return round(self.tong_diem / self.so_luong, 2) if self.so_luong else None
+
+    @property
+    def ty_le_dat(self):
+        return round(self.so_dat / self.so_luong * 100, 1) if self.so_luong else 0
@@ -0,0 +1,266 @@
+# grades/rankings.py
+# Xếp hạng tính sẵn theo (học kỳ, lớp / lớp sinh hoạt / môn / toàn trường)
+#
+# Khi ghi điểm chỉ đánh dấu các nhóm bị ảnh hưởng là cần tính lại; nhóm được
+# tính lại bằng window function (DENSE_RANK, CUME_DIST) khi đọc lần sau hoặc
+# bằng lệnh refresh_rankings, nên các bảng xếp hạng là truy vấn có chỉ mục.
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Value, Window
+from django.db.models.functions import CumeDist, DenseRank
+from django.utils import timezone
+
+from classes.models import Class
+from qlsv.db import bulk_upsert
+from student.models import Student
+from .models import Grade, RankPartition, StudentGPA, StudentRank
+
+SCOPES = [value for value, label in StudentRank.SCOPE_CHOICES]
+
+BULK_BATCH_SIZE = 1000
+
+# Khóa unique của RankPartition (cột gây trùng khi upsert)
+PARTITION_KEY = ['pham_vi', 'hoc_ky', 'nam_hoc', 'nhom']
+
+
+def mark_stale(hoc_ky, nam_hoc, student_ids, subject_ids):
+    """
+    Đánh dấu các nhóm xếp hạng chứa các sinh viên/môn vừa đổi điểm trong
+    một học kỳ là cần tính lại (một câu upsert)
+    """
+    student_ids = set(student_ids)
+    if not student_ids:
+        return
+
+    partitions = [('all', '')]
+    partitions += [('subject', str(subject_id)) for subject_id in set(subject_ids)]
+    partitions += [
+        ('class', str(class_id))
+        for class_id in Class.students.through.objects.filter(
+            student_id__in=student_ids
+        ).values_list('class_id', flat=True).distinct()
+    ]
+    partitions += [
+        ('cohort', lop)
+        for lop in Student.objects.filter(id__in=student_ids).values_list('lop', flat=True).distinct()
+    ]
+
+    bulk_upsert(
+        RankPartition,
+        [
+            RankPartition(pham_vi=scope, nhom=key, hoc_ky=hoc_ky, nam_hoc=nam_hoc, is_stale=True)
+            for scope, key in partitions
+        ],
+        unique_fields=PARTITION_KEY,
+        update_fields=['is_stale'],
+    )
+
+
+def mark_class_stale(class_id):
+    """Đổi sinh viên của lớp: xếp hạng lớp ở mọi học kỳ đều cần tính lại"""
+    RankPartition.objects.filter(pham_vi='class', nhom=str(class_id)).update(is_stale=True)
+
+
+def forget_class(class_id):
+    """Xóa xếp hạng của lớp đã bị xóa"""
+    StudentRank.objects.filter(pham_vi='class', nhom=str(class_id)).delete()
+    RankPartition.objects.filter(pham_vi='class', nhom=str(class_id)).delete()
+
+
+def _ranked_rows(scope, hoc_ky, nam_hoc, keys=None):
+    """
+    Một truy vấn window function cho mọi nhóm cần tính của một phạm vi
+    Trả về các dòng (nhóm, student_id, giá trị, hạng, cume_dist, sĩ số)
+    """
+    if scope == 'subject':
+        queryset = Grade.objects.filter(
+            hoc_ky=hoc_ky, nam_hoc=nam_hoc, diem_tong_ket__isnull=False
+        )
+        value = 'diem_tong_ket'
+        partition = F('subject_id')
+        if keys is not None:
+            queryset = queryset.filter(subject_id__in=keys)
+    else:
+        queryset = StudentGPA.objects.filter(hoc_ky=hoc_ky, nam_hoc=nam_hoc, gpa__isnull=False)
+        value = 'gpa'
+        if scope == 'class':
+            partition = F('student__classes')
+            # Một filter duy nhất để chỉ có một JOIN qua bảng lớp-sinh viên
+            if keys is not None:
+                queryset = queryset.filter(student__classes__in=keys)
+            else:
+                queryset = queryset.filter(student__classes__isnull=False)
+        elif scope == 'cohort':
+            partition = F('student__lop')
+            if keys is not None:
+                queryset = queryset.filter(student__lop__in=keys)
+        else:
+            partition = Value('')
+
+    order = F(value).desc()
+    return queryset.order_by().annotate(
+        rank_group=partition,
+        rank_value=F(value),
+        rank=Window(DenseRank(), partition_by=[partition], order_by=order),
+        cume=Window(CumeDist(), partition_by=[partition], order_by=order),
+        size=Window(Count('pk'), partition_by=[partition]),
+    ).values_list('rank_group', 'student_id', 'rank_value', 'rank', 'cume', 'size')
+
+
+def _set_stale(scope, hoc_ky, nam_hoc, keys, is_stale):
+    """Đặt cờ cần tính lại cho các nhóm keys (None: mọi nhóm đã có của phạm vi)"""
+    if keys is None:
+        RankPartition.objects.filter(pham_vi=scope, hoc_ky=hoc_ky, nam_hoc=nam_hoc).update(is_stale=is_stale)
+        return
+    bulk_upsert(
+        RankPartition,
+        [
+            RankPartition(pham_vi=scope, nhom=key, hoc_ky=hoc_ky, nam_hoc=nam_hoc, is_stale=is_stale)
+            for key in keys
+        ],
+        unique_fields=PARTITION_KEY,
+        update_fields=['is_stale'],
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+
+def refresh_partitions(scope, hoc_ky, nam_hoc, keys=None):
+    """
+    Tính lại xếp hạng của các nhóm keys (None: mọi nhóm) trong một phạm vi và học kỳ
+    Xóa và ghi lại các dòng StudentRank của các nhóm đó trong một transaction.
+
+    Cờ cần tính lại được bỏ trước khi đọc dữ liệu: thao tác ghi điểm commit trong
+    lúc đang tính sẽ đánh dấu lại nhóm (mark_stale) và lần ghi kết quả không ghi
+    đè cờ đó, nên lần đọc sau vẫn tính lại.
+    """
+    if keys is not None:
+        keys = {str(key) for key in keys}
+        if not keys:
+            return
+
+    _set_stale(scope, hoc_ky, nam_hoc, keys, False)
+    try:
+        rows = _ranked_rows(scope, hoc_ky, nam_hoc, keys)
+        ranks = [
+            StudentRank(
+                pham_vi=scope,
+                nhom=str(group),
+                hoc_ky=hoc_ky,
+                nam_hoc=nam_hoc,
+                student_id=student_id,
+                gia_tri=value,
+                hang=rank,
+                top_phan_tram=round(cume * 100, 2),
+                si_so=size,
+            )
+            for group, student_id, value, rank, cume, size in rows
+        ]
+        refreshed_keys = {rank.nhom for rank in ranks}
+        if keys is not None:
+            refreshed_keys |= keys
+
+        with transaction.atomic():
+            old = StudentRank.objects.filter(pham_vi=scope, hoc_ky=hoc_ky, nam_hoc=nam_hoc)
+            if keys is not None:
+                old = old.filter(nhom__in=keys)
+            old.delete()
+            StudentRank.objects.bulk_create(ranks, batch_size=BULK_BATCH_SIZE)
+
+            # Nhóm mới được tạo với cờ đã bỏ; nhóm đã có chỉ cập nhật thời điểm tính
+            now = timezone.now()
+            bulk_upsert(
+                RankPartition,
+                [
+                    RankPartition(pham_vi=scope, nhom=key, hoc_ky=hoc_ky, nam_hoc=nam_hoc,
+                                  is_stale=False, refreshed_at=now)
+                    for key in refreshed_keys
+                ],
+                unique_fields=PARTITION_KEY,
+                update_fields=['refreshed_at'],
+                batch_size=BULK_BATCH_SIZE,
+            )
+    except Exception:
+        # Chưa ghi được kết quả: trả lại cờ để lần sau tính lại. Trong transaction
+        # của bên gọi thì việc bỏ cờ ở trên cũng bị rollback cùng, không cần trả lại
+        if not transaction.get_connection().in_atomic_block:
+            _set_stale(scope, hoc_ky, nam_hoc, keys, True)
+        raise
+    return len(ranks)
+
+
+def ensure_fresh(partitions, hoc_ky, nam_hoc):
+    """
+    Tính lại các nhóm đang bị đánh dấu hoặc chưa từng được tính
+    partitions: danh sách (phạm vi, nhóm)
+    """
+    partitions = {(scope, str(key)) for scope, key in partitions}
+    if not partitions:
+        return
+
+    fresh = set(
+        RankPartition.objects.filter(
+            hoc_ky=hoc_ky, nam_hoc=nam_hoc, is_stale=False,
+            pham_vi__in={scope for scope, key in partitions},
+            nhom__in={key for scope, key in partitions},
+        ).values_list('pham_vi', 'nhom')
+    )
+    stale = defaultdict(set)
+    for scope, key in partitions - fresh:
+        stale[scope].add(key)
+    for scope, keys in stale.items():
+        refresh_partitions(scope, hoc_ky, nam_hoc, keys)
+
+
+def refresh_stale(hoc_ky, nam_hoc, progress=None):
+    """
+    Tính lại mọi nhóm đang bị đánh dấu của một học kỳ (dùng cho tác vụ nền)
+    progress: hàm nhận (số phạm vi đã xong, tổng số phạm vi)
+    """
+    stale = defaultdict(set)
+    for scope, key in RankPartition.objects.filter(
+        hoc_ky=hoc_ky, nam_hoc=nam_hoc, is_stale=True
+    ).values_list('pham_vi', 'nhom'):
+        stale[scope].add(key)
+    for done, (scope, keys) in enumerate(stale.items(), start=1):
+        refresh_partitions(scope, hoc_ky, nam_hoc, keys)
+        if progress is not None:
+            progress(done, len(stale))
+    return sum(len(keys) for keys in stale.values())
+
+
+def leaderboard(scope, key, hoc_ky, nam_hoc):
+    """Bảng xếp hạng của một nhóm, sắp theo hạng (đọc theo chỉ mục rank_board_idx)"""
+    ensure_fresh([(scope, key)], hoc_ky, nam_hoc)
+    return StudentRank.objects.filter(
+        pham_vi=scope, nhom=str(key), hoc_ky=hoc_ky, nam_hoc=nam_hoc
+    ).select_related('student').order_by('hang', 'student_id')
+
+
+def student_ranks(student, hoc_ky, nam_hoc, scopes=SCOPES):
+    """
+    Thứ hạng của một sinh viên ở các nhóm trong học kỳ: {phạm vi: [StudentRank]}
+    """
+    partitions = []
+    if 'all' in scopes:
+        partitions.append(('all', ''))
+    if 'cohort' in scopes:
+        partitions.append(('cohort', student.lop))
+    if 'class' in scopes:
+        partitions += [('class', class_id) for class_id in student.classes.values_list('id', flat=True)]
+    if 'subject' in scopes:
+        partitions += [
+            ('subject', subject_id)
+            for subject_id in Grade.objects.filter(
+                student=student, hoc_ky=hoc_ky, nam_hoc=nam_hoc
+            ).values_list('subject_id', flat=True)
+        ]
+    ensure_fresh(partitions, hoc_ky, nam_hoc)
+
+    result = defaultdict(list)
+    for rank in StudentRank.objects.filter(
+        student=student, hoc_ky=hoc_ky, nam_hoc=nam_hoc, pham_vi__in=scopes
+    ):
+        result[rank.pham_vi].append(rank)
+    return dict(result)
@@ -0,0 +1,314 @@
+# grades/rollups.py
+# Bảng tổng hợp điểm tổng kết theo (môn, học kỳ, lớp) cho biểu đồ xu hướng
+#
+# Mỗi dòng GradeRollup giữ số điểm, tổng điểm, tổng bình phương, số đạt/trượt và
+# phổ điểm của một nhóm. Các giá trị này cộng được nên gộp nhiều dòng (nhiều môn,
+# nhiều học kỳ) vẫn ra đúng điểm trung bình, độ lệch chuẩn và tỷ lệ đạt; truy vấn
+# xu hướng chỉ đọc vài nghìn dòng thay vì toàn bộ lịch sử điểm.
+# apply_grade_changes cộng chênh lệch của các điểm vừa ghi, đổi sinh viên của lớp
+# thì tính lại các dòng của lớp đó, lệnh rebuild_grade_rollups tính lại toàn bộ
+# từ Grade và ArchivedGrade.
+
+import math
+import operator
+from collections import defaultdict
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from classes.models import Class
+from .models import ArchivedGrade, Grade, GradeRollup
+from .score_stats import HISTOGRAM_MAX, HISTOGRAM_STEP, PASS_SCORE
+
+# Số khoảng của phổ điểm: [0, 0.5), [0.5, 1.0), ..., [9.5, 10]
+BUCKETS = int(HISTOGRAM_MAX / HISTOGRAM_STEP)
+
+BULK_BATCH_SIZE = 1000
+
+SUM_FIELDS = ['so_luong', 'tong_diem', 'tong_binh_phuong', 'so_dat', 'so_truot']
+
+
+def _bucket(score):
+    return min(max(int(score / HISTOGRAM_STEP), 0), BUCKETS - 1)
+
+
+def _empty():
+    # [số điểm, tổng điểm, tổng bình phương, số đạt, phổ điểm]
+    return [0, 0.0, 0.0, 0, [0] * BUCKETS]
+
+
+def _add(totals, score, sign=1):
+    totals[0] += sign
+    totals[1] += sign * score
+    totals[2] += sign * score * score
+    if score >= PASS_SCORE:
+        totals[3] += sign
+    totals[4][_bucket(score)] += sign
+
+
+def _bucket_counts():
+    counts = {}
+    for index in range(BUCKETS):
+        bucket = Q()
+        if index > 0:
+            bucket &= Q(diem_tong_ket__gte=index * HISTOGRAM_STEP)
+        if index < BUCKETS - 1:
+            bucket &= Q(diem_tong_ket__lt=(index + 1) * HISTOGRAM_STEP)
+        counts[f'b{index}'] = Count('id', filter=bucket)
+    return counts
+
+
+def _aggregate(condition=Q(), by_class=False, nhom=''):
+    """
+    Tổng hợp điểm tổng kết từ Grade và ArchivedGrade (một câu GROUP BY mỗi bảng)
+
+    by_class=True: mỗi lớp của sinh viên là một nhóm (condition phải lọc theo
+    student__classes để dùng chung phép JOIN); ngược lại mọi điểm thuộc nhom.
+    Trả về {(subject_id, nhom, nam_hoc, hoc_ky): [so_luong, tong, tong_bp, so_dat, phan_bo]}
+    """
+    group = {'lop': F('student__classes')} if by_class else {}
+    totals = {}
+    for model in (Grade, ArchivedGrade):
+        rows = model.objects.filter(condition, diem_tong_ket__isnull=False).order_by().values(
+            'subject_id', 'nam_hoc', 'hoc_ky', **group
+        ).annotate(
+            so_luong=Count('id'),
+            tong_diem=Sum('diem_tong_ket'),
+            tong_binh_phuong=Sum(F('diem_tong_ket') * F('diem_tong_ket')),
+            so_dat=Count('id', filter=Q(diem_tong_ket__gte=PASS_SCORE)),
+            **_bucket_counts()
+        )
+        for row in rows:
+            key = (row['subject_id'], str(row['lop']) if by_class else nhom, row['nam_hoc'], row['hoc_ky'])
+            entry = totals.setdefault(key, _empty())
+            entry[0] += row['so_luong']
+            entry[1] += row['tong_diem']
+            entry[2] += row['tong_binh_phuong']
+            entry[3] += row['so_dat']
+            entry[4] = [count + row[f'b{index}'] for index, count in enumerate(entry[4])]
+    return totals
+
+
+def _fill(record, totals):
+    so_luong, tong_diem, tong_binh_phuong, so_dat, phan_bo = totals
+    record.so_luong = so_luong
+    record.tong_diem = round(tong_diem, 4)
+    record.tong_binh_phuong = round(tong_binh_phuong, 4)
+    record.so_dat = so_dat
+    record.so_truot = so_luong - so_dat
+    record.phan_bo = phan_bo
+    return record
+
+
+def _new_rows(totals):
+    return [
+        _fill(GradeRollup(subject_id=subject_id, nhom=nhom, nam_hoc=nam_hoc, hoc_ky=hoc_ky), entry)
+        for (subject_id, nhom, nam_hoc, hoc_ky), entry in totals.items()
+        if entry[0] > 0
+    ]
+
+
+def _terms_condition(keys):
+    """Q lọc điểm của các (môn, năm học, học kỳ) có trong keys"""
+    return reduce(operator.or_, (
+        Q(subject_id=subject_id, nam_hoc=nam_hoc, hoc_ky=hoc_ky)
+        for subject_id, nam_hoc, hoc_ky in {(key[0], key[2], key[3]) for key in keys}
+    ))
+
+
+def _compute(keys):
+    """Tổng hợp đầy đủ các nhóm trong keys từ bảng điểm: {key: totals}"""
+    wide = [key for key in keys if not key[1]]
+    by_class = [key for key in keys if key[1]]
+    totals = {}
+    if wide:
+        totals.update(_aggregate(_terms_condition(wide)))
+    if by_class:
+        computed = _aggregate(
+            _terms_condition(by_class) & Q(student__classes__in={int(key[1]) for key in by_class}),
+            by_class=True,
+        )
+        totals.update((key, computed[key]) for key in by_class if key in computed)
+    return totals
+
+
+def apply_changes(changes):
+    """
+    Cộng chênh lệch của các cặp (before, after) GradeState vào dòng tổng của môn
+    và dòng của từng lớp có sinh viên (một truy vấn tìm lớp, một truy vấn khóa dòng)
+
+    Nhóm chưa có dòng được tổng hợp đầy đủ từ bảng điểm; điểm đã được ghi trước
+    khi gọi nên kết quả đã gồm thay đổi này. Hai thao tác cùng tạo một dòng thì
+    bên sau lỗi trùng khóa và retry_on_conflict chạy lại, lần sau sẽ cộng dồn.
+    """
+    states = [
+        (state, sign)
+        for before, after in changes
+        for state, sign in ((before, -1), (after, 1))
+        if state is not None and state.diem_tong_ket is not None
+    ]
+    if not states:
+        return
+
+    classes_of = defaultdict(list)
+    for student_id, class_id in Class.students.through.objects.filter(
+        student_id__in={state.student_id for state, sign in states}
+    ).values_list('student_id', 'class_id'):
+        classes_of[student_id].append(str(class_id))
+
+    deltas = defaultdict(_empty)
+    for state, sign in states:
+        for nhom in [''] + classes_of[state.student_id]:
+            _add(deltas[(state.subject_id, nhom, state.nam_hoc, state.hoc_ky)], state.diem_tong_ket, sign)
+    # Sửa điểm thành phần mà điểm tổng kết không đổi thì chênh lệch bằng 0
+    deltas = {
+        key: delta for key, delta in deltas.items()
+        if delta[0] or any(delta[4]) or round(delta[1], 4) or round(delta[2], 4)
+    }
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        records = {
+            (record.subject_id, record.nhom, record.nam_hoc, record.hoc_ky): record
+            for record in GradeRollup.objects.select_for_update().filter(
+                reduce(operator.or_, (
+                    Q(subject_id=subject_id, nhom=nhom, nam_hoc=nam_hoc, hoc_ky=hoc_ky)
+                    for subject_id, nhom, nam_hoc, hoc_ky in deltas
+                ))
+            ).order_by('pk')
+        }
+
+        to_update, to_delete = [], []
+        for key, record in records.items():
+            delta = deltas[key]
+            totals = [
+                record.so_luong + delta[0],
+                record.tong_diem + delta[1],
+                record.tong_binh_phuong + delta[2],
+                record.so_dat + delta[3],
+                [count + change for count, change in zip(record.phan_bo or [0] * BUCKETS, delta[4])],
+            ]
+            if totals[0] <= 0:
+                to_delete.append(record.pk)
+                continue
+            to_update.append(_fill(record, totals))
+
+        if to_update:
+            GradeRollup.objects.bulk_update(to_update, SUM_FIELDS + ['phan_bo'], batch_size=BULK_BATCH_SIZE)
+        if to_delete:
+            GradeRollup.objects.filter(pk__in=to_delete).delete()
+
+        missing = [key for key in deltas if key not in records]
+        if missing:
+            GradeRollup.objects.bulk_create(_new_rows(_compute(missing)), batch_size=BULK_BATCH_SIZE)
+
+
+@transaction.atomic
+def rebuild(nam_hoc=None):
+    """
+    Tính lại toàn bộ bảng tổng hợp (hoặc một năm học) từ Grade và ArchivedGrade
+    Trả về số dòng đã ghi.
+    """
+    condition = Q(nam_hoc=nam_hoc) if nam_hoc else Q()
+    totals = _aggregate(condition)
+    totals.update(_aggregate(condition & Q(student__classes__isnull=False), by_class=True))
+
+    old = GradeRollup.objects.all()
+    if nam_hoc:
+        old = old.filter(nam_hoc=nam_hoc)
+    old.delete()
+    rows = _new_rows(totals)
+    GradeRollup.objects.bulk_create(rows, batch_size=BULK_BATCH_SIZE)
+    return len(rows)
+
+
+@transaction.atomic
+def rebuild_class(class_id):
+    """Đổi sinh viên của lớp: tính lại các dòng của lớp ở mọi học kỳ"""
+    nhom = str(class_id)
+    totals = _aggregate(Q(student__classes=class_id), nhom=nhom)
+    GradeRollup.objects.filter(nhom=nhom).delete()
+    GradeRollup.objects.bulk_create(_new_rows(totals), batch_size=BULK_BATCH_SIZE)
+
+
+def forget_class(class_id):
+    """Xóa các dòng tổng hợp của lớp đã bị xóa"""
+    GradeRollup.objects.filter(nhom=str(class_id)).delete()
+
+
+def _summary(row):
+    so_luong = row['so_luong']
+    mean = row['tong_diem'] / so_luong
+    variance = max(row['tong_binh_phuong'] / so_luong - mean * mean, 0.0)
+    return {
+        'nam_hoc': row['nam_hoc'],
+        'hoc_ky': row['hoc_ky'],
+        'so_luong': so_luong,
+        'diem_tb': round(mean, 2),
+        'do_lech_chuan': round(math.sqrt(variance), 2),
+        'so_dat': row['so_dat'],
+        'so_truot': row['so_truot'],
+        'ty_le_dat': round(row['so_dat'] / so_luong * 100, 1),
+    }
+
+
+def _series(rows, group=None):
+    """
+    Cộng các dòng theo (nhóm, học kỳ) trong một truy vấn: {nhóm: [điểm theo học kỳ]},
+    hoặc chỉ theo học kỳ khi group=None: [điểm theo học kỳ]
+    """
+    fields = [group] if group else []
+    rows = rows.order_by().values(*fields, 'nam_hoc', 'hoc_ky').annotate(
+        **{field: Sum(field) for field in SUM_FIELDS}
+    ).order_by(*fields, 'nam_hoc', 'hoc_ky')
+    result = defaultdict(list)
+    for row in rows:
+        if row['so_luong']:
+            result[row[group] if group else None].append(_summary(row))
+    return result.get(None, []) if group is None else dict(result)
+
+
+def trend(subject_id=None, class_id=None):
+    """
+    Xu hướng theo học kỳ, sắp theo thời gian: danh sách dict gồm nam_hoc, hoc_ky,
+    so_luong, diem_tb, do_lech_chuan, so_dat, so_truot, ty_le_dat (%)
+    - subject_id: một môn, không thì gộp mọi môn
+    - class_id: sinh viên của một lớp, không thì toàn trường
+    """
+    rows = GradeRollup.objects.filter(nhom=str(class_id) if class_id else '')
+    if subject_id:
+        rows = rows.filter(subject_id=subject_id)
+    return _series(rows)
+
+
+def subject_trends(subject_ids=None, class_id=None):
+    """Xu hướng của từng môn (toàn trường hoặc trong một lớp): {subject_id: [...]}"""
+    rows = GradeRollup.objects.filter(nhom=str(class_id) if class_id else '')
+    if subject_ids is not None:
+        rows = rows.filter(subject_id__in=subject_ids)
+    return _series(rows, 'subject_id')
+
+
+def class_trends(subject_id=None, class_ids=None):
+    """Xu hướng của từng lớp (mọi môn hoặc một môn): {class_id: [...]}"""
+    rows = GradeRollup.objects.exclude(nhom='')
+    if class_ids is not None:
+        rows = rows.filter(nhom__in=[str(class_id) for class_id in class_ids])
+    if subject_id:
+        rows = rows.filter(subject_id=subject_id)
+    return {int(nhom): series for nhom, series in _series(rows, 'nhom').items()}
+
+
+def distribution(hoc_ky, nam_hoc, subject_id=None, class_id=None):
+    """Phổ điểm gộp của một học kỳ: danh sách (cận dưới, số lượng) như score_stats"""
+    rows = GradeRollup.objects.filter(
+        hoc_ky=hoc_ky, nam_hoc=nam_hoc, nhom=str(class_id) if class_id else ''
+    )
+    if subject_id:
+        rows = rows.filter(subject_id=subject_id)
+    counts = [0] * BUCKETS
+    for phan_bo in rows.values_list('phan_bo', flat=True):
+        counts = [count + value for count, value in zip(counts, phan_bo)]
+    return [(index * HISTOGRAM_STEP, count) for index, count in enumerate(counts)]
@@ -0,0 +1,131 @@
+# grades/score_stats.py
+# Thống kê phân bố điểm theo (môn, học kỳ): tứ phân vị, độ lệch chuẩn, phổ điểm
+# theo bước 0.5 và tương quan giữa điểm thành phần với điểm tổng kết
+#
+# Mỗi nhóm (môn, học kỳ) được đọc thành một mảng bằng values_list rồi tính bằng
+# NumPy; kết quả được cache theo nhóm, khóa cache chứa số phiên bản của học kỳ
+# (cache_versions) nên điểm của học kỳ thay đổi là khóa cũ không còn được đọc.
+
+import numpy as np
+from django.core.cache import cache
+
+from . import cache_versions
+from .models import ArchivedGrade, Grade
+
+# Ngưỡng đạt của điểm tổng kết
+PASS_SCORE = 5.0
+
+# Phổ điểm tổng kết: các khoảng [0, 0.5), [0.5, 1.0), ..., [9.5, 10]
+HISTOGRAM_STEP = 0.5
+HISTOGRAM_MAX = 10.0
+
+STATS_CACHE_TIMEOUT = 60 * 60
+
+# (tên trong kết quả, cột Grade) theo đúng thứ tự cột của mảng điểm
+COMPONENTS = [
+    ('qua_trinh', 'diem_qua_trinh'),
+    ('giua_ky', 'diem_giua_ky'),
+    ('cuoi_ky', 'diem_cuoi_ky'),
+]
+SCORE_FIELDS = [field for name, field in COMPONENTS] + ['diem_tong_ket']
+
+
+def _cache_key(subject_id, hoc_ky, nam_hoc, stamp):
+    return f"grades:subject_stats:{subject_id}:{hoc_ky}:{nam_hoc}:{stamp}"
+
+
+def _pearson(x, y):
+    """Hệ số tương quan Pearson, None nếu không đủ dữ liệu hoặc một bên không đổi"""
+    if x.size < 2 or not x.std() or not y.std():
+        return None
+    return round(float(np.corrcoef(x, y)[0, 1]), 3)
+
+
+def summarize_scores(scores):
+    """
+    Thống kê một nhóm điểm
+
+    scores: mảng (n, 4) các cột SCORE_FIELDS, NaN ở ô trống
+    Trả về None nếu không có điểm tổng kết, hoặc dict gồm so_luong, diem_tb,
+    do_lech_chuan, min, q1, trung_vi, q3, max, so_dat, so_truot, phan_bo
+    (danh sách (cận dưới, số lượng)) và tuong_quan (tên thành phần -> hệ số
+    tương quan với điểm tổng kết).
+    """
+    scores = np.asarray(scores, dtype=np.float64).reshape(-1, len(SCORE_FIELDS))
+    final = scores[:, -1]
+    final = final[~np.isnan(final)]
+    if not final.size:
+        return None
+
+    q1, median, q3 = np.percentile(final, [25, 50, 75])
+    edges = np.arange(0.0, HISTOGRAM_MAX + HISTOGRAM_STEP, HISTOGRAM_STEP)
+    # np.histogram tính khoảng cuối gồm cả cận trên (điểm 10)
+    counts, _ = np.histogram(np.clip(final, 0.0, HISTOGRAM_MAX), bins=edges)
+
+    correlation = {}
+    for index, (name, field) in enumerate(COMPONENTS):
+        pair = scores[:, [index, -1]]
+        pair = pair[~np.isnan(pair).any(axis=1)]
+        correlation[name] = _pearson(pair[:, 0], pair[:, 1])
+
+    passed = int(np.count_nonzero(final >= PASS_SCORE))
+    return {
+        'so_luong': int(final.size),
+        'diem_tb': round(float(final.mean()), 2),
+        'do_lech_chuan': round(float(final.std()), 2),
+        'min': round(float(final.min()), 2),
+        'q1': round(float(q1), 2),
+        'trung_vi': round(float(median), 2),
+        'q3': round(float(q3), 2),
+        'max': round(float(final.max()), 2),
+        'so_dat': passed,
+        'so_truot': int(final.size) - passed,
+        'phan_bo': [(float(edge), int(count)) for edge, count in zip(edges[:-1], counts)],
+        'tuong_quan': correlation,
+    }
+
+
+def subject_stats_many(subject_ids, hoc_ky, nam_hoc):
+    """
+    Thống kê của nhiều môn trong một học kỳ: {subject_id: dict hoặc None}
+    Môn chưa có trong cache được đọc bằng một truy vấn chung rồi chia theo môn.
+    """
+    # Đọc số phiên bản trước khi đọc điểm: kết quả tính từ dữ liệu trước một lần
+    # ghi chỉ được lưu dưới khóa cũ, không ghi đè lên khóa của phiên bản mới
+    stamp = cache_versions.term_stamp(hoc_ky, nam_hoc)
+    keys = {subject_id: _cache_key(subject_id, hoc_ky, nam_hoc, stamp) for subject_id in subject_ids}
+    cached = cache.get_many(keys.values())
+    result = {subject_id: cached[key] for subject_id, key in keys.items() if key in cached}
+    missing = [subject_id for subject_id in keys if subject_id not in result]
+    if not missing:
+        return result
+
+    # Học kỳ đã lưu trữ nằm ở ArchivedGrade: đọc cả hai bảng trong một câu UNION ALL
+    partitions = [
+        model.objects.filter(
+            subject_id__in=missing, hoc_ky=hoc_ky, nam_hoc=nam_hoc
+        ).order_by().values_list('subject_id', *SCORE_FIELDS)
+        for model in (Grade, ArchivedGrade)
+    ]
+    rows = np.array(
+        partitions[0].union(partitions[1], all=True).order_by('subject_id'),
+        dtype=np.float64,
+    ).reshape(-1, len(SCORE_FIELDS) + 1)
+
+    computed = dict.fromkeys(missing)
+    if rows.size:
+        # Các dòng đã sắp theo môn: cắt mảng tại vị trí bắt đầu của mỗi môn
+        subjects, starts = np.unique(rows[:, 0], return_index=True)
+        for subject_id, scores in zip(subjects, np.split(rows[:, 1:], starts[1:])):
+            computed[int(subject_id)] = summarize_scores(scores)
+    cache.set_many(
+        {keys[subject_id]: stats for subject_id, stats in computed.items()},
+        STATS_CACHE_TIMEOUT,
+    )
+    result.update(computed)
+    return result
+
+
+def subject_stats(subject_id, hoc_ky, nam_hoc):
+    """Thống kê của một môn trong một học kỳ (None nếu chưa có điểm tổng kết)"""
+    return subject_stats_many([subject_id], hoc_ky, nam_hoc)[subject_id]
@@ -0,0 +1,833 @@
+# grades/services.py
+# Các thao tác ghi điểm dùng chung cho views và admin
+
+import functools
+import logging
+import random
+import time
+from collections import defaultdict, namedtuple
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F, Max, Q, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+from jobs.queue import enqueue, enqueue_many
+from qlsv.db import bulk_upsert
+from .models import CumulativeGPA, FinalizedTerm, Grade, GradeHistory, StudentGPA, resolve_weights
+from . import cache_versions, rankings, rollups
+
+logger = logging.getLogger(__name__)
+
+# Các trường điểm được nhập từ form (diem_tong_ket luôn được tính lại)
+GRADE_INPUT_FIELDS = ['diem_qua_trinh', 'diem_giua_ky', 'diem_cuoi_ky', 'ghi_chu']
+
+BULK_BATCH_SIZE = 500
+
+# Sai số cho phép khi so sánh tổng điểm tích lũy (float)
+GPA_TOLERANCE = 1e-6
+
+# Số lần chạy lại một thao tác ghi điểm bị đụng độ với thao tác ghi đồng thời
+WRITE_RETRIES = 3
+# Mã lỗi MySQL: 1205 hết thời gian chờ khóa, 1213 deadlock
+_CONFLICT_ERROR_CODES = {1205, 1213}
+
+# Số giây chờ trước khi tính lại xếp hạng của một học kỳ, để các lần sửa điểm
+# liên tiếp được gộp vào một tác vụ
+RANKING_REFRESH_DELAY = 30
+
+
+class TermFinalizedError(ValidationError):
+    """Ghi điểm vào học kỳ đã khóa"""
+
+
+def ensure_terms_open(terms):
+    """Ném TermFinalizedError nếu một trong các (học kỳ, năm học) đã khóa điểm"""
+    finalized = FinalizedTerm.finalized_among(terms)
+    if finalized:
+        names = ', '.join(f"HK{hoc_ky} {nam_hoc}" for hoc_ky, nam_hoc in sorted(finalized))
+        raise TermFinalizedError(f"Học kỳ đã khóa điểm, không thể sửa: {names}")
+
+
+def _is_write_conflict(exc):
+    """Lỗi do ghi đồng thời (chạy lại có thể thành công)"""
+    if isinstance(exc, IntegrityError):
+        # Hai bên cùng tạo một bản ghi unique: bên sau chạy lại sẽ thấy bản ghi đã có
+        return True
+    code = exc.args[0] if exc.args else None
+    message = str(exc).lower()
+    return code in _CONFLICT_ERROR_CODES or 'deadlock' in message or 'database is locked' in message
+
+
+def retry_on_conflict(func):
+    """
+    Chạy func trong một transaction; nếu đụng độ với thao tác ghi đồng thời
+    (deadlock, hết thời gian chờ khóa, trùng khóa unique) thì rollback và chạy
+    lại tối đa WRITE_RETRIES lần. Nếu bên gọi đã mở transaction thì không thể
+    chạy lại riêng phần này nên lỗi được ném ra cho bên gọi.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        attempt = 0
+        while True:
+            nested = connection.in_atomic_block
+            try:
+                with transaction.atomic():
+                    return func(*args, **kwargs)
+            except (IntegrityError, OperationalError) as exc:
+                if nested or attempt >= WRITE_RETRIES or not _is_write_conflict(exc):
+                    raise
+                attempt += 1
+                logger.warning("%s đụng độ ghi đồng thời (%s), chạy lại lần %s", func.__name__, exc, attempt)
+                time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+    return wrapper
+
+
+def _term_totals(student_ids, hoc_ky, nam_hoc):
+    """Tổng tín chỉ và tổng điểm tích lũy tính lại từ bảng Grade"""
+    return {
+        student_id: (total_credits, total_points)
+        for student_id, (gpa, total_credits, total_points)
+        in StudentGPA.calculate_gpa_many(student_ids, hoc_ky, nam_hoc).items()
+    }
+
+
+def refresh_student_gpas(student_ids, hoc_ky, nam_hoc):
+    """
+    Tính lại StudentGPA cho nhiều sinh viên trong cùng một học kỳ
+    - Đọc điểm của tất cả sinh viên bằng một truy vấn
+    - Ghi bằng bulk_create / bulk_update, xóa bản ghi không còn điểm
+    """
+    student_ids = set(student_ids)
+    if not student_ids:
+        return
+
+    totals = _term_totals(student_ids, hoc_ky, nam_hoc)
+
+    existing = {
+        record.student_id: record
+        for record in StudentGPA.objects.filter(
+            student_id__in=student_ids, hoc_ky=hoc_ky, nam_hoc=nam_hoc
+        )
+    }
+
+    to_create, to_update, to_delete = [], [], []
+    for student_id in student_ids:
+        total_credits, total_points = totals.get(student_id, (0, 0.0))
+        record = existing.get(student_id)
+        if total_credits == 0:
+            if record is not None:
+                to_delete.append(record.pk)
+            continue
+
+        gpa = round(total_points / total_credits, 2)
+        if record is None:
+            to_create.append(StudentGPA(
+                student_id=student_id,
+                hoc_ky=hoc_ky,
+                nam_hoc=nam_hoc,
+                gpa=gpa,
+                tong_tin_chi=total_credits,
+                tong_diem_tich_luy=total_points,
+            ))
+        elif (record.gpa, record.tong_tin_chi, record.tong_diem_tich_luy) != (gpa, total_credits, total_points):
+            record.gpa = gpa
+            record.tong_tin_chi = total_credits
+            record.tong_diem_tich_luy = total_points
+            to_update.append(record)
+
+    if to_create:
+        StudentGPA.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+    if to_update:
+        StudentGPA.objects.bulk_update(
+            to_update, ['gpa', 'tong_tin_chi', 'tong_diem_tich_luy'], batch_size=BULK_BATCH_SIZE
+        )
+    if to_delete:
+        StudentGPA.objects.filter(pk__in=to_delete).delete()
+    cache_versions.bump_terms([(hoc_ky, nam_hoc)])
+    cache_versions.bump_students(student_ids)
+
+
+def refresh_cumulative_gpas(student_ids):
+    """
+    Tính lại CumulativeGPA cho các sinh viên có điểm thay đổi
+    - Một truy vấn GROUP BY (sinh viên, môn) chỉ trên điểm của các sinh viên đó
+    - Ghi bằng bulk_create / bulk_update, xóa bản ghi của sinh viên không còn điểm
+    """
+    student_ids = set(student_ids)
+    if not student_ids:
+        return
+
+    totals = CumulativeGPA.calculate_many(student_ids)
+    existing = {
+        record.student_id: record
+        for record in CumulativeGPA.objects.filter(student_id__in=student_ids)
+    }
+
+    now = timezone.now()
+    fields = ['gpa', 'tong_tin_chi', 'tong_diem_tich_luy', 'hoc_ky_cuoi', 'nam_hoc_cuoi']
+    to_create, to_update, to_delete = [], [], []
+    for student_id in student_ids:
+        record = existing.get(student_id)
+        if student_id not in totals:
+            if record is not None:
+                to_delete.append(record.pk)
+            continue
+
+        values = dict(zip(fields, totals[student_id]))
+        if record is None:
+            to_create.append(CumulativeGPA(student_id=student_id, **values))
+        elif any(getattr(record, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(record, field, value)
+            # bulk_update không tự cập nhật auto_now
+            record.updated_at = now
+            to_update.append(record)
+
+    if to_create:
+        # Upsert: tác vụ khác có thể vừa tạo bản ghi của cùng sinh viên
+        bulk_upsert(
+            CumulativeGPA,
+            to_create,
+            unique_fields=['student'],
+            update_fields=fields + ['updated_at'],
+            batch_size=BULK_BATCH_SIZE,
+        )
+    if to_update:
+        CumulativeGPA.objects.bulk_update(to_update, fields + ['updated_at'], batch_size=BULK_BATCH_SIZE)
+    if to_delete:
+        CumulativeGPA.objects.filter(pk__in=to_delete).delete()
+
+
+class GradeState(namedtuple('GradeState', [
+        'student_id', 'subject_id', 'hoc_ky', 'nam_hoc', 'credits',
+        'diem_qua_trinh', 'diem_giua_ky', 'diem_cuoi_ky', 'diem_tong_ket'])):
+    """Ảnh chụp một Grade tại một thời điểm (trước hoặc sau khi ghi)"""
+
+    @property
+    def grade_key(self):
+        return (self.student_id, self.subject_id, self.hoc_ky, self.nam_hoc)
+
+    @property
+    def gpa_key(self):
+        return (self.student_id, self.hoc_ky, self.nam_hoc)
+
+    @property
+    def scores(self):
+        return (self.diem_qua_trinh, self.diem_giua_ky, self.diem_cuoi_ky, self.diem_tong_ket)
+
+    @property
+    def contribution(self):
+        """Phần đóng góp vào StudentGPA: (tín chỉ, điểm tích lũy)"""
+        if self.diem_tong_ket is None:
+            return 0, 0.0
+        return self.credits, self.diem_tong_ket * self.credits
+
+
+def grade_snapshot(grade, credits=None):
+    """Chụp lại Grade; credits truyền sẵn để khỏi đọc grade.subject"""
+    return GradeState(
+        grade.student_id, grade.subject_id, grade.hoc_ky, grade.nam_hoc,
+        grade.subject.so_tin_chi if credits is None else credits,
+        grade.diem_qua_trinh, grade.diem_giua_ky, grade.diem_cuoi_ky, grade.diem_tong_ket,
+    )
+
+
+def _history_entry(state, action, old, new, user, at):
+    old = old or (None, None, None, None)
+    new = new or (None, None, None, None)
+    return GradeHistory(
+        student_id=state.student_id,
+        subject_id=state.subject_id,
+        hoc_ky=state.hoc_ky,
+        nam_hoc=state.nam_hoc,
+        action=action,
+        old_qua_trinh=old[0], old_giua_ky=old[1], old_cuoi_ky=old[2], old_tong_ket=old[3],
+        new_qua_trinh=new[0], new_giua_ky=new[1], new_cuoi_ky=new[2], new_tong_ket=new[3],
+        changed_by=user,
+        changed_at=at,
+    )
+
+
+def record_grade_history(changes, user=None):
+    """
+    Ghi thêm lịch sử cho các cặp (before, after) GradeState bằng một bulk_create
+    - Chỉ ghi khi điểm thay đổi (sửa ghi chú không sinh lịch sử)
+    - Đổi sinh viên/môn/học kỳ được ghi thành xóa ở khóa cũ + tạo ở khóa mới
+    """
+    if user is not None and not getattr(user, 'is_authenticated', False):
+        user = None
+    now = timezone.now()
+    entries = []
+    for before, after in changes:
+        if before is not None and after is not None and before.grade_key != after.grade_key:
+            entries.append(_history_entry(before, 'delete', before.scores, None, user, now))
+            entries.append(_history_entry(after, 'create', None, after.scores, user, now))
+        elif before is None and after is not None:
+            entries.append(_history_entry(after, 'create', None, after.scores, user, now))
+        elif after is None and before is not None:
+            entries.append(_history_entry(before, 'delete', before.scores, None, user, now))
+        elif before is not None and before.scores != after.scores:
+            entries.append(_history_entry(after, 'update', before.scores, after.scores, user, now))
+    if entries:
+        GradeHistory.objects.bulk_create(entries, batch_size=BULK_BATCH_SIZE)
+
+
+def _apply_changes_to_gpa(changes):
+    """Cập nhật StudentGPA theo chênh lệch của các cặp (before, after) GradeState"""
+    deltas = defaultdict(lambda: [0, 0.0])
+    for before, after in changes:
+        if before is not None:
+            credits, points = before.contribution
+            deltas[before.gpa_key][0] -= credits
+            deltas[before.gpa_key][1] -= points
+        if after is not None:
+            credits, points = after.contribution
+            deltas[after.gpa_key][0] += credits
+            deltas[after.gpa_key][1] += points
+
+    by_term = defaultdict(dict)
+    for (student_id, hoc_ky, nam_hoc), (d_credits, d_points) in deltas.items():
+        by_term[(hoc_ky, nam_hoc)][student_id] = (d_credits, d_points)
+    for (hoc_ky, nam_hoc), term_deltas in by_term.items():
+        apply_gpa_deltas(hoc_ky, nam_hoc, term_deltas)
+
+
+def apply_grade_changes(changes, user=None):
+    """
+    Điểm vào chung sau khi ghi Grade: changes là danh sách (before, after)
+    GradeState, before=None khi tạo mới, after=None khi xóa.
+    Ghi lịch sử, cập nhật StudentGPA và bảng tổng hợp GradeRollup trong cùng
+    một transaction, tăng phiên bản cache của học kỳ (thống kê điểm, dashboard);
+    phần nặng (CumulativeGPA, tính lại xếp hạng) được đưa vào
+    hàng đợi tác vụ nền.
+    """
+    changes = list(changes)
+    if not changes:
+        return
+    # Chặn mọi đường ghi (form, nhập hàng loạt, API, điều chỉnh điểm...) vào học kỳ đã khóa;
+    # ném lỗi ở đây làm rollback cả thao tác ghi Grade của bên gọi
+    ensure_terms_open(
+        (state.hoc_ky, state.nam_hoc) for pair in changes for state in pair if state is not None
+    )
+    with transaction.atomic():
+        record_grade_history(changes, user)
+        _apply_changes_to_gpa(changes)
+        mark_rankings_stale(changes)
+        rollups.apply_changes(changes)
+        cache_versions.bump_changes(changes)
+        schedule_deferred_refresh(changes)
+
+
+def schedule_deferred_refresh(changes):
+    """
+    Đưa vào hàng đợi việc tính lại CumulativeGPA (một tác vụ mỗi sinh viên) và
+    xếp hạng (một tác vụ mỗi học kỳ); tác vụ trùng đang chờ được gộp làm một
+    """
+    student_ids, terms = set(), set()
+    for pair in changes:
+        for state in pair:
+            if state is not None:
+                student_ids.add(state.student_id)
+                terms.add((state.hoc_ky, state.nam_hoc))
+    enqueue_many(
+        'grades.refresh_cumulative_gpa',
+        [(str(student_id), {'student_id': student_id}) for student_id in sorted(student_ids)],
+    )
+    enqueue_many(
+        'grades.refresh_rankings',
+        [(f"{hoc_ky}:{nam_hoc}", {'hoc_ky': hoc_ky, 'nam_hoc': nam_hoc}) for hoc_ky, nam_hoc in sorted(terms)],
+        delay=RANKING_REFRESH_DELAY,
+    )
+
+
+def mark_rankings_stale(changes):
+    """Đánh dấu các nhóm xếp hạng bị ảnh hưởng bởi các cặp (before, after) GradeState"""
+    terms = defaultdict(lambda: (set(), set()))
+    for pair in changes:
+        for state in pair:
+            if state is not None:
+                student_ids, subject_ids = terms[(state.hoc_ky, state.nam_hoc)]
+                student_ids.add(state.student_id)
+                subject_ids.add(state.subject_id)
+    for (hoc_ky, nam_hoc), (student_ids, subject_ids) in terms.items():
+        rankings.mark_stale(hoc_ky, nam_hoc, student_ids, subject_ids)
+
+
+def apply_grade_change(before=None, after=None, user=None):
+    """Viết tắt của apply_grade_changes cho một Grade"""
+    apply_grade_changes([(before, after)], user)
+
+
+def save_grade_form(form, user=None):
+    """
+    Lưu GradeForm đã hợp lệ (tạo mới hoặc sửa) và cập nhật GPA theo chênh lệch
+
+    Khi sửa, điểm cũ được đọc lại với khóa dòng (SELECT ... FOR UPDATE) nên hai
+    người sửa cùng một điểm không tính chênh lệch trên cùng một bản cũ.
+    Trả về Grade đã lưu.
+    """
+    return _save_grade_form(form, form.instance._state.adding, user)
+
+
+@retry_on_conflict
+def _save_grade_form(form, creating, user):
+    grade = form.instance
+    before = None
+    if not creating:
+        # of=('self',): chỉ khóa dòng Grade, không khóa dòng Subject được JOIN kèm
+        # (khóa Subject làm mọi thao tác ghi điểm cùng môn phải chờ nhau)
+        locked = Grade.objects.select_for_update(of=('self',)).select_related('subject').get(pk=grade.pk)
+        before = grade_snapshot(locked)
+    else:
+        # Lần chạy lại sau rollback: instance phải được INSERT lại từ đầu
+        grade.pk = None
+        grade._state.adding = True
+    grade = form.save()
+    apply_grade_change(before, grade_snapshot(grade), user)
+    return grade
+
+
+@retry_on_conflict
+def delete_grade(pk, user=None):
+    """Xóa một điểm (khóa dòng trước khi đọc) và trừ khỏi GPA; trả về False nếu điểm không còn"""
+    grade = Grade.objects.select_for_update(of=('self',)).select_related('subject').filter(pk=pk).first()
+    if grade is None:
+        return False
+    before = grade_snapshot(grade)
+    grade.delete()
+    apply_grade_change(before, None, user)
+    return True
+
+
+def apply_gpa_deltas(hoc_ky, nam_hoc, deltas):
+    """
+    Cộng dồn chênh lệch (tín chỉ, điểm tích lũy) vào StudentGPA của một học kỳ
+
+    deltas: {student_id: (delta_tin_chi, delta_diem_tich_luy)}. Chi phí không
+    phụ thuộc số điểm trong học kỳ; chỉ sinh viên chưa có bản ghi StudentGPA
+    mới được tính đầy đủ một lần. Khi settings.GPA_VERIFY_INCREMENTAL bật,
+    kết quả được so sánh với cách tính lại toàn bộ.
+    """
+    deltas = {
+        student_id: delta for student_id, delta in deltas.items()
+        if delta[0] != 0 or abs(delta[1]) > GPA_TOLERANCE
+    }
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        # Khóa theo thứ tự student_id để hai thao tác ghi cùng nhóm sinh viên không deadlock
+        records = {
+            record.student_id: record
+            for record in StudentGPA.objects.select_for_update().filter(
+                student_id__in=deltas.keys(), hoc_ky=hoc_ky, nam_hoc=nam_hoc
+            ).order_by('student_id')
+        }
+
+        to_update, to_delete = [], []
+        for student_id, record in records.items():
+            d_credits, d_points = deltas[student_id]
+            record.tong_tin_chi += d_credits
+            record.tong_diem_tich_luy = round(record.tong_diem_tich_luy + d_points, 4)
+            if record.tong_tin_chi <= 0:
+                to_delete.append(record.pk)
+                continue
+            record.gpa = round(record.tong_diem_tich_luy / record.tong_tin_chi, 2)
+            to_update.append(record)
+
+        if to_update:
+            StudentGPA.objects.bulk_update(
+                to_update, ['gpa', 'tong_tin_chi', 'tong_diem_tich_luy'], batch_size=BULK_BATCH_SIZE
+            )
+        if to_delete:
+            StudentGPA.objects.filter(pk__in=to_delete).delete()
+
+        # Chưa có bản ghi: không có mốc để cộng dồn nên tính đầy đủ. Nếu thao tác
+        # khác tạo cùng bản ghi trước, bulk_create lỗi trùng khóa và
+        # retry_on_conflict chạy lại cả thao tác, lần sau sẽ cộng dồn vào bản ghi đó
+        missing = [student_id for student_id in deltas if student_id not in records]
+        refresh_student_gpas(missing, hoc_ky, nam_hoc)
+
+        if getattr(settings, 'GPA_VERIFY_INCREMENTAL', False):
+            verify_student_gpas(records.keys(), hoc_ky, nam_hoc)
+
+
+def verify_student_gpas(student_ids, hoc_ky, nam_hoc):
+    """
+    So sánh StudentGPA với kết quả tính lại toàn bộ từ bảng Grade
+    Ghi log và sửa các bản ghi lệch, trả về danh sách student_id bị lệch.
+    """
+    student_ids = set(student_ids)
+    if not student_ids:
+        return []
+
+    totals = _term_totals(student_ids, hoc_ky, nam_hoc)
+    stored = {
+        student_id: (credits, points)
+        for student_id, credits, points in StudentGPA.objects.filter(
+            student_id__in=student_ids, hoc_ky=hoc_ky, nam_hoc=nam_hoc
+        ).values_list('student_id', 'tong_tin_chi', 'tong_diem_tich_luy')
+    }
+
+    mismatched = []
+    for student_id in student_ids:
+        expected_credits, expected_points = totals.get(student_id, (0, 0.0))
+        credits, points = stored.get(student_id, (0, 0.0))
+        if credits != expected_credits or abs(points - expected_points) > GPA_TOLERANCE:
+            mismatched.append(student_id)
+
+    if mismatched:
+        logger.warning(
+            "StudentGPA lệch so với tính lại toàn bộ (HK%s %s): %s",
+            hoc_ky, nam_hoc, sorted(mismatched)
+        )
+        refresh_student_gpas(mismatched, hoc_ky, nam_hoc)
+    return mismatched
+
+
+def bulk_save_grades(subject, hoc_ky, nam_hoc, rows, user=None):
+    """
+    Ghi điểm hàng loạt cho một môn trong một học kỳ
+
+    rows: danh sách dict gồm 'student' (hoặc 'student_id') và các trường
+    trong GRADE_INPUT_FIELDS. Điểm đã có được đọc bằng một truy vấn, chỉ
+    các dòng thay đổi mới được cập nhật, toàn bộ chạy trong một transaction
+    và GPA của mỗi sinh viên bị ảnh hưởng được cập nhật một lần theo chênh lệch.
+    Lịch sử điểm được ghi bằng một bulk_create, người thay đổi là user.
+
+    Trả về (số dòng tạo mới, số dòng cập nhật).
+    """
+    incoming = {}
+    for row in rows:
+        student_id = row.get('student_id')
+        if student_id is None and row.get('student') is not None:
+            student_id = row['student'].pk
+        if student_id is None:
+            continue
+        # Dòng sau ghi đè dòng trước nếu trùng sinh viên
+        incoming[student_id] = {
+            field: row.get(field) if field != 'ghi_chu' else (row.get(field) or '')
+            for field in GRADE_INPUT_FIELDS
+        }
+
+    if not incoming:
+        return 0, 0
+    return _save_grade_rows(subject, hoc_ky, nam_hoc, incoming, user)
+
+
+@retry_on_conflict
+def _save_grade_rows(subject, hoc_ky, nam_hoc, incoming, user):
+    """Phần ghi của bulk_save_grades, chạy lại khi đụng độ ghi đồng thời"""
+    existing = {
+        grade.student_id: grade
+        for grade in Grade.objects.select_for_update().filter(
+            student_id__in=incoming.keys(),
+            subject=subject,
+            hoc_ky=hoc_ky,
+            nam_hoc=nam_hoc
+        ).order_by('student_id')
+    }
+
+    now = timezone.now()
+    credits = subject.so_tin_chi
+    weights = subject.get_weights(hoc_ky, nam_hoc)
+    to_create, to_update = [], []
+    changes = []
+    for student_id, values in incoming.items():
+        grade = existing.get(student_id)
+        if grade is None:
+            grade = Grade(
+                student_id=student_id,
+                subject=subject,
+                hoc_ky=hoc_ky,
+                nam_hoc=nam_hoc,
+                **values
+            )
+            # bulk_create không gọi Grade.save() nên tự tính điểm tổng kết
+            grade.diem_tong_ket = grade.calculate_final_grade(weights)
+            to_create.append(grade)
+            changes.append((None, grade_snapshot(grade, credits)))
+            continue
+
+        before_state = grade_snapshot(grade, credits)
+        before = [getattr(grade, field) for field in GRADE_INPUT_FIELDS + ['diem_tong_ket']]
+        for field, value in values.items():
+            setattr(grade, field, value)
+        final_grade = grade.calculate_final_grade(weights)
+        if final_grade is not None:
+            grade.diem_tong_ket = final_grade
+        after = [getattr(grade, field) for field in GRADE_INPUT_FIELDS + ['diem_tong_ket']]
+
+        # Chỉ cập nhật các dòng có thay đổi
+        if before != after:
+            grade.updated_at = now
+            to_update.append(grade)
+            changes.append((before_state, grade_snapshot(grade, credits)))
+
+    if to_create:
+        Grade.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+    if to_update:
+        Grade.objects.bulk_update(
+            to_update,
+            GRADE_INPUT_FIELDS + ['diem_tong_ket', 'updated_at'],
+            batch_size=BULK_BATCH_SIZE
+        )
+
+    apply_grade_changes(changes, user)
+    return len(to_create), len(to_update)
+
+
+# Các trường được phép sửa qua API sửa từng ô
+PATCH_SCORE_FIELDS = ['diem_qua_trinh', 'diem_giua_ky', 'diem_cuoi_ky']
+PATCH_FIELDS = PATCH_SCORE_FIELDS + ['ghi_chu']
+
+
+def _clean_patch_value(field, value):
+    """Chuẩn hóa giá trị của một ô, ném ValueError nếu không hợp lệ (cùng quy tắc với GradeForm)"""
+    if field == 'ghi_chu':
+        return '' if value is None else str(value)
+    if value is None or value == '':
+        if field == 'diem_cuoi_ky':
+            raise ValueError("Vui lòng nhập điểm cuối kỳ")
+        return None
+    if isinstance(value, bool):
+        raise ValueError("Điểm không phải là số")
+    try:
+        score = float(str(value).replace(',', '.'))
+    except ValueError:
+        raise ValueError("Điểm không phải là số")
+    if not 0.0 <= score <= 10.0:
+        raise ValueError("Điểm phải nằm trong khoảng 0 - 10")
+    return score
+
+
+def patch_grades(patches, user=None, students=None):
+    """
+    Áp dụng một lô sửa từng ô (kiểu bảng tính) trong một transaction
+
+    patches: danh sách dict {'id', 'field', 'value', 'updated_at'} với
+    updated_at là giá trị client đã đọc (datetime). Mỗi điểm được khóa
+    (select_for_update) và so sánh updated_at: nếu đã bị người khác sửa thì
+    mọi ô của điểm đó được trả về là xung đột, các điểm khác vẫn được ghi.
+    GPA của mỗi sinh viên bị ảnh hưởng được cập nhật một lần; phần ghi được
+    chạy lại khi đụng độ với thao tác ghi đồng thời (retry_on_conflict).
+    students: queryset sinh viên được phép sửa (None là tất cả).
+
+    Trả về dict {'applied': [...], 'conflicts': [...], 'errors': [...]}.
+    """
+    result = {'applied': [], 'conflicts': [], 'errors': []}
+
+    by_grade = defaultdict(list)
+    for patch in patches:
+        field = patch.get('field')
+        if field not in PATCH_FIELDS:
+            result['errors'].append({**patch, 'message': "Trường không được phép sửa"})
+            continue
+        try:
+            value = _clean_patch_value(field, patch.get('value'))
+        except ValueError as exc:
+            result['errors'].append({**patch, 'message': str(exc)})
+            continue
+        by_grade[patch['id']].append((field, value, patch))
+
+    if not by_grade:
+        return result
+
+    written = _apply_patches(by_grade, user, students)
+    for name in ('applied', 'conflicts', 'errors'):
+        result[name] += written[name]
+    return result
+
+
+@retry_on_conflict
+def _apply_patches(by_grade, user, students):
+    """Phần ghi của patch_grades, chạy lại khi đụng độ ghi đồng thời"""
+    result = {'applied': [], 'conflicts': [], 'errors': []}
+    grades = Grade.objects.select_for_update(of=('self',)).select_related('subject').filter(
+        pk__in=by_grade.keys()
+    ).order_by('pk')
+    if students is not None:
+        grades = grades.filter(student_id__in=students.values('pk'))
+    grades = {grade.pk: grade for grade in grades}
+    finalized = FinalizedTerm.finalized_among((grade.hoc_ky, grade.nam_hoc) for grade in grades.values())
+
+    now = timezone.now()
+    weights = {}
+    to_update, changes = [], []
+    for grade_id, cells in by_grade.items():
+        grade = grades.get(grade_id)
+        if grade is None:
+            for field, value, patch in cells:
+                result['errors'].append({**patch, 'message': "Không tìm thấy điểm hoặc không có quyền sửa"})
+            continue
+        if (grade.hoc_ky, grade.nam_hoc) in finalized:
+            for field, value, patch in cells:
+                result['errors'].append({**patch, 'message': "Học kỳ đã khóa điểm"})
+            continue
+
+        if any(patch.get('updated_at') != grade.updated_at for field, value, patch in cells):
+            for field, value, patch in cells:
+                result['conflicts'].append({
+                    'id': grade_id,
+                    'field': field,
+                    'value': getattr(grade, field),
+                    'updated_at': grade.updated_at,
+                })
+            continue
+
+        before = grade_snapshot(grade)
+        for field, value, patch in cells:
+            setattr(grade, field, value)
+        key = (grade.subject_id, grade.hoc_ky, grade.nam_hoc)
+        if key not in weights:
+            weights[key] = grade.subject.get_weights(grade.hoc_ky, grade.nam_hoc)
+        grade.diem_tong_ket = grade.calculate_final_grade(weights[key])
+        grade.updated_at = now
+        to_update.append(grade)
+        changes.append((before, grade_snapshot(grade)))
+        result['applied'].append({
+            'id': grade_id,
+            'fields': [field for field, value, patch in cells],
+            'diem_tong_ket': grade.diem_tong_ket,
+            'diem_chu': grade.get_letter_grade() if grade.diem_tong_ket is not None else None,
+            'updated_at': now,
+        })
+
+    if to_update:
+        Grade.objects.bulk_update(
+            to_update, PATCH_FIELDS + ['diem_tong_ket', 'updated_at'], batch_size=BULK_BATCH_SIZE
+        )
+    apply_grade_changes(changes, user)
+
+    return result
+
+
+def final_grade_expression(weights, diem_cuoi_ky=F('diem_cuoi_ky')):
+    """
+    Biểu thức SQL của điểm tổng kết, cùng công thức với Grade.calculate_final_grade
+    diem_cuoi_ky: biểu thức điểm cuối kỳ (mặc định là cột hiện tại)
+    """
+    w_qt, w_gk, w_ck = weights
+    zero = Value(0.0)
+    return Round(
+        Coalesce(F('diem_qua_trinh'), zero) * w_qt
+        + Coalesce(F('diem_giua_ky'), zero) * w_gk
+        + diem_cuoi_ky * w_ck,
+        2
+    )
+
+
+def recompute_final_grades(subject, hoc_ky, nam_hoc, weights=None, user=None):
+    """
+    Tính lại điểm tổng kết của một môn trong một học kỳ bằng một câu
+    UPDATE ... SET diem_tong_ket = ROUND(...) trong database, sau đó cập nhật
+    GPA, lịch sử... một lần cho các dòng thay đổi (apply_grade_changes).
+    Dòng chưa có điểm cuối kỳ giữ nguyên (giống Grade.save()).
+
+    Trả về số điểm tổng kết thay đổi.
+    """
+    if weights is None:
+        weights = subject.get_weights(hoc_ky, nam_hoc)
+    credits = subject.so_tin_chi
+
+    with transaction.atomic():
+        grades = Grade.objects.select_for_update().filter(
+            subject=subject, hoc_ky=hoc_ky, nam_hoc=nam_hoc, diem_cuoi_ky__isnull=False
+        )
+        fields = ['id', 'student_id', 'diem_qua_trinh', 'diem_giua_ky', 'diem_cuoi_ky', 'diem_tong_ket']
+        before = {row[0]: row for row in grades.values_list(*fields)}
+        if not before:
+            return 0
+
+        # Chỉ ghi các dòng có điểm tổng kết đổi: updated_at của dòng không đổi phải
+        # giữ nguyên, nếu không patch_grades sẽ báo xung đột giả cho các ô đang sửa
+        final = final_grade_expression(weights)
+        grades.filter(
+            Q(diem_tong_ket__isnull=True)
+            | Q(diem_tong_ket__gt=final + GPA_TOLERANCE)
+            | Q(diem_tong_ket__lt=final - GPA_TOLERANCE)
+        ).update(diem_tong_ket=final, updated_at=timezone.now())
+
+        changes = []
+        for grade_id, diem_tong_ket in grades.values_list('id', 'diem_tong_ket'):
+            _, student_id, qt, gk, ck, old_final = before[grade_id]
+            if old_final is not None and abs(old_final - diem_tong_ket) <= GPA_TOLERANCE:
+                continue
+            old = GradeState(student_id, subject.pk, hoc_ky, nam_hoc, credits, qt, gk, ck, old_final)
+            changes.append((old, old._replace(diem_tong_ket=diem_tong_ket)))
+        apply_grade_changes(changes, user)
+    return len(changes)
+
+
+def apply_weight_scheme_change(subject, old_schemes, user=None):
+    """
+    Sau khi thêm/sửa/xóa bảng trọng số của môn: chỉ các học kỳ có trọng số
+    thay đổi mới được tính lại (mỗi học kỳ một câu UPDATE)
+    old_schemes: danh sách GradeWeightScheme của môn trước khi thay đổi.
+    Trả về số điểm tổng kết thay đổi.
+    """
+    changed = 0
+    for hoc_ky, nam_hoc, weights in _changed_weight_terms(subject, old_schemes):
+        changed += recompute_final_grades(subject, hoc_ky, nam_hoc, weights, user)
+    return changed
+
+
+def schedule_weight_scheme_change(subject, old_schemes, user=None):
+    """
+    Như apply_weight_scheme_change nhưng mỗi học kỳ cần tính lại là một tác vụ
+    nền (grades.recompute_final_grades). Trả về danh sách Job đã đưa vào hàng đợi.
+    """
+    return [
+        enqueue(
+            'grades.recompute_final_grades',
+            {'subject_id': subject.pk, 'hoc_ky': hoc_ky, 'nam_hoc': nam_hoc},
+            key=f"{subject.pk}:{hoc_ky}:{nam_hoc}",
+            user=user,
+        )
+        for hoc_ky, nam_hoc, weights in _changed_weight_terms(subject, old_schemes)
+    ]
+
+
+def _changed_weight_terms(subject, old_schemes):
+    """Các (học kỳ, năm học, trọng số mới) có điểm và có trọng số thay đổi"""
+    new_schemes = list(subject.weight_schemes.all())
+    terms = set(Grade.objects.filter(subject=subject).order_by().values_list('hoc_ky', 'nam_hoc').distinct())
+    # Học kỳ đã khóa giữ nguyên điểm tổng kết đã chốt
+    terms -= FinalizedTerm.finalized_among(terms)
+    for hoc_ky, nam_hoc in sorted(terms):
+        weights = resolve_weights(new_schemes, hoc_ky, nam_hoc)
+        if weights != resolve_weights(old_schemes, hoc_ky, nam_hoc):
+            yield hoc_ky, nam_hoc, weights
+
+
+def grade_history_for(student, hoc_ky, nam_hoc):
+    """Lịch sử điểm của một sinh viên trong một học kỳ (dùng chỉ mục student+học kỳ)"""
+    return GradeHistory.objects.filter(
+        student=student, hoc_ky=hoc_ky, nam_hoc=nam_hoc
+    ).select_related('subject', 'changed_by')
+
+
+def grade_sheet_at(subject, hoc_ky, nam_hoc, at, students=None):
+    """
+    Bảng điểm của một môn trong một học kỳ tại thời điểm at
+
+    Với mỗi sinh viên lấy dòng lịch sử cuối cùng có changed_at <= at (bỏ qua
+    nếu đó là thao tác xóa). Chạy một truy vấn: subquery MAX(id) theo
+    sinh viên quét một khoảng của chỉ mục (subject, hoc_ky, nam_hoc, student,
+    changed_at) thay vì phát lại toàn bộ lịch sử. Lịch sử chỉ ghi thêm nên
+    id tăng cùng chiều với changed_at.
+
+    students: queryset sinh viên cần lấy (ví dụ lop.students.all()), None là tất cả.
+    Trả về queryset GradeHistory; điểm lúc đó nằm ở các cột new_*.
+    """
+    latest = GradeHistory.objects.filter(
+        subject=subject, hoc_ky=hoc_ky, nam_hoc=nam_hoc, changed_at__lte=at
+    )
+    if students is not None:
+        latest = latest.filter(student_id__in=students.values('pk'))
+    latest = latest.order_by().values('student_id').annotate(last_id=Max('id')).values('last_id')
+
+    return GradeHistory.objects.filter(id__in=latest).exclude(
+        action='delete'
+    ).select_related('student').order_by('student__ma_sv')
@@ -1,4 +1,139 @@
-from django.test import TestCase
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import CustomUser
+from student.models import Student
+from . import rankings
+from .models import CumulativeGPA, Grade, RankPartition, StudentGPA, Subject
+from .services import bulk_save_grades, refresh_cumulative_gpas
+
+
+@override_settings(JOBS_EAGER=True)
+class ConcurrentGradeUpdateTests(TransactionTestCase):
+    """
+    Nhiều thread cùng sửa điểm của cùng sinh viên/học kỳ qua grade_update:
+    mọi request thành công và GPA cuối cùng khớp với kết quả tính lại toàn bộ.
+    Database không có khóa dòng (SQLite) khóa cả file khi ghi nên chỉ chạy một
+    thread: vẫn đi qua toàn bộ đường ghi (GPA, CumulativeGPA, xếp hạng...).
+    """
+    THREADS = 8
+    REQUESTS_PER_THREAD = 15
+    HOC_KY, NAM_HOC = '1', '2024-2025'
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user('stress_admin', password='x', role='admin')
+        self.students = [
+            Student.objects.create(ma_sv=f'STRESS{i}', ho_ten=f'Sinh viên {i}',
+                                   ngay_sinh=date(2004, 1, 1), lop='STRESS', email=f'stress{i}@example.com')
+            for i in range(2)
+        ]
+        subjects = [
+            Subject.objects.create(ma_mon=f'STRESS{i}', ten_mon=f'Môn {i}', so_tin_chi=i + 1)
+            for i in range(4)
+        ]
+        for subject in subjects:
+            bulk_save_grades(subject, self.HOC_KY, self.NAM_HOC, [
+                {'student_id': student.pk, 'diem_qua_trinh': 5, 'diem_giua_ky': 5, 'diem_cuoi_ky': 5}
+                for student in self.students
+            ])
+        self.grades = list(Grade.objects.filter(student__in=self.students))
+
+    def _hammer(self, seed):
+        rng = random.Random(seed)
+        client = Client()
+        client.force_login(self.admin)
+        statuses = []
+        try:
+            for _ in range(self.REQUESTS_PER_THREAD):
+                grade = rng.choice(self.grades)
+                response = client.post(reverse('grade_update', args=[grade.pk]), {
+                    'student': grade.student_id,
+                    'subject': grade.subject_id,
+                    'hoc_ky': grade.hoc_ky,
+                    'nam_hoc': grade.nam_hoc,
+                    'diem_qua_trinh': rng.randint(10, 100) / 10,
+                    'diem_giua_ky': rng.randint(10, 100) / 10,
+                    'diem_cuoi_ky': rng.randint(10, 100) / 10,
+                    'ghi_chu': '',
+                })
+                statuses.append(response.status_code)
+        finally:
+            connection.close()
+        return statuses
+
+    def test_concurrent_updates_keep_gpa_consistent(self):
+        threads = self.THREADS if connection.features.has_select_for_update else 1
+        with ThreadPoolExecutor(threads) as pool:
+            statuses = [status for result in pool.map(self._hammer, range(threads)) for status in result]
+
+        self.assertEqual(statuses, [302] * threads * self.REQUESTS_PER_THREAD)
+        self.assertEqual(Grade.objects.filter(student__in=self.students).count(), len(self.grades))
+
+        student_ids = [student.pk for student in self.students]
+        expected = StudentGPA.calculate_gpa_many(student_ids, self.HOC_KY, self.NAM_HOC)
+        for record in StudentGPA.objects.filter(student_id__in=student_ids, hoc_ky=self.HOC_KY, nam_hoc=self.NAM_HOC):
+            gpa, credits, points = expected[record.student_id]
+            self.assertEqual(record.tong_tin_chi, credits)
+            self.assertAlmostEqual(record.tong_diem_tich_luy, points, places=4)
+            self.assertAlmostEqual(record.gpa, gpa, places=2)
+        self.assertEqual(
+            StudentGPA.objects.filter(student_id__in=student_ids).count(), len(student_ids)
+        )
+
+        expected = CumulativeGPA.calculate_many(student_ids)
+        for record in CumulativeGPA.objects.filter(student_id__in=student_ids):
+            self.assertEqual(record.tong_tin_chi, expected[record.student_id][1])
+            self.assertAlmostEqual(record.gpa, expected[record.student_id][0], places=2)
+
+
+class RankPartitionUpsertTests(TestCase):
+    """
+    Đánh dấu nhóm xếp hạng bằng upsert, kể cả trên database không chỉ định được
+    cột gây trùng (MySQL: ON DUPLICATE KEY UPDATE)
+    """
+    HOC_KY, NAM_HOC = '1', '2024-2025'
+
+    def setUp(self):
+        self.student = Student.objects.create(ma_sv='RANK1', ho_ten='Sinh viên', ngay_sinh=date(2004, 1, 1),
+                                              lop='RANK', email='rank1@example.com')
+
+    def _partitions(self):
+        return dict(
+            RankPartition.objects.filter(hoc_ky=self.HOC_KY, nam_hoc=self.NAM_HOC)
+            .values_list('pham_vi', 'is_stale')
+        )
+
+    def test_mark_stale_updates_existing_partitions(self):
+        rankings.mark_stale(self.HOC_KY, self.NAM_HOC, [self.student.pk], [])
+        RankPartition.objects.update(is_stale=False)
+        rankings.mark_stale(self.HOC_KY, self.NAM_HOC, [self.student.pk], [])
+        self.assertEqual(self._partitions(), {'all': True, 'cohort': True})
+
+    def test_mark_stale_without_conflict_target_support(self):
+        # Django báo NotSupportedError khi truyền unique_fields cho backend như vậy
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            rankings.mark_stale(self.HOC_KY, self.NAM_HOC, [self.student.pk], [])
+        self.assertEqual(self._partitions(), {'all': True, 'cohort': True})
+
+
+class CumulativeGPAUpsertTests(TestCase):
+    """Ghi CumulativeGPA bằng upsert trên database không chỉ định được cột gây trùng"""
+
+    def test_refresh_without_conflict_target_support(self):
+        student = Student.objects.create(ma_sv='CUM1', ho_ten='Sinh viên', ngay_sinh=date(2004, 1, 1),
+                                         lop='CUM', email='cum1@example.com')
+        subject = Subject.objects.create(ma_mon='CUM1', ten_mon='Môn', so_tin_chi=3)
+        Grade.objects.create(student=student, subject=subject, hoc_ky='1', nam_hoc='2024-2025',
+                             diem_qua_trinh=8, diem_giua_ky=8, diem_cuoi_ky=8)
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            refresh_cumulative_gpas([student.pk])
+        record = CumulativeGPA.objects.get(student=student)
+        self.assertEqual(record.tong_tin_chi, 3)
+        self.assertAlmostEqual(record.gpa, 8.0)
 
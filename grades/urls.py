@@ -12,6 +12,13 @@ urlpatterns = [
     path('', views.grade_list, name='grade_list'),
     path('create/', views.grade_create, name='grade_create'),
     path('bulk-create/', views.bulk_grade_create, name='bulk_grade_create'),
+    path('export/', views.grade_export, name='grade_export'),
+    path('curve/', views.grade_curve, name='grade_curve'),
+    path('import/', views.grade_import, name='grade_import'),
+    path('import/errors/<str:name>/', views.grade_import_errors, name='grade_import_errors'),
+    path('api/patch/', views.grade_patch_api, name='grade_patch_api'),
+    path('api/stats/', views.subject_stats_api, name='subject_stats_api'),
+    path('api/trends/', views.grade_trend_api, name='grade_trend_api'),
     path('<int:pk>/update/', views.grade_update, name='grade_update'),
     path('<int:pk>/delete/', views.grade_delete, name='grade_delete'),
 ]
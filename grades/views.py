@@ -1,15 +1,33 @@
 # grades/views.py
 # REFACTORED: Thêm logic phân quyền cho teacher
 
+import json
+import os
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
+from django.http import FileResponse, Http404, JsonResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.db import IntegrityError
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_aware
+from django.views.decorators.http import require_POST
 from django.forms import formset_factory
-from .models import Grade, Subject, StudentGPA
-from .forms import GradeForm, BulkGradeForm, SubjectForm
+from .models import Grade, Subject
+from .forms import GradeForm, BulkGradeForm, SubjectForm, GradeImportForm, GradeCurveForm
+from . import rollups
+from .curving import apply_curve, curve_preview
+from .importers import IMPORT_COLUMNS, GradeImportError, error_file_path, import_grades
+from .exports import csv_response, iter_values
+from .score_stats import subject_stats
+from .services import TermFinalizedError, bulk_save_grades, delete_grade, patch_grades, save_grade_form
 from student.models import Student
+from qlsv.pagination import PreciseJSONEncoder, paginate
 from classes.models import Class
 
+# Số ô tối đa trong một lần gửi của API sửa từng ô
+MAX_PATCHES = 500
+
 # Tạo GradeFormSet
 GradeFormSet = formset_factory(GradeForm, extra=1, can_delete=True)
 
@@ -107,25 +125,16 @@ def grade_create(request):
     if request.method == 'POST':
         form = GradeForm(request.POST)
         if form.is_valid():
-            grade = form.save()
-            
-            # Tính lại GPA
-            gpa, total_credits, total_points = StudentGPA.calculate_gpa(
-                grade.student, grade.hoc_ky, grade.nam_hoc
-            )
-            if gpa is not None:
-                gpa_record, created = StudentGPA.objects.get_or_create(
-                    student=grade.student,
-                    hoc_ky=grade.hoc_ky,
-                    nam_hoc=grade.nam_hoc
-                )
-                gpa_record.gpa = gpa
-                gpa_record.tong_tin_chi = total_credits
-                gpa_record.tong_diem_tich_luy = total_points
-                gpa_record.save()
-            
-            messages.success(request, "Thêm điểm thành công!")
-            return redirect('grade_list')
+            try:
+                # Lưu và cập nhật GPA theo chênh lệch (chạy lại khi đụng độ ghi đồng thời)
+                save_grade_form(form, request.user)
+            except IntegrityError:
+                form.add_error(None, "Điểm của sinh viên cho môn học này vừa được nhập bởi người khác.")
+            except TermFinalizedError as e:
+                messages.error(request, e.message)
+            else:
+                messages.success(request, "Thêm điểm thành công!")
+                return redirect('grade_list')
     else:
         form = GradeForm()
         
@@ -144,7 +153,7 @@ def grade_create(request):
 @user_passes_test(is_admin_or_teacher)
 def grade_update(request, pk):
     """Cập nhật điểm số - DÙNG CHUNG cho cả admin và teacher"""
-    grade = get_object_or_404(Grade, pk=pk)
+    grade = get_object_or_404(Grade.objects.select_related('subject'), pk=pk)
     
     # ✅ Kiểm tra quyền truy cập
     if not check_grade_permission(request.user, grade):
@@ -154,30 +163,20 @@ def grade_update(request, pk):
     if request.method == 'POST':
         form = GradeForm(request.POST, instance=grade)
         if form.is_valid():
-            grade = form.save()
-            
-            # Tính lại GPA
-            gpa, total_credits, total_points = StudentGPA.calculate_gpa(
-                grade.student, grade.hoc_ky, grade.nam_hoc
-            )
-            if gpa is not None:
-                gpa_record, created = StudentGPA.objects.get_or_create(
-                    student=grade.student,
-                    hoc_ky=grade.hoc_ky,
-                    nam_hoc=grade.nam_hoc
-                )
-                gpa_record.gpa = gpa
-                gpa_record.tong_tin_chi = total_credits
-                gpa_record.tong_diem_tich_luy = total_points
-                gpa_record.save()
-            
-            messages.success(request, "Cập nhật điểm thành công!")
-            
-            # ✅ Redirect khác nhau dựa vào role
-            if request.user.role == 'teacher':
-                return redirect('teacher_student_grades', student_id=grade.student.id)
+            try:
+                # Khóa dòng điểm, đọc lại điểm cũ rồi cập nhật GPA theo chênh lệch
+                grade = save_grade_form(form, request.user)
+            except TermFinalizedError as e:
+                # Học kỳ vừa bị khóa sau khi form đã kiểm tra
+                messages.error(request, e.message)
             else:
-                return redirect('grade_list')
+                messages.success(request, "Cập nhật điểm thành công!")
+                
+                # ✅ Redirect khác nhau dựa vào role
+                if request.user.role == 'teacher':
+                    return redirect('teacher_student_grades', student_id=grade.student.id)
+                else:
+                    return redirect('grade_list')
     else:
         form = GradeForm(instance=grade)
     
@@ -193,7 +192,7 @@ def grade_update(request, pk):
 @user_passes_test(is_admin_or_teacher)
 def grade_delete(request, pk):
     """Xóa điểm số - DÙNG CHUNG cho cả admin và teacher"""
-    grade = get_object_or_404(Grade, pk=pk)
+    grade = get_object_or_404(Grade.objects.select_related('subject'), pk=pk)
     
     # ✅ Kiểm tra quyền truy cập
     if not check_grade_permission(request.user, grade):
@@ -201,33 +200,15 @@ def grade_delete(request, pk):
         return redirect('grade_list')
     
     student = grade.student
-    hoc_ky = grade.hoc_ky
-    nam_hoc = grade.nam_hoc
     
     if request.method == 'POST':
-        grade.delete()
-        
-        # Tính lại GPA
-        gpa, total_credits, total_points = StudentGPA.calculate_gpa(student, hoc_ky, nam_hoc)
-        if gpa is not None:
-            gpa_record, created = StudentGPA.objects.get_or_create(
-                student=student,
-                hoc_ky=hoc_ky,
-                nam_hoc=nam_hoc
-            )
-            gpa_record.gpa = gpa
-            gpa_record.tong_tin_chi = total_credits
-            gpa_record.tong_diem_tich_luy = total_points
-            gpa_record.save()
+        # Trừ phần đóng góp của điểm đã xóa khỏi GPA (xóa bản ghi nếu không còn điểm)
+        try:
+            delete_grade(grade.pk, request.user)
+        except TermFinalizedError as e:
+            messages.error(request, e.message)
         else:
-            # Xóa GPA record nếu không còn điểm nào
-            StudentGPA.objects.filter(
-                student=student,
-                hoc_ky=hoc_ky,
-                nam_hoc=nam_hoc
-            ).delete()
-        
-        messages.success(request, "Xóa điểm thành công!")
+            messages.success(request, "Xóa điểm thành công!")
         
         # ✅ Redirect khác nhau dựa vào role
         if request.user.role == 'teacher':
@@ -245,6 +226,7 @@ def grade_list(request):
     """Danh sách điểm số - DÙNG CHUNG cho cả admin và teacher"""
     hoc_ky = request.GET.get('hoc_ky', '')
     nam_hoc = request.GET.get('nam_hoc', '')
+    diem_chu = request.GET.get('diem_chu', '')
     
     grades = Grade.objects.all().select_related('student', 'subject')
     
@@ -260,15 +242,56 @@ def grade_list(request):
         grades = grades.filter(hoc_ky=hoc_ky)
     if nam_hoc:
         grades = grades.filter(nam_hoc=nam_hoc)
+    if diem_chu:
+        grades = grades.filter(diem_chu=diem_chu)
+    
+    # Phân trang keyset theo đúng thứ tự hiển thị
+    grades = paginate(request, grades, ['-nam_hoc', 'hoc_ky', 'subject_id', 'id'])
     
     return render(request, 'grades/grade_list.html', {
         'grades': grades,
         'hoc_ky': hoc_ky,
         'nam_hoc': nam_hoc,
+        'diem_chu': diem_chu,
         'HOC_KY_CHOICES': Grade.HOC_KY_CHOICES,
+        'LETTER_GRADES': Grade.LETTER_GRADES,
     })
 
 
+@login_required
+@user_passes_test(is_admin_or_teacher)
+def grade_export(request):
+    """Xuất điểm ra CSV theo luồng - cùng bộ lọc và phân quyền với grade_list"""
+    hoc_ky = request.GET.get('hoc_ky', '')
+    nam_hoc = request.GET.get('nam_hoc', '')
+    diem_chu = request.GET.get('diem_chu', '')
+    
+    grades = Grade.objects.all()
+    
+    # ✅ Teacher chỉ xuất điểm sinh viên trong lớp mình phụ trách
+    if request.user.role == 'teacher':
+        student_ids = Student.objects.filter(
+            classes__giao_vien_chu_nhiem=request.user
+        ).values('id')
+        grades = grades.filter(student_id__in=student_ids)
+    
+    if hoc_ky:
+        grades = grades.filter(hoc_ky=hoc_ky)
+    if nam_hoc:
+        grades = grades.filter(nam_hoc=nam_hoc)
+    if diem_chu:
+        grades = grades.filter(diem_chu=diem_chu)
+    
+    # Các cột đầu trùng với file nhập điểm để có thể nhập lại
+    fields = [
+        'student__ma_sv', 'subject__ma_mon', 'hoc_ky', 'nam_hoc',
+        'diem_qua_trinh', 'diem_giua_ky', 'diem_cuoi_ky', 'ghi_chu',
+        'diem_tong_ket', 'diem_chu', 'student__ho_ten', 'subject__ten_mon',
+    ]
+    header = IMPORT_COLUMNS + ['diem_tong_ket', 'diem_chu', 'ho_ten', 'ten_mon']
+    return csv_response('diem.csv', header, iter_values(grades, fields))
+
+
 @login_required
 @user_passes_test(is_admin_or_teacher)
 def bulk_grade_create(request):
@@ -285,46 +308,18 @@ def bulk_grade_create(request):
             formset = GradeFormSet(request.POST, prefix='grades')
             
             if formset.is_valid():
-                for form in formset:
-                    if form.cleaned_data and not form.cleaned_data.get('DELETE', False):
-                        student = form.cleaned_data.get('student')
-                        if student:
-                            grade, created = Grade.objects.get_or_create(
-                                student=student,
-                                subject=subject,
-                                hoc_ky=hoc_ky,
-                                nam_hoc=nam_hoc,
-                                defaults={
-                                    'diem_qua_trinh': form.cleaned_data.get('diem_qua_trinh'),
-                                    'diem_giua_ky': form.cleaned_data.get('diem_giua_ky'),
-                                    'diem_cuoi_ky': form.cleaned_data.get('diem_cuoi_ky'),
-                                    'ghi_chu': form.cleaned_data.get('ghi_chu', ''),
-                                }
-                            )
-                            if not created:
-                                grade.diem_qua_trinh = form.cleaned_data.get('diem_qua_trinh')
-                                grade.diem_giua_ky = form.cleaned_data.get('diem_giua_ky')
-                                grade.diem_cuoi_ky = form.cleaned_data.get('diem_cuoi_ky')
-                                grade.ghi_chu = form.cleaned_data.get('ghi_chu', '')
-                                grade.save()
-                            
-                            # Tính lại GPA
-                            gpa, total_credits, total_points = StudentGPA.calculate_gpa(
-                                student, hoc_ky, nam_hoc
-                            )
-                            if gpa is not None:
-                                gpa_record, created = StudentGPA.objects.get_or_create(
-                                    student=student,
-                                    hoc_ky=hoc_ky,
-                                    nam_hoc=nam_hoc
-                                )
-                                gpa_record.gpa = gpa
-                                gpa_record.tong_tin_chi = total_credits
-                                gpa_record.tong_diem_tich_luy = total_points
-                                gpa_record.save()
-                
-                messages.success(request, "Nhập điểm hàng loạt thành công!")
-                return redirect('grade_list')
+                rows = [
+                    form.cleaned_data for form in formset
+                    if form.cleaned_data and not form.cleaned_data.get('DELETE', False)
+                ]
+                # Ghi toàn bộ trong một transaction, GPA tính lại một lần cho mỗi sinh viên
+                try:
+                    bulk_save_grades(subject, hoc_ky, nam_hoc, rows, request.user)
+                except TermFinalizedError as e:
+                    messages.error(request, e.message)
+                else:
+                    messages.success(request, "Nhập điểm hàng loạt thành công!")
+                    return redirect('grade_list')
         else:
             formset = GradeFormSet(prefix='grades')
     else:
@@ -334,4 +329,212 @@ def bulk_grade_create(request):
     return render(request, 'grades/bulk_grade_form.html', {
         'bulk_form': bulk_form,
         'formset': formset,
-    })
\ No newline at end of file
+    })
+
+
+# ============================================
+# ĐIỀU CHỈNH ĐIỂM HÀNG LOẠT
+# ============================================
+
+@login_required
+@user_passes_test(is_admin_or_teacher)
+def grade_curve(request):
+    """
+    Điều chỉnh điểm cuối kỳ của một môn trong một học kỳ: GET xem trước phân bố
+    điểm trước/sau, POST áp dụng. Teacher chỉ điều chỉnh sinh viên lớp mình phụ trách.
+    """
+    students = None
+    if request.user.role == 'teacher':
+        students = Student.objects.filter(classes__giao_vien_chu_nhiem=request.user)
+
+    data = request.POST if request.method == 'POST' else (request.GET or None)
+    form = GradeCurveForm(data)
+    preview = None
+    if form.is_valid():
+        params = form.curve_params()
+        if request.method == 'POST':
+            try:
+                changed = apply_curve(**params, students=students, user=request.user)
+            except TermFinalizedError as e:
+                # Học kỳ vừa bị khóa sau khi form đã kiểm tra
+                messages.error(request, e.message)
+            else:
+                messages.success(request, f"Đã điều chỉnh {changed} điểm môn {params['subject'].ten_mon}.")
+                return redirect(f"{reverse('grade_list')}?hoc_ky={params['hoc_ky']}&nam_hoc={params['nam_hoc']}")
+        preview = curve_preview(**params, students=students)
+        if preview is None:
+            messages.warning(request, "Môn học chưa có điểm cuối kỳ trong học kỳ này.")
+
+    return render(request, 'grades/grade_curve.html', {
+        'form': form,
+        'preview': preview,
+    })
+
+
+# ============================================
+# IMPORT ĐIỂM TỪ FILE
+# ============================================
+
+@login_required
+@user_passes_test(is_admin_or_teacher)
+def grade_import(request):
+    """Nhập điểm từ file CSV/XLSX - teacher chỉ nhập cho sinh viên lớp mình phụ trách"""
+    result = None
+    if request.method == 'POST':
+        form = GradeImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            students = Student.objects.all()
+            if request.user.role == 'teacher':
+                students = students.filter(classes__giao_vien_chu_nhiem=request.user).distinct()
+            try:
+                result = import_grades(form.cleaned_data['file'], students, request.user)
+            except GradeImportError as e:
+                form.add_error('file', str(e))
+            else:
+                if result.rejected:
+                    messages.warning(
+                        request,
+                        f"Đã nhập {result.created + result.updated} dòng, {result.rejected} dòng bị từ chối."
+                    )
+                else:
+                    messages.success(request, f"Nhập điểm thành công {result.total} dòng!")
+    else:
+        form = GradeImportForm()
+
+    return render(request, 'grades/grade_import.html', {
+        'form': form,
+        'result': result,
+    })
+
+
+@login_required
+@user_passes_test(is_admin_or_teacher)
+def grade_import_errors(request, name):
+    """Tải file các dòng bị từ chối (chỉ người đã nhập mới tải được)"""
+    if not name.startswith(f"{request.user.pk}_") or os.path.basename(name) != name:
+        raise Http404
+    path = error_file_path(name)
+    if not os.path.exists(path):
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename='loi_nhap_diem.csv')
+
+
+@login_required
+@user_passes_test(is_admin_or_teacher)
+@require_POST
+def grade_patch_api(request):
+    """
+    API JSON sửa điểm từng ô theo lô (cho bảng nhập điểm tự lưu)
+
+    Body: {"patches": [{"id": 1, "field": "diem_cuoi_ky", "value": 8.5,
+                        "updated_at": "2025-01-01T08:00:00.123456+00:00"}, ...]}
+    Trả về {"applied": [...], "conflicts": [...], "errors": [...]}; điểm có
+    updated_at khác với giá trị gửi lên bị báo xung đột, các điểm khác vẫn được lưu.
+    """
+    try:
+        payload = json.loads(request.body)
+        raw_patches = payload['patches']
+        if not isinstance(raw_patches, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': "Dữ liệu gửi lên không hợp lệ."}, status=400)
+    if len(raw_patches) > MAX_PATCHES:
+        return JsonResponse({'error': f"Tối đa {MAX_PATCHES} ô mỗi lần gửi."}, status=400)
+
+    patches, errors = [], []
+    for raw in raw_patches:
+        if not isinstance(raw, dict):
+            errors.append({'patch': raw, 'message': "Ô không hợp lệ"})
+            continue
+        # JSON true/false là bool (lớp con của int) và sẽ trỏ tới điểm id 1/0
+        if isinstance(raw.get('id'), bool):
+            return JsonResponse({'error': "Dữ liệu gửi lên không hợp lệ."}, status=400)
+        updated_at = parse_datetime(str(raw.get('updated_at', '')))
+        if type(raw.get('id')) is not int or updated_at is None or not is_aware(updated_at):
+            errors.append({**raw, 'message': "Thiếu id hoặc updated_at (kèm múi giờ)"})
+            continue
+        patches.append({
+            'id': raw['id'],
+            'field': raw.get('field'),
+            'value': raw.get('value'),
+            'updated_at': updated_at,
+        })
+
+    # ✅ Teacher chỉ sửa điểm sinh viên trong lớp mình phụ trách
+    students = None
+    if request.user.role == 'teacher':
+        students = Student.objects.filter(classes__giao_vien_chu_nhiem=request.user)
+
+    result = patch_grades(patches, request.user, students)
+    result['errors'] = errors + result['errors']
+    return JsonResponse(result, encoder=PreciseJSONEncoder)
+
+
+def _query_id(request, name):
+    """Tham số id trên query string: None nếu bỏ trống, ValueError nếu không phải số nguyên"""
+    value = request.GET.get(name, '').strip()
+    return int(value) if value else None
+
+
+@login_required
+@user_passes_test(is_admin_or_teacher)
+def subject_stats_api(request):
+    """
+    API JSON thống kê điểm của một môn trong học kỳ (?subject=&hoc_ky=&nam_hoc=)
+    Trả về {"stats": null} nếu chưa có điểm tổng kết; xem score_stats.summarize_scores.
+    """
+    try:
+        subject_id = _query_id(request, 'subject')
+    except ValueError:
+        return JsonResponse({'error': "Mã môn học không hợp lệ."}, status=400)
+    subject = get_object_or_404(Subject, pk=subject_id or 0)
+    hoc_ky = request.GET.get('hoc_ky', '1')
+    nam_hoc = request.GET.get('nam_hoc', '2024-2025')
+    return JsonResponse({
+        'subject': subject.ma_mon,
+        'hoc_ky': hoc_ky,
+        'nam_hoc': nam_hoc,
+        'stats': subject_stats(subject.pk, hoc_ky, nam_hoc),
+    }, encoder=PreciseJSONEncoder)
+
+
+@login_required
+@user_passes_test(is_admin_or_teacher)
+def grade_trend_api(request):
+    """
+    API JSON xu hướng điểm qua các học kỳ, đọc từ bảng tổng hợp GradeRollup
+    - ?subject=&class=: một chuỗi (gộp mọi môn / toàn trường nếu bỏ trống)
+    - ?group=subject[&class=]: mỗi môn một chuỗi; ?group=class[&subject=]: mỗi lớp một chuỗi
+    Mỗi điểm của chuỗi gồm nam_hoc, hoc_ky, so_luong, diem_tb, do_lech_chuan, ty_le_dat...
+    """
+    try:
+        subject_id = _query_id(request, 'subject')
+        class_id = _query_id(request, 'class')
+    except ValueError:
+        return JsonResponse({'error': "Mã môn học hoặc lớp không hợp lệ."}, status=400)
+    subject = get_object_or_404(Subject, pk=subject_id) if subject_id else None
+    class_obj = get_object_or_404(Class, pk=class_id) if class_id else None
+    group = request.GET.get('group', '')
+
+    if group == 'subject':
+        series = rollups.subject_trends(class_id=class_obj and class_obj.pk)
+        names = dict(Subject.objects.filter(pk__in=series).values_list('pk', 'ma_mon'))
+    elif group == 'class':
+        series = rollups.class_trends(subject_id=subject and subject.pk)
+        names = dict(Class.objects.filter(pk__in=series).values_list('pk', 'ma_lop'))
+    else:
+        return JsonResponse({
+            'subject': subject and subject.ma_mon,
+            'class': class_obj and class_obj.ma_lop,
+            'trend': rollups.trend(subject and subject.pk, class_obj and class_obj.pk),
+        }, encoder=PreciseJSONEncoder)
+
+    return JsonResponse({
+        'group': group,
+        'subject': subject and subject.ma_mon,
+        'class': class_obj and class_obj.ma_lop,
+        'series': [
+            {'id': key, 'name': names.get(key, ''), 'trend': points}
+            for key, points in series.items()
+        ],
+    }, encoder=PreciseJSONEncoder)
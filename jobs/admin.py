@@ -0,0 +1,19 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'progress', 'attempts', 'run_after', 'locked_by', 'finished_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['kind', 'dedupe_key', 'message']
+    readonly_fields = ['created_at', 'finished_at', 'locked_by', 'locked_at']
+    actions = ['retry_jobs']
+
+    @admin.action(description="Chạy lại các tác vụ thất bại")
+    def retry_jobs(self, request, queryset):
+        count = queryset.filter(status='failed').update(
+            status='pending', attempts=0, run_after=timezone.now(), finished_at=None
+        )
+        self.message_user(request, f"Đã đưa lại {count} tác vụ vào hàng đợi.")
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'jobs'
+    verbose_name = 'Tác vụ nền'
+
+    def ready(self):
+        # Nạp jobs.py của các app để đăng ký handler
+        autodiscover_modules('jobs')
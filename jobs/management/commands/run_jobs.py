@@ -0,0 +1,83 @@
+# jobs/management/commands/run_jobs.py
+# Worker xử lý hàng đợi tác vụ nền
+#
+# Chạy: python manage.py run_jobs --threads 4
+#       python manage.py run_jobs --processes 2 --threads 4
+#       python manage.py run_jobs --once      (chạy hết hàng đợi rồi dừng)
+
+import multiprocessing
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.queue import JOB_LOCK_TIMEOUT, requeue_stale, work, worker_name
+
+
+def _run_threads(threads, poll_interval, once, stop_event):
+    """Chạy threads worker trong tiến trình hiện tại, mỗi thread một kết nối database"""
+    name = worker_name()
+
+    def target(index):
+        try:
+            work(f"{name}#{index}", stop_event, poll_interval, once)
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=target, args=(index,), daemon=True) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    try:
+        for thread in workers:
+            while thread.is_alive():
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for thread in workers:
+            thread.join()
+
+
+def _process_main(threads, poll_interval, once):
+    _run_threads(threads, poll_interval, once, threading.Event())
+
+
+class Command(BaseCommand):
+    help = "Lấy và chạy các tác vụ nền trong bảng Job bằng một nhóm thread/tiến trình"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=1, help="Số thread mỗi tiến trình")
+        parser.add_argument('--processes', type=int, default=1, help="Số tiến trình")
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help="Số giây nghỉ khi hàng đợi rỗng")
+        parser.add_argument('--once', action='store_true', help="Dừng khi hàng đợi rỗng")
+
+    def handle(self, *args, **options):
+        threads = max(1, options['threads'])
+        processes = max(1, options['processes'])
+        poll_interval, once = options['poll'], options['once']
+
+        requeued = requeue_stale(JOB_LOCK_TIMEOUT)
+        if requeued:
+            self.stdout.write(f"Đưa lại hàng đợi {requeued} tác vụ bị kẹt.")
+        self.stdout.write(f"Worker: {processes} tiến trình x {threads} thread.")
+
+        if processes == 1:
+            _run_threads(threads, poll_interval, once, threading.Event())
+        else:
+            # Không chia sẻ kết nối database của tiến trình cha cho tiến trình con
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            children = [
+                context.Process(target=_process_main, args=(threads, poll_interval, once))
+                for _ in range(processes)
+            ]
+            for child in children:
+                child.start()
+            try:
+                for child in children:
+                    child.join()
+            except KeyboardInterrupt:
+                for child in children:
+                    child.join()
+
+        self.stdout.write(self.style.SUCCESS("Worker đã dừng."))
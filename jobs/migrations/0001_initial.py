@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=100, verbose_name='Loại tác vụ')),
+                ('dedupe_key', models.CharField(blank=True, max_length=200, null=True, verbose_name='Khóa gộp')),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Đang chờ'), ('running', 'Đang chạy'), ('done', 'Hoàn thành'), ('failed', 'Thất bại')], default='pending', max_length=7, verbose_name='Trạng thái')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='Độ ưu tiên')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Số lần chạy')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3, verbose_name='Số lần chạy tối đa')),
+                ('run_after', models.DateTimeField(verbose_name='Chạy sau')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Worker')),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Tiến độ (%)')),
+                ('message', models.TextField(blank=True, verbose_name='Thông báo')),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Người tạo')),
+            ],
+            options={
+                'verbose_name': 'Tác vụ nền',
+                'verbose_name_plural': 'Tác vụ nền',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['status', 'priority', 'run_after'], name='job_claim_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'dedupe_key'), name='job_pending_dedupe_uniq')],
+            },
+        ),
+    ]
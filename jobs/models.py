@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db import models
+
+
+class Job(models.Model):
+    """Tác vụ nền lưu trong database, được lệnh run_jobs lấy ra xử lý"""
+    STATUS_CHOICES = [
+        ('pending', 'Đang chờ'),
+        ('running', 'Đang chạy'),
+        ('done', 'Hoàn thành'),
+        ('failed', 'Thất bại'),
+    ]
+
+    kind = models.CharField(max_length=100, verbose_name="Loại tác vụ")
+    # Khóa gộp: chỉ có giá trị khi đang chờ, nên các tác vụ trùng khóa đang
+    # chờ được gộp làm một (ràng buộc unique, NULL không tính trùng)
+    dedupe_key = models.CharField(max_length=200, null=True, blank=True, verbose_name="Khóa gộp")
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default='pending', verbose_name="Trạng thái")
+    priority = models.SmallIntegerField(default=0, verbose_name="Độ ưu tiên")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Số lần chạy")
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name="Số lần chạy tối đa")
+    run_after = models.DateTimeField(verbose_name="Chạy sau")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="Worker")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="Tiến độ (%)")
+    message = models.TextField(blank=True, verbose_name="Thông báo")
+    result = models.JSONField(null=True, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Người tạo"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Tác vụ nền"
+        verbose_name_plural = "Tác vụ nền"
+        ordering = ['-id']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'dedupe_key'], name='job_pending_dedupe_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'priority', 'run_after'], name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} ({self.get_status_display()})"
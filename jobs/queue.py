@@ -0,0 +1,204 @@
+# jobs/queue.py
+# Hàng đợi tác vụ nền dùng bảng Job: đăng ký handler, đưa vào hàng đợi,
+# lấy việc (SELECT ... FOR UPDATE SKIP LOCKED), chạy và thử lại khi lỗi
+
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Thời gian chờ trước lần thử lại thứ n: JOB_RETRY_DELAY * 2^(n-1) giây
+JOB_RETRY_DELAY = 10
+# Tác vụ 'running' quá thời gian này (worker chết giữa chừng) được đưa lại hàng đợi
+JOB_LOCK_TIMEOUT = 600
+
+_handlers = {}
+
+
+def register(kind, max_attempts=3):
+    """
+    Decorator đăng ký handler cho một loại tác vụ
+
+    Handler nhận Job và trả về kết quả (JSON được) hoặc None. Tác vụ có thể
+    bị chạy lại khi lỗi nên handler cần idempotent và tự mở transaction nếu cần.
+    """
+    def decorator(func):
+        _handlers[kind] = (func, max_attempts)
+        return func
+    return decorator
+
+
+def _eager():
+    return getattr(settings, 'JOBS_EAGER', False)
+
+
+def _run_eager(kind, payload, user):
+    job = Job.objects.create(
+        kind=kind, payload=payload, created_by=user,
+        run_after=timezone.now(), status='running', attempts=1,
+        max_attempts=_handlers[kind][1] if kind in _handlers else 1,
+    )
+    run_job(job)
+
+
+def enqueue(kind, payload=None, key=None, user=None, delay=0, priority=0):
+    """
+    Đưa một tác vụ vào hàng đợi, trả về Job (tác vụ đang chờ nếu bị gộp)
+
+    key: khóa gộp; nếu đã có tác vụ cùng kind + key đang chờ thì không tạo
+    thêm (10 lần sửa điểm của một sinh viên chỉ sinh một tác vụ).
+    Gọi trong transaction thì tác vụ chỉ xuất hiện khi transaction commit.
+    Khi settings.JOBS_EAGER bật (dev/test) tác vụ chạy ngay sau commit.
+    """
+    payload = payload or {}
+    if user is not None and not getattr(user, 'is_authenticated', False):
+        user = None
+    if _eager():
+        transaction.on_commit(lambda: _run_eager(kind, payload, user))
+        return None
+
+    job = Job(
+        kind=kind,
+        dedupe_key=key,
+        payload=payload,
+        priority=priority,
+        run_after=timezone.now() + timedelta(seconds=delay),
+        max_attempts=_handlers[kind][1] if kind in _handlers else 3,
+        created_by=user,
+    )
+    if key is None:
+        job.save()
+        return job
+    Job.objects.bulk_create([job], ignore_conflicts=True)
+    return Job.objects.filter(kind=kind, dedupe_key=key).first()
+
+
+def enqueue_many(kind, items, delay=0, priority=0):
+    """
+    Đưa nhiều tác vụ cùng loại vào hàng đợi bằng một câu INSERT
+    items: danh sách (key, payload); tác vụ trùng khóa đang chờ được gộp
+    """
+    items = list(items)
+    if not items:
+        return
+    if _eager():
+        for key, payload in items:
+            transaction.on_commit(lambda payload=payload: _run_eager(kind, payload, None))
+        return
+
+    run_after = timezone.now() + timedelta(seconds=delay)
+    max_attempts = _handlers[kind][1] if kind in _handlers else 3
+    Job.objects.bulk_create(
+        [
+            Job(kind=kind, dedupe_key=key, payload=payload, priority=priority,
+                run_after=run_after, max_attempts=max_attempts)
+            for key, payload in items
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def set_progress(job, progress, message=''):
+    """Cập nhật tiến độ (0-100) để endpoint trạng thái hiển thị"""
+    job.progress = max(0, min(100, int(progress)))
+    job.message = message
+    Job.objects.filter(pk=job.pk).update(progress=job.progress, message=message)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def requeue_stale(timeout=JOB_LOCK_TIMEOUT):
+    """Đưa lại hàng đợi các tác vụ bị kẹt ở trạng thái 'running'"""
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Job.objects.filter(status='running', locked_at__lt=cutoff).update(
+        status='pending', locked_by='', locked_at=None
+    )
+
+
+def claim(worker, limit=1):
+    """
+    Lấy tối đa limit tác vụ đến hạn; SKIP LOCKED để nhiều worker không tranh nhau.
+    Khóa gộp được xóa khi bắt đầu chạy: thay đổi xảy ra sau đó sẽ tạo tác vụ mới.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', run_after__lte=now)
+            .order_by('-priority', 'run_after', 'id')[:limit]
+        )
+        if not jobs:
+            return []
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status='running', locked_by=worker, locked_at=now,
+            dedupe_key=None, attempts=F('attempts') + 1,
+        )
+    for job in jobs:
+        job.status, job.locked_by, job.locked_at = 'running', worker, now
+        job.dedupe_key = None
+        job.attempts += 1
+    return jobs
+
+
+def run_job(job):
+    """Chạy một tác vụ đã lấy; lỗi thì hẹn giờ chạy lại hoặc đánh dấu thất bại"""
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"Chưa đăng ký handler cho '{job.kind}'")
+        result = handler[0](job)
+    except Exception as exc:
+        logger.exception("Tác vụ #%s (%s) lỗi ở lần chạy %s", job.pk, job.kind, job.attempts)
+        now = timezone.now()
+        message = f"{type(exc).__name__}: {exc}"
+        if job.attempts < job.max_attempts:
+            delay = JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            Job.objects.filter(pk=job.pk).update(
+                status='pending', locked_by='', locked_at=None,
+                run_after=now + timedelta(seconds=delay), message=message,
+            )
+            job.status = 'pending'
+        else:
+            Job.objects.filter(pk=job.pk).update(status='failed', message=message, finished_at=now)
+            job.status = 'failed'
+        return False
+
+    Job.objects.filter(pk=job.pk).update(
+        status='done', progress=100, result=result, finished_at=timezone.now()
+    )
+    job.status = 'done'
+    return True
+
+
+def work(worker, stop_event, poll_interval=1.0, once=False):
+    """
+    Vòng lặp của một worker (một thread): lấy việc, chạy, nghỉ khi hết việc
+    once: dừng khi hàng đợi rỗng
+    """
+    while not stop_event.is_set():
+        close_old_connections()
+        try:
+            jobs = claim(worker)
+        except DatabaseError:
+            # Mất kết nối / deadlock khi lấy việc: nghỉ rồi thử lại, không dừng worker
+            logger.exception("Worker %s không lấy được tác vụ", worker)
+            stop_event.wait(poll_interval)
+            continue
+        if not jobs:
+            if once:
+                return
+            stop_event.wait(poll_interval)
+            continue
+        for job in jobs:
+            run_job(job)
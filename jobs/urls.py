@@ -0,0 +1,8 @@
+# jobs/urls.py
+
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('<int:pk>/', views.job_status, name='job_status'),
+]
@@ -0,0 +1,27 @@
+# jobs/views.py
+
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+
+from qlsv.pagination import PreciseJSONEncoder
+from .models import Job
+
+
+@login_required
+def job_status(request, pk):
+    """Trạng thái và tiến độ của một tác vụ nền (JSON); chỉ người tạo hoặc admin được xem"""
+    job = get_object_or_404(Job, pk=pk)
+    if request.user.role != 'admin' and job.created_by_id != request.user.pk:
+        raise Http404
+    return JsonResponse({
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'attempts': job.attempts,
+        'result': job.result,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    }, encoder=PreciseJSONEncoder)
@@ -0,0 +1,27 @@
+# qlsv/db.py
+# Tiện ích ghi dữ liệu dùng chung, chạy được trên mọi database được hỗ trợ
+
+from django.db import connections, router
+
+
+def bulk_upsert(model, objs, unique_fields, update_fields, batch_size=None):
+    """
+    Thêm các bản ghi, bản ghi trùng khóa unique thì cập nhật update_fields
+
+    PostgreSQL/SQLite cần chỉ rõ cột gây trùng (ON CONFLICT (...) DO UPDATE);
+    MySQL dùng ON DUPLICATE KEY UPDATE và báo NotSupportedError nếu truyền
+    unique_fields, nên chỉ truyền khi database hỗ trợ.
+    """
+    if not objs:
+        return []
+    connection = connections[router.db_for_write(model)]
+    options = {}
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = unique_fields
+    return model.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        update_fields=update_fields,
+        batch_size=batch_size,
+        **options,
+    )
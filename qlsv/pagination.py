@@ -0,0 +1,215 @@
+# qlsv/pagination.py
+# Phân trang keyset (cursor) dùng chung cho các trang danh sách lớn
+
+import base64
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Q
+
+DEFAULT_PER_PAGE = 50
+
+# Vượt quá ngưỡng này thì không đếm chính xác mà hiển thị "N+" hoặc số ước lượng
+APPROX_COUNT_LIMIT = 10000
+
+
+class PreciseJSONEncoder(DjangoJSONEncoder):
+    """
+    Giữ nguyên micro giây của datetime (DjangoJSONEncoder cắt còn mili giây),
+    cần khi giá trị được gửi lại để so sánh bằng (cursor, updated_at)
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _encode_cursor(values):
+    raw = json.dumps(values, cls=PreciseJSONEncoder).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, fields):
+    """Giải mã cursor thành list giá trị đúng kiểu; None nếu cursor không hợp lệ"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(fields):
+        return None
+    try:
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except Exception:
+        return None
+
+
+def _table_estimate(model):
+    """Số dòng ước lượng từ thống kê của database (None nếu không hỗ trợ)"""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [table]
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+def approximate_count(queryset, limit=APPROX_COUNT_LIMIT):
+    """
+    Đếm số dòng mà không phải COUNT(*) toàn bảng
+    - Bảng không lọc: dùng thống kê của database nếu đủ lớn
+    - Còn lại: đếm có giới hạn (COUNT trên subquery LIMIT limit + 1)
+    Trả về (số lượng, là_ước_lượng)
+    """
+    if not queryset.query.where:
+        estimate = _table_estimate(queryset.model)
+        if estimate is not None and estimate > limit:
+            return estimate, True
+
+    count = queryset.order_by()[:limit + 1].count()
+    if count > limit:
+        return limit, True
+    return count, False
+
+
+class KeysetPage:
+    """Một trang kết quả; có thể lặp, dùng len() và kiểm tra rỗng như list"""
+
+    def __init__(self, object_list, has_next, has_previous, next_query, previous_query, total, total_is_estimate):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_query = next_query
+        self.previous_query = previous_query
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def total_display(self):
+        if not self.total_is_estimate:
+            return str(self.total)
+        if self.total == APPROX_COUNT_LIMIT:
+            return f"{self.total}+"
+        return f"~{self.total}"
+
+
+class KeysetPaginator:
+    """
+    Phân trang theo giá trị các cột sắp xếp của dòng cuối/đầu trang
+    thay vì OFFSET, nên trang sau cũng nhanh như trang đầu.
+
+    ordering: các cột của model, ví dụ ['-nam_hoc', 'hoc_ky', 'subject_id', 'id'];
+    khóa chính được tự thêm vào cuối nếu chưa có để thứ tự là duy nhất.
+    """
+
+    def __init__(self, queryset, ordering, per_page=DEFAULT_PER_PAGE):
+        self.queryset = queryset
+        self.per_page = per_page
+        opts = queryset.model._meta
+        pk_names = {'pk', opts.pk.name, opts.pk.attname}
+        ordering = list(ordering)
+        if not any(name.lstrip('-') in pk_names for name in ordering):
+            ordering.append(opts.pk.attname)
+
+        self.columns = []
+        for name in ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+            self.columns.append((field.attname, descending, field))
+
+    def _order_by(self, reverse):
+        return [
+            ('-' if descending != reverse else '') + attname
+            for attname, descending, field in self.columns
+        ]
+
+    def _seek(self, values, reverse):
+        """Điều kiện "đứng sau cursor" theo thứ tự sắp xếp (hoặc "đứng trước" nếu reverse)"""
+        condition = Q()
+        for index, (attname, descending, field) in enumerate(self.columns):
+            lookup = {
+                prev_attname: value
+                for (prev_attname, _, _), value in zip(self.columns[:index], values[:index])
+            }
+            lookup[f"{attname}__{'lt' if descending != reverse else 'gt'}"] = values[index]
+            condition |= Q(**lookup)
+        return condition
+
+    def _cursor_for(self, obj):
+        return _encode_cursor([getattr(obj, attname) for attname, _, _ in self.columns])
+
+    def page(self, params):
+        """
+        Lấy trang theo tham số GET: 'after' (trang sau) hoặc 'before' (trang trước)
+        params: request.GET, dùng để giữ lại các bộ lọc trong link next/prev
+        """
+        fields = [field for _, _, field in self.columns]
+        after = params.get('after')
+        before = params.get('before')
+        after_values = _decode_cursor(after, fields) if after else None
+        before_values = _decode_cursor(before, fields) if before and after_values is None else None
+
+        reverse = before_values is not None
+        queryset = self.queryset.order_by(*self._order_by(reverse))
+        if after_values is not None:
+            queryset = queryset.filter(self._seek(after_values, reverse=False))
+        elif before_values is not None:
+            queryset = queryset.filter(self._seek(before_values, reverse=True))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse and not has_more:
+            # Đã về đầu danh sách: trả về trang đầu đầy đủ
+            rows = list(self.queryset.order_by(*self._order_by(False))[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = False
+        elif reverse:
+            rows.reverse()
+            has_next, has_previous = True, True
+        else:
+            has_next, has_previous = has_more, after_values is not None
+
+        next_query = previous_query = ''
+        if rows and has_next:
+            next_query = self._query(params, 'after', self._cursor_for(rows[-1]))
+        if rows and has_previous:
+            previous_query = self._query(params, 'before', self._cursor_for(rows[0]))
+
+        total, total_is_estimate = approximate_count(self.queryset)
+        return KeysetPage(rows, has_next, has_previous, next_query, previous_query, total, total_is_estimate)
+
+    @staticmethod
+    def _query(params, key, cursor):
+        query = params.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        query[key] = cursor
+        return '?' + query.urlencode()
+
+
+def paginate(request, queryset, ordering, per_page=DEFAULT_PER_PAGE):
+    """Viết tắt: phân trang keyset theo request.GET"""
+    return KeysetPaginator(queryset, ordering, per_page).page(request.GET)
@@ -45,9 +45,13 @@ INSTALLED_APPS = [
     'teacher',
     'subjects',
     'dashboard',
+    'jobs',
 ]
 
 # Cache configuration (cho dashboard)
+# Số phiên bản dữ liệu (grades/cache_versions.py) nằm trong cache: chạy nhiều
+# process thì cần backend dùng chung (Redis, Memcached, DatabaseCache) để mọi
+# process thấy cùng phiên bản
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -55,6 +59,13 @@ CACHES = {
     }
 }
 
+# So sánh GPA cập nhật theo chênh lệch với kết quả tính lại toàn bộ (chỉ nên bật khi debug)
+GPA_VERIFY_INCREMENTAL = DEBUG
+
+# Chạy tác vụ nền ngay sau khi transaction commit thay vì chờ worker run_jobs
+# (tiện cho môi trường dev/test không chạy worker)
+JOBS_EAGER = False
+
 # Authentication URLs
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
@@ -24,4 +24,5 @@ urlpatterns = [
     path('classes/', include('classes.urls')),
     path('grades/', include('grades.urls')),
     path('teacher/', include('teacher.urls')),
+    path('jobs/', include('jobs.urls')),
 ]
\ No newline at end of file
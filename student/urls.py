@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.student_list, name='student_list'),
+    path('export/', views.student_export, name='student_export'),
     path('add/', views.student_create, name='student_create'),
     path('edit/<int:pk>/', views.student_update, name='student_update'),
     path('delete/<int:pk>/', views.student_delete, name='student_delete'),
@@ -3,9 +3,13 @@ from django.db.models import Q, Avg
 from django.contrib import messages
 from .models import Student, StudentProfile
 from .forms import StudentForm, StudentProfileForm
-from grades.models import Grade, StudentGPA, Subject
+from grades.archive import student_terms
+from grades.finalization import cache_finalized, get_finalized_term
+from grades.models import CumulativeGPA, Grade, StudentGPA, Subject, TermStudentSummary
 from classes.models import Class
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
+from grades.exports import csv_response, iter_values
+from qlsv.pagination import paginate
 
 # Create your views here.
 def student_list(request):
@@ -19,8 +23,33 @@ def student_list(request):
         )
     else:
         students = Student.objects.all()
+    students = paginate(request, students, ['ma_sv'])
     return render(request, 'student/student_list.html', {'students': students})
 
+def is_admin_or_teacher(user):
+    """Kiểm tra user là admin hoặc giáo viên"""
+    return user.is_authenticated and (user.role == 'admin' or user.role == 'teacher')
+
+@login_required
+@user_passes_test(is_admin_or_teacher)
+def student_export(request):
+    """Xuất danh sách sinh viên ra CSV theo luồng (teacher chỉ xuất sinh viên lớp mình)"""
+    students = Student.objects.all()
+    if request.user.role == 'teacher':
+        students = students.filter(
+            id__in=Student.objects.filter(classes__giao_vien_chu_nhiem=request.user).values('id')
+        )
+    query = request.GET.get('q')
+    if query:
+        students = students.filter(
+            Q(ma_sv__icontains=query) |
+            Q(ho_ten__icontains=query) |
+            Q(lop__icontains=query) |
+            Q(email__icontains=query)
+        )
+    fields = ['ma_sv', 'ho_ten', 'ngay_sinh', 'lop', 'email']
+    return csv_response('sinh_vien.csv', fields, iter_values(students, fields))
+
 def student_create(request):
     if request.method == 'POST':
         form = StudentForm(request.POST)
@@ -114,43 +143,52 @@ def student_grades(request):
     hoc_ky = request.GET.get('hoc_ky', '1')
     nam_hoc = request.GET.get('nam_hoc', '2024-2025')
     
-    # Lấy điểm số theo học kỳ
-    grades = Grade.objects.filter(
-        student=student,
-        hoc_ky=hoc_ky,
-        nam_hoc=nam_hoc
-    ).select_related('subject').order_by('subject__ma_mon')
-    
-    # Tính GPA
-    gpa_record, created = StudentGPA.objects.get_or_create(
-        student=student,
-        hoc_ky=hoc_ky,
-        nam_hoc=nam_hoc
-    )
-    
-    if created or not gpa_record.gpa:
-        gpa, total_credits, total_points = StudentGPA.calculate_gpa(student, hoc_ky, nam_hoc)
-        if gpa is not None:
-            gpa_record.gpa = gpa
-            gpa_record.tong_tin_chi = total_credits
-            gpa_record.tong_diem_tich_luy = total_points
-            gpa_record.save()
+    # Học kỳ đã khóa: đọc bảng điểm tính sẵn, không truy vấn Grade/StudentGPA
+    finalized = get_finalized_term(hoc_ky, nam_hoc)
+    summary = None
+    if finalized is not None:
+        summary = TermStudentSummary.objects.filter(term=finalized, student=student).first()
+
+    if summary is not None:
+        grades = summary.bang_diem
+        gpa_record = summary
+    else:
+        # Lấy điểm số theo học kỳ
+        grades = Grade.objects.filter(
+            student=student,
+            hoc_ky=hoc_ky,
+            nam_hoc=nam_hoc
+        ).select_related('subject').order_by('subject__ma_mon')
+
+        # GPA học kỳ: chỉ đọc, bản ghi do các thao tác ghi điểm duy trì
+        # (get_or_create ở đây từng tranh chấp unique với thao tác ghi đồng thời)
+        gpa_record = StudentGPA.objects.filter(
+            student=student,
+            hoc_ky=hoc_ky,
+            nam_hoc=nam_hoc
+        ).first()
     
-    # Lấy tất cả các học kỳ có điểm
-    all_semesters = Grade.objects.filter(student=student).values_list(
-        'hoc_ky', 'nam_hoc'
-    ).distinct().order_by('-nam_hoc', '-hoc_ky')
+    # GPA tích lũy: đọc một dòng đã tính sẵn
+    cumulative_gpa = CumulativeGPA.objects.filter(student=student).first()
+
+    # Lấy tất cả các học kỳ có điểm (kể cả các năm học đã lưu trữ)
+    all_semesters = student_terms(student)
     
     # Lấy tất cả các môn học
     all_subjects = Subject.objects.all().order_by('ma_mon')
     
-    return render(request, 'student/student_grades.html', {
+    response = render(request, 'student/student_grades.html', {
         'student': student,
         'grades': grades,
         'gpa_record': gpa_record,
+        'cumulative_gpa': cumulative_gpa,
         'hoc_ky': hoc_ky,
         'nam_hoc': nam_hoc,
         'all_semesters': all_semesters,
         'all_subjects': all_subjects,
         'HOC_KY_CHOICES': Grade.HOC_KY_CHOICES,
-    })
\ No newline at end of file
+    })
+    # Bảng điểm học kỳ đã khóa không đổi nữa: cho trình duyệt cache lâu
+    if finalized is not None:
+        cache_finalized(response, finalized)
+    return response
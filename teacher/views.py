@@ -8,7 +8,9 @@ from .models import TeacherNote
 from .forms import TeacherNoteForm
 from classes.models import Class
 from student.models import Student
+from grades.archive import student_transcript
 from grades.models import Grade
+from qlsv.pagination import paginate
 
 
 def is_teacher(user):
@@ -41,8 +43,8 @@ def teacher_student_grades(request, student_id):
         messages.error(request, "Bạn không có quyền xem điểm của sinh viên này.")
         return redirect('class_list')
     
-    # Lấy điểm số
-    grades = Grade.objects.filter(student=student).select_related('subject').order_by('-nam_hoc', '-hoc_ky', 'subject__ma_mon')
+    # Lấy điểm số (gồm cả điểm các năm học đã lưu trữ)
+    grades = student_transcript(student)
     
     # ✅ DÙNG TEMPLATE CHUNG từ grades/grade_list.html
     return render(request, 'grades/grade_list.html', {
@@ -62,7 +64,8 @@ def teacher_student_grades(request, student_id):
 def teacher_note_list(request):
     """Danh sách nhận xét của giáo viên"""
     teacher = request.user
-    notes = TeacherNote.objects.filter(teacher=teacher).select_related('student', 'class_obj').order_by('-created_at')
+    notes = TeacherNote.objects.filter(teacher=teacher).select_related('student', 'class_obj')
+    notes = paginate(request, notes, ['-created_at'])
     return render(request, 'teacher/note_list.html', {
         'teacher': teacher,
         'notes': notes